@@ -10,6 +10,7 @@ const REQUIRED_KEYS = [
   "ApiEndpoint",
   "CognitoUserPoolID",
   "CognitoWebClientID",
+  "WebSocketEndpoint",
 ]
 
 const writeConfigFile = (src, dest, configMap) => fs
@@ -1,15 +1,32 @@
+from concurrent.futures import ThreadPoolExecutor, wait
 from itertools import chain
+from threading import RLock
 
+import items
 import schemas
+from cache import TTLCache
+from lazy import Lazy
+from limiter import RateLimiter
+from telemetry import RequestMetrics
+from idempotency import COMPLETED, IdempotencyStore
+from schedules import ScheduleCache, as_started, split_schedule
+from tokens import TokenSigner
 import uuid
 import json
+import hashlib
+import re
+from functools import lru_cache, wraps
+from datetime import datetime, timezone
+from time import monotonic, perf_counter
 from os import getenv
 
 import boto3
 from boto3.dynamodb.conditions import Key
+from botocore.config import Config
+from botocore.exceptions import BotoCoreError, ClientError
 from urllib.parse import unquote, urlparse
 
-from aws_lambda_powertools import Logger, Tracer
+from aws_lambda_powertools import Logger, Metrics, Tracer
 from aws_lambda_powertools.event_handler import (
     APIGatewayRestResolver,
     CORSConfig,
@@ -17,25 +34,134 @@ from aws_lambda_powertools.event_handler import (
     content_types,
 )
 from aws_lambda_powertools.logging import correlation_paths
-from aws_lambda_powertools.utilities.validation import validate
+from aws_lambda_powertools.metrics import MetricUnit
+from aws_lambda_powertools.metrics.base import MetricManager
 from aws_lambda_powertools.event_handler.exceptions import (
     NotFoundError, BadRequestError)
-from aws_lambda_powertools.utilities.validation import SchemaValidationError
 
 cors_origin = getenv("ALLOW_ORIGIN", "*")
+describe_concurrency = int(getenv("DESCRIBE_CONCURRENCY", 10))
+channel_cache_ttl = int(getenv("CHANNEL_CACHE_TTL", 5))
+endpoint_cache_ttl = int(getenv("ENDPOINT_CACHE_TTL", 300))
+schedule_cache_ttl = int(getenv("SCHEDULE_CACHE_TTL", 30))
+graphics_cache_ttl = int(getenv("GRAPHICS_CACHE_TTL", 30))
+idempotency_ttl = int(getenv("IDEMPOTENCY_TTL", 3600))
+bulk_status_concurrency = int(getenv("BULK_STATUS_CONCURRENCY", 5))
+read_rate_limit = float(getenv("READ_RATE_LIMIT", 10))
+write_rate_limit = float(getenv("WRITE_RATE_LIMIT", 5))
+rate_limit_max_wait = float(getenv("RATE_LIMIT_MAX_WAIT", 3))
+max_retry_attempts = int(getenv("MAX_RETRY_ATTEMPTS", 4))
+# Page tokens must be signed with the same key in every container. The key is
+# read from the secret on first use, or given directly with PAGE_TOKEN_KEY
+page_token_secret_arn = getenv("PAGE_TOKEN_SECRET_ARN")
+page_token_key = getenv("PAGE_TOKEN_KEY")
+if not page_token_secret_arn and not page_token_key:
+    raise RuntimeError("PAGE_TOKEN_SECRET_ARN or PAGE_TOKEN_KEY must be set")
+metrics_namespace = getenv("POWERTOOLS_METRICS_NAMESPACE", "ChannelOrchestrator")
 tracer = Tracer()
 logger = Logger(service="APP")
-cors_config = CORSConfig(allow_origin=cors_origin, max_age=300)
+metrics = Metrics(namespace=metrics_namespace, service="APP")
+request_metrics = RequestMetrics()
+cors_config = CORSConfig(allow_origin=cors_origin, allow_headers=['If-None-Match', 'Idempotency-Key'],
+                         expose_headers=['ETag'], max_age=300)
 app = APIGatewayRestResolver(cors=cors_config)
 
-session = boto3.Session()
-medialive = session.client('medialive')
-mediapackage = session.client('mediapackage')
-dynamodb = session.resource('dynamodb')
-table = dynamodb.Table(getenv('CHANNEL_TABLE'))
+# Clients are created on first use so that cold starts only pay for the
+# clients used by the requested route. Sessions are not thread-safe, and
+# routes fan out across the executor, so the session and its clients are
+# created one at a time under a shared lock
+client_lock = RLock()
+session = Lazy(lambda: _create_session(), lock=client_lock)
+# Adaptive retries back off with jitter and slow the client down when
+# throttled, before the throttle is surfaced to the caller as a 429
+retry_config = Config(retries={'mode': 'adaptive', 'max_attempts': max_retry_attempts})
+# The buckets hold enough tokens for the describe and bulk status fan-outs to
+# start at once, and calls wait for a token no later than the invocation's
+# deadline, set in lambda_handler
+medialive_limiter = RateLimiter(read_rate_limit, write_rate_limit, max_wait=rate_limit_max_wait,
+                                read_capacity=max(read_rate_limit, describe_concurrency),
+                                write_capacity=max(write_rate_limit, bulk_status_concurrency))
+mediapackage_limiter = RateLimiter(read_rate_limit, write_rate_limit, max_wait=rate_limit_max_wait)
+# Size the connection pool to match the describe fan-out so worker threads
+# share connections rather than queueing for one
+medialive = Lazy(lambda: request_metrics.attach(medialive_limiter.attach(session.client(
+    'medialive', config=retry_config.merge(Config(max_pool_connections=describe_concurrency))))),
+    lock=client_lock)
+mediapackage = Lazy(lambda: request_metrics.attach(mediapackage_limiter.attach(
+    session.client('mediapackage', config=retry_config))), lock=client_lock)
+dynamodb = Lazy(lambda: _attach_resource(session.resource('dynamodb')), lock=client_lock)
+table = Lazy(lambda: dynamodb.Table(getenv('CHANNEL_TABLE')), lock=client_lock)
+page_tokens = Lazy(lambda: TokenSigner(page_token_key or _get_secret(page_token_secret_arn)), lock=client_lock)
+executor = ThreadPoolExecutor(max_workers=describe_concurrency)
+
+LIST_CHANNELS_KEY = 'channels'
+ENDPOINT_INDEX_KEY = 'endpoints'
+SUMMARY_SK = 'CHANNEL#summary'
+SUMMARY_ENTITY_TYPE = 'CHANNEL'
+SUMMARY_INDEX = 'EntityTypeIndex'
+# Written by the event handler once a reconcile has summarised every channel
+SUMMARIES_POPULATED_KEY = {'ChannelId': 'SUMMARIES', 'SK': 'POPULATED'}
+# Summaries modified this long before the client's version are resent, to
+# cover writes that were in flight when the previous version was read
+DELTA_OVERLAP_MS = 5000
+# Values accepted by GET /channels/<channel_id>?include= with their sort key
+# prefix and response key
+CHANNEL_ITEM_TYPES = {
+    'outputs': ('OUTPUT#', 'Outputs'),
+    'graphics': ('GRAPHIC#', 'Graphics'),
+    'alerts': ('ALERT#', 'Alerts'),
+}
+CHANNEL_ITEM_KEYS = dict(CHANNEL_ITEM_TYPES.values())
+# Values accepted by GET /channels?fields=. Id is always returned, and only
+# InputAttachments needs each channel to be described, to mark the active input
+CHANNEL_FIELDS = ('Id', 'State', 'Name', 'InputAttachments')
+CHANNEL_PAGE_DEFAULT_LIMIT = 20
+CHANNEL_PAGE_MAX_LIMIT = 100
+PAGE_SOURCE_SUMMARIES = 'summaries'
+PAGE_SOURCE_MEDIALIVE = 'medialive'
+# Alert history items are partitioned separately so that reading the current
+# channel items stays a single query
+ALERT_HISTORY_PREFIX = 'ALERTLOG#'
+ALERT_HISTORY_DEFAULT_LIMIT = 50
+ALERT_HISTORY_MAX_LIMIT = 100
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+IDEMPOTENCY_KEY_PATTERN = re.compile(r'[A-Za-z0-9_.:-]{1,128}')
+# Seconds an idempotency key is held whilst its request is handled, longer
+# than the function and API Gateway integration timeouts
+IDEMPOTENCY_IN_PROGRESS_TTL = 30
+# Maximum number of schedule actions sent in a single batch_update_schedule
+SCHEDULE_BATCH_SIZE = 20
+# Seconds that actions written through the API are kept in the cached
+# schedule whilst describe_schedule does not yet return them
+SCHEDULE_PENDING_TTL = 60
+# Seconds of an invocation left to build and return the response once calls
+# stop waiting on the rate limiters
+RATE_LIMIT_DEADLINE_MARGIN = 0.5
+# Seconds of an invocation left for the bulk status calls in flight to
+# complete, including their retries
+BULK_STATUS_DEADLINE_MARGIN = 1.5
+# Services whose calls are counted per request, by botocore service ID
+DOWNSTREAM_SERVICES = ('MediaLive', 'MediaPackage', 'DynamoDB')
+# Maximum number of values of a metric in a single EMF object
+EMF_MAX_VALUES = 100
+describe_cache = TTLCache(ttl=channel_cache_ttl)
+list_cache = TTLCache(ttl=channel_cache_ttl, max_size=1)
+endpoint_cache = TTLCache(ttl=endpoint_cache_ttl, max_size=1)
+graphics_cache = TTLCache(ttl=graphics_cache_ttl)
+schedule_cache = ScheduleCache(ttl=schedule_cache_ttl, pending_ttl=SCHEDULE_PENDING_TTL)
+# Summaries are never unpopulated, so the marker is only read until found
+summaries_populated = False
+idempotency = IdempotencyStore(lambda: table, ttl=idempotency_ttl, in_progress_ttl=IDEMPOTENCY_IN_PROGRESS_TTL)
+
+
+@app.exception_handler(ClientError)
+def handle_client_error(ex):
+    # Matched on the error code as the modeled exception classes are only
+    # available once the client has been created
+    handler = CLIENT_ERROR_HANDLERS.get(ex.response['Error']['Code'], handle_other_errors)
+    return handler(ex)
 
 
-@app.exception_handler(medialive.exceptions.NotFoundException)
 def handle_not_found(ex):
     metadata = {"path": app.current_event.path,
                 "query_strings": app.current_event.query_string_parameters}
@@ -44,12 +170,6 @@ def handle_not_found(ex):
     return Response(status_code=404)
 
 
-@app.exception_handler(medialive.exceptions.UnprocessableEntityException)
-def handle_unprocessable_entity(ex):
-    return handle_invalid_request(ex)
-
-
-@app.exception_handler(SchemaValidationError)
 def handle_schema_validation(ex):
     return handle_invalid_request(ex)
 
@@ -71,7 +191,6 @@ def handle_invalid_request(ex):
     )
 
 
-@app.exception_handler(medialive.exceptions.TooManyRequestsException)
 def handle_throttle(ex):
     metadata = {"path": app.current_event.path,
                 "query_strings": app.current_event.query_string_parameters}
@@ -98,51 +217,206 @@ def handle_other_errors(ex):
     )
 
 
+CLIENT_ERROR_HANDLERS = {
+    'NotFoundException': handle_not_found,
+    'UnprocessableEntityException': handle_invalid_request,
+    'TooManyRequestsException': handle_throttle,
+}
+
+
+def idempotent(func):
+    """
+    Decorator answering a request repeated with the same Idempotency-Key
+    header with the stored response of the first, without handling it again.
+    Keys are scoped to the method and path, and reusing one with a different
+    body is rejected.
+    """
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        key = _get_request_header(app.current_event.raw_event, IDEMPOTENCY_HEADER)
+        if key is None:
+            return func(*args, **kwargs)
+        if not IDEMPOTENCY_KEY_PATTERN.fullmatch(key):
+            raise BadRequestError(f'Given {IDEMPOTENCY_HEADER}: {key} is not valid.')
+
+        scope = f'{app.current_event.http_method} {app.current_event.path}'
+        request_hash = hashlib.sha256((app.current_event.body or '').encode()).hexdigest()
+        # Keys are usually new, so the stored record is only read once a claim
+        # has failed
+        if idempotency.claim(key, scope, request_hash):
+            try:
+                result = func(*args, **kwargs)
+            except Exception:
+                idempotency.release(key, scope)
+                raise
+            idempotency.complete(key, scope, request_hash, _to_stored_response(result))
+            return result
+
+        record = idempotency.get(key, scope)
+        if record is None or record['RequestHash'] != request_hash:
+            raise BadRequestError(f'Given {IDEMPOTENCY_HEADER}: {key} was used for a different request.')
+        if record['Status'] != COMPLETED:
+            return Response(
+                status_code=409,
+                content_type=content_types.APPLICATION_JSON,
+                body=json.dumps({"message": "A request with this key is in progress, please try again."})
+            )
+        return _from_stored_response(json.loads(record['Response']))
+
+    return wrapper
+
+
 @app.get("/channels")
+@request_metrics.route_handler
 @tracer.capture_method
 def get_channels():
-    ml_channels = _get_ml_channels()
+    since = app.current_event.get_query_string_value('since')
+    if since is not None and not since.isdigit():
+        raise BadRequestError(f'Given version: {since} is not a valid version.')
+    fields = app.current_event.get_query_string_value('fields')
+    selected = CHANNEL_FIELDS if fields is None else {'Id', *fields.split(',')}
+    if any(i not in CHANNEL_FIELDS for i in selected):
+        raise BadRequestError(f'Given fields: {fields} are not valid.')
+
+    limit = app.current_event.get_query_string_value('limit')
+    next_token = app.current_event.get_query_string_value('nextToken')
+    if limit is not None or next_token is not None:
+        if since is not None:
+            raise BadRequestError('Changes since a version cannot be paginated.')
+        return _get_channels_page(limit, next_token, selected)
+
+    # Channel summaries are maintained from MediaLive events, fall back to
+    # querying MediaLive directly until a reconcile has populated them, as
+    # events alone only summarise the channels they are for
+    if not _summaries_populated():
+        return {
+            'Channels': _get_ml_channels(selected),
+        }
 
+    summaries = _get_channel_summaries()
+    version = max((int(i.get('ModifiedAt', 0)) for i in summaries), default=0)
+    if since is None:
+        return {
+            'Channels': [_summary_to_channel(i, selected) for i in summaries if not i.get('Deleted')],
+            'Version': version,
+        }
+
+    changed = [i for i in summaries if i.get('ModifiedAt', 0) > int(since) - DELTA_OVERLAP_MS]
     return {
-        'Channels': ml_channels,
+        'Channels': [_summary_to_channel(i, selected) for i in changed if not i.get('Deleted')],
+        'Deleted': [i['ChannelId'] for i in changed if i.get('Deleted')],
+        'Version': version,
     }
 
 
 @app.get("/channels/<channel_id>")
+@request_metrics.route_handler
 @tracer.capture_method
 def get_channel_data(channel_id):
-    # Validate channel exists
-    channel = medialive.describe_channel(ChannelId=channel_id)
-
-    response = table.query(
-        KeyConditionExpression=Key('ChannelId').eq(channel_id),
+    include = app.current_event.get_query_string_value('include')
+    item_types = CHANNEL_ITEM_TYPES.keys() if include is None \
+        else list(dict.fromkeys(i for i in include.split(',') if i))
+    if not item_types or any(i not in CHANNEL_ITEM_TYPES for i in item_types):
+        raise BadRequestError(f'Given include: {include} is not valid.')
+
+    if include is None:
+        queries = [lambda: _query_channel_items(channel_id)]
+    else:
+        queries = [
+            lambda prefix=CHANNEL_ITEM_TYPES[i][0]: _query_channel_items(channel_id, prefix)
+            for i in item_types
+        ]
+
+    # Validate channel exists whilst loading its items
+    channel, *item_lists = _run_concurrently(
+        lambda: _describe_channel(channel_id),
+        *queries,
     )
 
-    outputs, graphics, alerts = [], [], []
+    results = {CHANNEL_ITEM_TYPES[i][1]: [] for i in item_types}
     invalid = {"SK", "ChannelId", "ExpiresAt"}
 
-    for item in response['Items']:
-        if item['SK'].startswith('GRAPHIC#'):
-            graphics.append({x: item[x] for x in item if x not in invalid})
-        elif item['SK'].startswith('OUTPUT#'):
-            outputs.append({x: item[x] for x in item if x not in invalid})
-        elif item['SK'].startswith('ALERT#'):
-            alerts.append({x: item[x] for x in item if x not in invalid})
-        else:
+    for item in chain(*item_lists):
+        prefix = item['SK'].split('#', 1)[0] + '#'
+        if prefix in CHANNEL_ITEM_KEYS:
+            results[CHANNEL_ITEM_KEYS[prefix]].append({x: item[x] for x in item if x not in invalid})
+        elif item['SK'] != SUMMARY_SK:
             logger.warning('Unidentified channel entry', item)
 
     return {
         'ChannelId': channel_id,
-        'Outputs': outputs,
-        'Graphics': graphics,
-        'Alerts': alerts,
+        **results,
         'GraphicsEnabled': channel.get("EncoderSettings", {})
                                .get("MotionGraphicsConfiguration", {})
                                .get("MotionGraphicsInsertion") == "ENABLED"
     }
 
 
+@app.get("/channels/<channel_id>/alerts")
+@request_metrics.route_handler
+@tracer.capture_method
+def get_channel_alerts(channel_id):
+    params = {
+        name: app.current_event.get_query_string_value(name)
+        for name in ['from', 'to', 'limit']
+    }
+    if any(value is not None and not value.isdigit() for value in params.values()):
+        raise BadRequestError(f'Given parameters: {params} are not valid.')
+    start = int(params['from'] or 0)
+    end = int(params['to']) if params['to'] is not None else None
+    if end is not None and start > end:
+        raise BadRequestError(f'Given parameters: {params} are not valid.')
+    limit = int(params['limit'] or ALERT_HISTORY_DEFAULT_LIMIT)
+    if not 0 < limit <= ALERT_HISTORY_MAX_LIMIT:
+        raise BadRequestError(f'Given limit: {limit} is not valid.')
+
+    partition = f'{ALERT_HISTORY_PREFIX}{channel_id}'
+    key_condition = '#ChannelId = :ChannelId AND #SK >= :From'
+    values = {
+        ':ChannelId': {'S': partition},
+        ':From': {'S': f'{start:010d}#'},
+    }
+    if end is not None:
+        # Includes every alarm at the end timestamp as '$' sorts after '#'
+        key_condition = '#ChannelId = :ChannelId AND #SK BETWEEN :From AND :To'
+        values[':To'] = {'S': f'{end:010d}$'}
+    kwargs = {
+        'TableName': table.name,
+        'KeyConditionExpression': key_condition,
+        'ExpressionAttributeNames': {'#ChannelId': 'ChannelId', '#SK': 'SK'},
+        'ExpressionAttributeValues': values,
+        'ScanIndexForward': False,
+        'Limit': limit,
+    }
+    next_token = app.current_event.get_query_string_value('nextToken')
+    if next_token is not None:
+        kwargs['ExclusiveStartKey'] = _decode_alerts_token(next_token, partition)
+
+    # Validate channel exists whilst loading its alerts
+    _, response = _run_concurrently(
+        lambda: _describe_channel(channel_id),
+        lambda: table.meta.client.query(**kwargs),
+    )
+    alerts = []
+    for item in map(items.deserialize, response['Items']):
+        alerted_at, alarm_id = item['SK'].split('#', 1)
+        alerts.append({
+            'Id': alarm_id,
+            'State': item['S'],
+            'Message': item['M'],
+            'AlertedAt': int(alerted_at),
+        })
+
+    last_key = response.get('LastEvaluatedKey')
+    return {
+        'Alerts': alerts,
+        'NextToken': page_tokens.encode(last_key) if last_key else None,
+    }
+
+
 @app.put("/channels/<channel_id>/status/<status>")
+@request_metrics.route_handler
+@idempotent
 @tracer.capture_method
 def put_channel_status(channel_id, status):
     status = status.lower()
@@ -152,22 +426,47 @@ def put_channel_status(channel_id, status):
     return _update_channel_status(channel_id, status)
 
 
+@app.put("/channels/status/<status>")
+@request_metrics.route_handler
+@idempotent
+@tracer.capture_method
+def put_channels_status(status):
+    status = status.lower()
+    if status not in ['start', 'stop']:
+        raise BadRequestError(f'Given status: {status} is not a valid status.')
+    _validate(event=app.current_event.json_body,
+              schema=schemas.put_channels_status_body)
+
+    channel_ids = app.current_event.json_body['ChannelIds']
+    # Channels not started on before the deadline are returned unprocessed,
+    # rather than the function timing out without a response
+    deadline = monotonic() + app.lambda_context.get_remaining_time_in_millis() / 1000 - BULK_STATUS_DEADLINE_MARGIN
+
+    def try_update(channel_id):
+        if monotonic() >= deadline:
+            return None
+        return _try_update_channel_status(channel_id, status)
+
+    with ThreadPoolExecutor(max_workers=bulk_status_concurrency) as bulk_executor:
+        results = dict(zip(channel_ids, bulk_executor.map(try_update, channel_ids)))
+
+    return {
+        'Channels': {k: v for k, v in results.items() if v is not None},
+        'UnprocessedChannelIds': [k for k, v in results.items() if v is None],
+    }
+
+
 @app.put("/channels/<channel_id>/activeinput/<input_name>")
+@request_metrics.route_handler
+@idempotent
 @tracer.capture_method
 def put_active_input(channel_id, input_name):
 
-    action_name = str(uuid.uuid4())
-    action = {
-        'ActionName': action_name,
-        'ScheduleActionSettings': {
-            'InputSwitchSettings': {
-                'InputAttachmentNameReference': unquote(input_name),
-            }
-        },
-        'ScheduleActionStartSettings': {
-            'ImmediateModeScheduleActionStartSettings': {}
+    action = _immediate_action({
+        'InputSwitchSettings': {
+            'InputAttachmentNameReference': unquote(input_name),
         }
-    }
+    })
     _write_schedule_item(channel_id, action)
     return {
         "ActiveInput": input_name
@@ -175,83 +474,114 @@ def put_active_input(channel_id, input_name):
 
 
 @app.post("/channels/<channel_id>/prepareinput/<input_name>")
+@request_metrics.route_handler
+@idempotent
 @tracer.capture_method
 def post_input_prepare(channel_id, input_name):
 
-    action_name = str(uuid.uuid4())
-    action = {
-        'ActionName': action_name,
-        'ScheduleActionSettings': {
-            'InputPrepareSettings': {
-                'InputAttachmentNameReference': unquote(input_name)
-            }
-        },
-        'ScheduleActionStartSettings': {
-            'ImmediateModeScheduleActionStartSettings': {}
+    action = _immediate_action({
+        'InputPrepareSettings': {
+            'InputAttachmentNameReference': unquote(input_name)
         }
-    }
+    })
     _write_schedule_item(channel_id, action)
 
 
 @app.post("/channels/<channel_id>/graphics/<graphic_id>/start")
+@request_metrics.route_handler
+@idempotent
 @tracer.capture_method
 def post_start_graphics(channel_id, graphic_id):
-    validate(event=app.current_event.json_body,
-             schema=schemas.start_graphics_body)
+    _validate(event=app.current_event.json_body,
+              schema=schemas.start_graphics_body)
 
     duration = app.current_event.json_body.get('Duration', 0)
 
-    item = table.get_item(
-        Key={
-            'ChannelId': channel_id,
-            'SK': f'GRAPHIC#{graphic_id}'
-        }
-    ).get('Item')
-
+    item = _get_graphics(channel_id, {graphic_id}).get(graphic_id)
     if not item:
         raise NotFoundError
 
-    action_name = str(uuid.uuid4())
-    action = {
-        'ActionName': action_name,
-        'ScheduleActionSettings': {
-            'MotionGraphicsImageActivateSettings': {
-                'Duration': duration,
-                'Url': item['Url'],
-            },
+    action = _immediate_action({
+        'MotionGraphicsImageActivateSettings': {
+            'Duration': duration,
+            'Url': item['Url'],
         },
-        'ScheduleActionStartSettings': {
-            'ImmediateModeScheduleActionStartSettings': {}
-        }
-    }
+    })
     _write_schedule_item(channel_id, action)
 
 
 @app.post("/channels/<channel_id>/graphics/stop")
+@request_metrics.route_handler
+@idempotent
 @tracer.capture_method
 def post_stop_graphics(channel_id):
 
-    action_name = str(uuid.uuid4())
-    action = {
-        'ActionName': action_name,
-        'ScheduleActionSettings': {
-            'MotionGraphicsImageDeactivateSettings': {}
-        },
-        'ScheduleActionStartSettings': {
-            'ImmediateModeScheduleActionStartSettings': {}
-        }
-    }
+    action = _immediate_action({
+        'MotionGraphicsImageDeactivateSettings': {}
+    })
     _write_schedule_item(channel_id, action)
 
 
+@app.get("/channels/<channel_id>/schedule")
+@request_metrics.route_handler
+@tracer.capture_method
+def get_schedule(channel_id):
+    actions = schedule_cache.get(channel_id, lambda: _describe_schedule(channel_id))
+    current, upcoming = split_schedule(actions, datetime.now(timezone.utc))
+    return {
+        'ChannelId': channel_id,
+        'Current': current,
+        'Upcoming': upcoming,
+    }
+
+
+@app.post("/channels/<channel_id>/schedule")
+@request_metrics.route_handler
+@idempotent
+@tracer.capture_method
+def post_schedule(channel_id):
+    _validate(event=app.current_event.json_body,
+              schema=schemas.post_schedule_body)
+
+    requested = app.current_event.json_body['Actions']
+    graphic_ids = {i['GraphicId'] for i in requested if i['Type'] == 'GRAPHIC_START'}
+    graphics = {}
+    if graphic_ids:
+        graphics = _get_graphics(channel_id, graphic_ids)
+        missing = graphic_ids - graphics.keys()
+        if missing:
+            raise NotFoundError(f'Graphics not found: {", ".join(sorted(missing))}')
+
+    actions = []
+    for i in requested:
+        if i['Type'] == 'INPUT_SWITCH':
+            settings = {'InputSwitchSettings': {'InputAttachmentNameReference': i['Input']}}
+        elif i['Type'] == 'INPUT_PREPARE':
+            settings = {'InputPrepareSettings': {'InputAttachmentNameReference': i['Input']}}
+        elif i['Type'] == 'GRAPHIC_START':
+            settings = {
+                'MotionGraphicsImageActivateSettings': {
+                    'Duration': i.get('Duration', 0),
+                    'Url': graphics[i['GraphicId']]['Url'],
+                },
+            }
+        else:
+            settings = {'MotionGraphicsImageDeactivateSettings': {}}
+        actions.append(_immediate_action(settings))
+
+    _write_schedule_items(channel_id, actions)
+    return {
+        'ActionNames': [i['ActionName'] for i in actions]
+    }
+
+
 @app.post("/channels/<channel_id>/graphics")
+@request_metrics.route_handler
+@idempotent
 @tracer.capture_method
 def post_graphic(channel_id):
-    validate(event=app.current_event.json_body,
-             schema=schemas.post_graphic_body)
-
-    # Validate channel exists
-    medialive.describe_channel(ChannelId=channel_id)
+    _validate(event=app.current_event.json_body,
+              schema=schemas.post_graphic_body)
 
     new_id = str(uuid.uuid4())
     item = {
@@ -262,12 +592,16 @@ def post_graphic(channel_id):
 
     item.update(app.current_event.json_body)
 
-    table.put_item(Item=item)
+    try:
+        _put_channel_item(item)
+    finally:
+        graphics_cache.invalidate(channel_id)
 
     return {key: value for key, value in item.items() if key != 'SK'}
 
 
 @app.delete("/channels/<channel_id>/graphics/<graphic_id>")
+@request_metrics.route_handler
 @tracer.capture_method
 def delete_graphic(channel_id, graphic_id):
 
@@ -277,18 +611,18 @@ def delete_graphic(channel_id, graphic_id):
             'SK': f'GRAPHIC#{graphic_id}'
         }
     )
+    graphics_cache.invalidate(channel_id)
 
     return Response(status_code=204)
 
 
 @app.post("/channels/<channel_id>/outputs")
+@request_metrics.route_handler
+@idempotent
 @tracer.capture_method
 def post_output(channel_id):
-    validate(event=app.current_event.json_body,
-             schema=schemas.post_output_body)
-
-    # Validate channel exists
-    medialive.describe_channel(ChannelId=channel_id)
+    _validate(event=app.current_event.json_body,
+              schema=schemas.post_output_body)
 
     new_id = str(uuid.uuid4())
     item = {
@@ -299,12 +633,13 @@ def post_output(channel_id):
 
     item.update(app.current_event.json_body)
 
-    table.put_item(Item=item)
+    _put_channel_item(item)
 
     return {key: value for key, value in item.items() if key != 'SK'}
 
 
 @app.delete("/channels/<channel_id>/outputs/<output_id>")
+@request_metrics.route_handler
 @tracer.capture_method
 def delete_output(channel_id, output_id):
 
@@ -319,29 +654,47 @@ def delete_output(channel_id, output_id):
 
 
 @app.get("/channels/<channel_id>/outputs/discover")
+@request_metrics.route_handler
 @tracer.capture_method
 def discover_outputs(channel_id):
-    channel = medialive.describe_channel(ChannelId=channel_id)
-    mp_channel_ids = [
+    refresh = app.current_event.get_query_string_value('refresh')
+    if refresh is not None and refresh not in ['true', 'false']:
+        raise BadRequestError(f'Given refresh: {refresh} is not valid.')
+    if refresh == 'true':
+        endpoint_cache.invalidate(ENDPOINT_INDEX_KEY)
+
+    channel = _describe_channel(channel_id)
+    mp_channel_ids = dict.fromkeys(
         i["ChannelId"] for i in
         _get_channel_mp_destinations(channel)
-    ]
-    results = []
-    paginator = mediapackage.get_paginator('list_origin_endpoints')
-    page_iterator = paginator.paginate()
-
-    for page in page_iterator:
-        for endpoint in page['OriginEndpoints']:
-            if endpoint["ChannelId"] in mp_channel_ids and any(i in endpoint for i in ["HlsPackage", "DashPackage"]):
-                results.append({
-                    "Name": endpoint["Id"],
-                    "Url": endpoint["Url"],
-                    "Type": "MEDIA_PACKAGE",
-                    "OutputMetadata": {
-                        "ChannelId": endpoint["ChannelId"],
-                    }
-                })
-    return {"Outputs": results}
+    )
+    endpoint_index = _get_endpoint_index()
+
+    return {"Outputs": [output for i in mp_channel_ids for output in endpoint_index.get(i, [])]}
+
+
+def _get_endpoint_index():
+    """
+    Returns the HLS and DASH origin endpoints in the account grouped by their
+    MediaPackage channel, listing every endpoint once per cache TTL
+    """
+    def load():
+        index = {}
+        paginator = mediapackage.get_paginator('list_origin_endpoints')
+        for page in paginator.paginate():
+            for endpoint in page['OriginEndpoints']:
+                if any(i in endpoint for i in ["HlsPackage", "DashPackage"]):
+                    index.setdefault(endpoint["ChannelId"], []).append({
+                        "Name": endpoint["Id"],
+                        "Url": endpoint["Url"],
+                        "Type": "MEDIA_PACKAGE",
+                        "OutputMetadata": {
+                            "ChannelId": endpoint["ChannelId"],
+                        }
+                    })
+        return index
+
+    return endpoint_cache.get(ENDPOINT_INDEX_KEY, load)
 
 
 @tracer.capture_method
@@ -350,6 +703,16 @@ def _get_channel_mp_destinations(channel_data):
     return list(chain(*[i.get("MediaPackageSettings") for i in dests if len(i.get("MediaPackageSettings", [])) > 0]))
 
 
+def _immediate_action(settings):
+    return {
+        'ActionName': str(uuid.uuid4()),
+        'ScheduleActionSettings': settings,
+        'ScheduleActionStartSettings': {
+            'ImmediateModeScheduleActionStartSettings': {}
+        }
+    }
+
+
 @tracer.capture_method
 def _write_schedule_item(channel_id, schedule_action):
     response = medialive.batch_update_schedule(
@@ -360,37 +723,316 @@ def _write_schedule_item(channel_id, schedule_action):
             ]
         }
     )
+    _invalidate_channel(channel_id)
+    _record_schedule_actions(channel_id, [schedule_action])
     return response
 
 
 @tracer.capture_method
-def _get_ml_channels():
+def _write_schedule_items(channel_id, schedule_actions):
+    # Actions are sent in order, in as few requests as MediaLive allows
+    for i in range(0, len(schedule_actions), SCHEDULE_BATCH_SIZE):
+        medialive.batch_update_schedule(
+            ChannelId=channel_id,
+            Creates={
+                'ScheduleActions': schedule_actions[i:i + SCHEDULE_BATCH_SIZE]
+            }
+        )
+    _invalidate_channel(channel_id)
+    _record_schedule_actions(channel_id, schedule_actions)
+
+
+def _record_schedule_actions(channel_id, schedule_actions):
+    written_at = datetime.now(timezone.utc)
+    schedule_cache.record(channel_id, [as_started(i, written_at) for i in schedule_actions])
+
+
+@tracer.capture_method
+def _describe_schedule(channel_id):
+    paginator = medialive.get_paginator('describe_schedule')
+    return [action for page in paginator.paginate(ChannelId=channel_id) for action in page['ScheduleActions']]
+
+
+@tracer.capture_method
+def _get_graphics(channel_id, graphic_ids):
+    """
+    Returns the requested graphic items by Id from the channel's cached
+    graphics. Changes made through this container invalidate the channel's
+    entry, and entries expire after GRAPHICS_CACHE_TTL seconds so that
+    changes made through other containers are picked up. Cached graphics
+    are loaded again if any are missing, so that graphics added elsewhere
+    can be activated straight away.
+    """
+    loaded = []
+
+    def load():
+        loaded.append(channel_id)
+        return {i['Id']: i for i in _query_channel_items(channel_id, 'GRAPHIC#')}
+
+    graphics = graphics_cache.get(channel_id, load)
+    if not loaded and not graphic_ids <= graphics.keys():
+        graphics_cache.invalidate(channel_id)
+        graphics = graphics_cache.get(channel_id, load)
+    return {i: graphics[i] for i in graphic_ids if i in graphics}
+
+
+def _validate(event, schema):
+    _load_validator()(event=event, schema=schema)
+
+
+@lru_cache(maxsize=None)
+def _load_validator():
+    # Imported on first use as only mutating routes validate their body, the
+    # handler is registered here as the exception cannot be raised before
+    from aws_lambda_powertools.utilities.validation import SchemaValidationError, validate
+    app.exception_handler(SchemaValidationError)(handle_schema_validation)
+    return validate
+
+
+def _run_concurrently(*calls):
+    """
+    Runs the given zero-argument callables on the shared executor and returns
+    their results in order. Once all calls have completed, the exception of the
+    first failed call is re-raised
+    """
+    futures = [executor.submit(call) for call in calls]
+    wait(futures)
+    return [future.result() for future in futures]
+
+
+@tracer.capture_method
+def _put_channel_item(item):
+    # Validate channel exists before writing, so that no item is left behind
+    # for a missing channel. Descriptions are usually cached
+    _describe_channel(item['ChannelId'])
+    table.meta.client.put_item(TableName=table.name, Item=items.serialize(item))
+
+
+def _describe_channel(channel_id):
+    return describe_cache.get(
+        channel_id, lambda: medialive.describe_channel(ChannelId=channel_id))
+
+
+def _list_channels():
+    def load():
+        paginator = medialive.get_paginator('list_channels')
+        return [channel for page in paginator.paginate() for channel in page['Channels']]
+
+    return list_cache.get(LIST_CHANNELS_KEY, load)
+
+
+def _invalidate_channel(channel_id):
+    describe_cache.invalidate(channel_id)
+    list_cache.invalidate(LIST_CHANNELS_KEY)
+
+
+def _cache_stats():
+    return {
+        'DescribeChannelCache': describe_cache.stats(),
+        'ListChannelsCache': list_cache.stats(),
+        'OriginEndpointCache': endpoint_cache.stats(),
+        'ScheduleCache': schedule_cache.stats(),
+        'GraphicsCache': graphics_cache.stats(),
+    }
+
+
+def _limiter_stats():
+    return {
+        'MediaLive': medialive_limiter.stats(),
+        'MediaPackage': mediapackage_limiter.stats(),
+    }
+
+
+@tracer.capture_method
+def _get_channels_page(limit, next_token, fields):
+    """
+    Returns a page of at most ``limit`` channels with a signed token for the
+    next page. Pages are read from the channel summaries once populated,
+    otherwise from MediaLive, so that only the channels on the page are
+    described. The source is kept in the token so a listing is never split
+    across both.
+    """
+    if limit is not None and not limit.isdigit():
+        raise BadRequestError(f'Given limit: {limit} is not valid.')
+    limit = int(limit or CHANNEL_PAGE_DEFAULT_LIMIT)
+    if not 0 < limit <= CHANNEL_PAGE_MAX_LIMIT:
+        raise BadRequestError(f'Given limit: {limit} is not valid.')
+    state = _decode_page_token(next_token) if next_token is not None else {}
+    if state:
+        source = state['Source']
+    else:
+        source = PAGE_SOURCE_SUMMARIES if _summaries_populated() else PAGE_SOURCE_MEDIALIVE
+
+    if source == PAGE_SOURCE_SUMMARIES:
+        kwargs = {
+            'IndexName': SUMMARY_INDEX,
+            'KeyConditionExpression': Key('EntityType').eq(SUMMARY_ENTITY_TYPE),
+            'Limit': limit,
+        }
+        if state:
+            kwargs['ExclusiveStartKey'] = state['Key']
+        response = table.query(**kwargs)
+        last_key = response.get('LastEvaluatedKey')
+        return {
+            'Channels': [_summary_to_channel(i, fields) for i in response['Items'] if not i.get('Deleted')],
+            'NextToken': page_tokens.encode({'Source': PAGE_SOURCE_SUMMARIES, 'Key': last_key})
+            if last_key else None,
+        }
+
+    config = {'MaxItems': limit, 'PageSize': limit}
+    if state:
+        config['StartingToken'] = state['Token']
+    page = medialive.get_paginator('list_channels').paginate(PaginationConfig=config).build_full_result()
+    return {
+        'Channels': _to_ml_channels(page['Channels'], fields),
+        'NextToken': page_tokens.encode({'Source': PAGE_SOURCE_MEDIALIVE, 'Token': page['NextToken']})
+        if page.get('NextToken') else None,
+    }
+
+
+def _decode_page_token(token):
+    try:
+        state = page_tokens.decode(token)
+        valid = state['Source'] in (PAGE_SOURCE_SUMMARIES, PAGE_SOURCE_MEDIALIVE)
+    except (ValueError, TypeError, KeyError):
+        valid = False
+    if not valid:
+        raise BadRequestError(f'Given nextToken: {token} is not valid.')
+    return state
+
+
+@tracer.capture_method
+def _get_ml_channels(fields=CHANNEL_FIELDS):
+    return _to_ml_channels(_list_channels(), fields)
+
+
+def _to_ml_channels(channels, fields):
+    # Everything but the active input is included in the list_channels pages
+    if 'InputAttachments' not in fields:
+        return [
+            _project({'Id': channel['Id'], 'State': channel['State'], 'Name': channel.get('Name', '')}, fields)
+            for channel in channels
+        ]
+
+    # executor.map preserves the order of the list_channels results
+    descriptions = executor.map(_describe_channel_safe, channels)
+
     results = []
-    paginator = medialive.get_paginator('list_channels')
-    page_iterator = paginator.paginate()
-
-    for page in page_iterator:
-        for channel in page['Channels']:
-            channel_description = medialive.describe_channel(
-                ChannelId=channel['Id'])
-
-            results.append({
-                'Id': channel['Id'],
-                'State': channel['State'],
-                'Name': channel.get('Name', ''),
-                'InputAttachments': [
-                    {
-                        "Id": i["InputId"],
-                        "Name": i["InputAttachmentName"],
-                        "Active": _is_input_active(i, channel_description.get('PipelineDetails', [])),
-                    }
-                    for i in channel.get('InputAttachments', [])
-                ],
-            })
+    for channel, channel_description in zip(channels, descriptions):
+        result = {
+            'Id': channel['Id'],
+            'State': channel['State'],
+            'Name': channel.get('Name', ''),
+            'InputAttachments': [
+                {
+                    "Id": i["InputId"],
+                    "Name": i["InputAttachmentName"],
+                    "Active": _is_input_active(i, (channel_description or {}).get('PipelineDetails', [])),
+                }
+                for i in channel.get('InputAttachments', [])
+            ],
+        }
+        if channel_description is None:
+            result['Degraded'] = True
+        results.append(_project(result, fields))
 
     return results
 
 
+def _project(channel, fields):
+    if len(fields) == len(CHANNEL_FIELDS):
+        return channel
+    # Degraded is kept as it qualifies the fields that were returned
+    return {k: v for k, v in channel.items() if k in fields or k == 'Degraded'}
+
+
+def _summaries_populated():
+    global summaries_populated
+    if not summaries_populated:
+        summaries_populated = 'Item' in table.get_item(
+            Key=SUMMARIES_POPULATED_KEY, ProjectionExpression='ChannelId')
+    return summaries_populated
+
+
+@tracer.capture_method
+def _get_channel_summaries():
+    return _query_all(
+        IndexName=SUMMARY_INDEX,
+        KeyConditionExpression=Key('EntityType').eq(SUMMARY_ENTITY_TYPE),
+    )
+
+
+def _query_all(**kwargs):
+    """
+    Returns the items of every page of a table query
+    """
+    results = []
+    while True:
+        response = table.query(**kwargs)
+        results.extend(response['Items'])
+        if not response.get('LastEvaluatedKey'):
+            return results
+        kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+
+def _query_channel_items(channel_id, prefix=None):
+    # Queries through the low-level client, avoiding the per-value type
+    # inspection and Decimal conversion of the table resource
+    key_condition = '#ChannelId = :ChannelId'
+    names = {'#ChannelId': 'ChannelId'}
+    values = {':ChannelId': {'S': channel_id}}
+    if prefix is not None:
+        key_condition += ' AND begins_with(#SK, :Prefix)'
+        names['#SK'] = 'SK'
+        values[':Prefix'] = {'S': prefix}
+
+    return items.query_all(
+        table.meta.client,
+        TableName=table.name,
+        KeyConditionExpression=key_condition,
+        ExpressionAttributeNames=names,
+        ExpressionAttributeValues=values,
+    )
+
+
+def _decode_alerts_token(token, partition):
+    try:
+        key = page_tokens.decode(token)
+        valid = set(key) == {'ChannelId', 'SK'} and key['ChannelId'] == {'S': partition} \
+            and set(key['SK']) == {'S'}
+    except (ValueError, TypeError, KeyError):
+        valid = False
+    if not valid:
+        raise BadRequestError(f'Given nextToken: {token} is not valid.')
+    return key
+
+
+def _summary_to_channel(summary, fields=CHANNEL_FIELDS):
+    # Matches _is_input_active, which only considers the first pipeline
+    active_input = summary.get('Pipeline0ActiveInput')
+    return _project({
+        'Id': summary['ChannelId'],
+        'State': summary.get('State', ''),
+        'Name': summary.get('Name', ''),
+        'InputAttachments': [
+            {
+                "Id": i["Id"],
+                "Name": i["Name"],
+                "Active": i["Name"] == active_input,
+            }
+            for i in summary.get('InputAttachments', [])
+        ],
+    }, fields)
+
+
+def _describe_channel_safe(channel):
+    try:
+        return _describe_channel(channel['Id'])
+    except (BotoCoreError, ClientError) as ex:
+        logger.warning(f"Unable to describe channel {channel['Id']}: {ex}")
+        return None
+
+
 @tracer.capture_method
 def _is_input_active(input_attachment, pipeline_details):
     if len(pipeline_details) == 0:
@@ -404,17 +1046,158 @@ def _update_channel_status(channel_id, status):
         response = medialive.stop_channel(ChannelId=channel_id)
     else:
         response = medialive.start_channel(ChannelId=channel_id)
+    _invalidate_channel(channel_id)
 
     return {'Id': response['Id'], 'State': response['State']}
 
 
+def _apply_etag(event, response):
+    """
+    Adds an ETag to successful GET responses so that polling clients can send
+    If-None-Match and receive an empty 304 when nothing has changed
+    """
+    if event.get('httpMethod') != 'GET' or response.get('statusCode') != 200 \
+            or response.get('isBase64Encoded'):
+        return response
+
+    digest = hashlib.blake2b(response['body'].encode(), digest_size=16).hexdigest()
+    etag = f'"{digest}"'
+    _set_response_header(response, 'ETag', etag)
+    _set_response_header(response, 'Cache-Control', 'no-cache')
+
+    if etag in _parse_if_none_match(_get_request_header(event, 'If-None-Match')):
+        response['statusCode'] = 304
+        response['body'] = ''
+    return response
+
+
+def _get_request_header(event, name):
+    headers = event.get('headers') or {}
+    return next((value for key, value in headers.items() if key.lower() == name.lower()), None)
+
+
+def _to_stored_response(result):
+    if isinstance(result, Response):
+        return {'StatusCode': result.status_code, 'ContentType': result.headers.get('Content-Type'),
+                'Body': result.body}
+    return {'Result': result}
+
+
+def _from_stored_response(stored):
+    if 'StatusCode' in stored:
+        return Response(status_code=stored['StatusCode'], content_type=stored['ContentType'],
+                        body=stored['Body'])
+    return stored['Result']
+
+
+def _set_response_header(response, name, value):
+    if 'multiValueHeaders' in response:
+        response['multiValueHeaders'][name] = [value]
+    else:
+        response.setdefault('headers', {})[name] = value
+
+
+def _parse_if_none_match(header):
+    if not header:
+        return set()
+    # Weak comparison is sufficient as the ETag is derived from the body
+    return {tag.strip().removeprefix('W/') for tag in header.split(',')}
+
+
+def _try_update_channel_status(channel_id, status):
+    """
+    Updates the channel status and returns the new state or the error for the
+    channel. Throttled calls have already been retried by the client
+    """
+    try:
+        return _update_channel_status(channel_id, status)
+    except ClientError as ex:
+        logger.warning(f"Unable to {status} channel {channel_id}: {ex}")
+        return {'Id': channel_id, 'Error': ex.response['Error']['Code']}
+    except BotoCoreError as ex:
+        logger.warning(f"Unable to {status} channel {channel_id}: {ex}")
+        return {'Id': channel_id, 'Error': type(ex).__name__}
+
+
 def is_valid_url(url, qualifying=('scheme', 'netloc')):
     tokens = urlparse(url)
     return all([getattr(tokens, qualifying_attr)
                 for qualifying_attr in qualifying])
 
 
+def _create_session():
+    # Resolve the credentials whilst the session is created, rather than on
+    # the first client created from it
+    created = boto3.Session()
+    created.get_credentials()
+    return created
+
+
+def _get_secret(secret_id):
+    return session.client('secretsmanager').get_secret_value(SecretId=secret_id)['SecretString']
+
+
+def _attach_resource(resource):
+    request_metrics.attach(resource.meta.client)
+    return resource
+
+
+def _publish_metrics(latency, cache_stats, limiter_stats):
+    """
+    Adds the request's latency, downstream calls, throttles and cache lookups
+    to the route's metrics, and emits the latency of each downstream call with
+    the route and operation as dimensions. The cache and limiter statistics
+    taken at the start of the request are subtracted from the current ones.
+    """
+    route = request_metrics.route or 'Unmatched'
+    metrics.add_dimension(name='Route', value=route)
+    metrics.add_metric(name='Latency', unit=MetricUnit.Milliseconds, value=latency)
+
+    calls = request_metrics.calls()
+    for service in DOWNSTREAM_SERVICES:
+        count = sum(len(latencies) for operation, latencies in calls.items()
+                    if operation.startswith(f'{service}.'))
+        metrics.add_metric(name=f'{service}Calls', unit=MetricUnit.Count, value=count)
+
+    # Calls rejected by the client-side rate limiters never reach the service
+    rejected = sum(
+        stats['Rejected'] - limiter_stats[limiter][kind]['Rejected']
+        for limiter, kinds in _limiter_stats().items()
+        for kind, stats in kinds.items()
+    )
+    throttles = sum(request_metrics.throttles().values()) + rejected
+    metrics.add_metric(name='Throttles', unit=MetricUnit.Count, value=throttles)
+
+    for name, stats in _cache_stats().items():
+        for counter in ('Hits', 'Misses'):
+            value = max(0, stats[counter] - cache_stats[name][counter])
+            metrics.add_metric(name=f'{name}{counter}', unit=MetricUnit.Count, value=value)
+
+    for operation, latencies in calls.items():
+        for i in range(0, len(latencies), EMF_MAX_VALUES):
+            operation_metrics = MetricManager(namespace=metrics.namespace, service=metrics.service)
+            operation_metrics.add_dimension(name='Route', value=route)
+            operation_metrics.add_dimension(name='Operation', value=operation)
+            for value in latencies[i:i + EMF_MAX_VALUES]:
+                operation_metrics.add_metric(name='DownstreamLatency', unit=MetricUnit.Milliseconds, value=value)
+            # Newer Powertools versions print and clear a metric once it holds
+            # the maximum number of values
+            if operation_metrics.metric_set:
+                print(json.dumps(operation_metrics.serialize_metric_set(), separators=(',', ':')))
+
+
 @logger.inject_lambda_context(correlation_id_path=correlation_paths.API_GATEWAY_REST)
+@metrics.log_metrics
 @tracer.capture_lambda_handler
 def lambda_handler(event, context):
-    return app.resolve(event, context)
+    start = perf_counter()
+    deadline = monotonic() + context.get_remaining_time_in_millis() / 1000 - RATE_LIMIT_DEADLINE_MARGIN
+    medialive_limiter.deadline = mediapackage_limiter.deadline = deadline
+    request_metrics.reset()
+    cache_stats = _cache_stats()
+    limiter_stats = _limiter_stats()
+    response = _apply_etag(event, app.resolve(event, context))
+    _publish_metrics((perf_counter() - start) * 1000, cache_stats, limiter_stats)
+    logger.info("Cache statistics", extra=_cache_stats())
+    logger.info("Rate limiter statistics", extra=_limiter_stats())
+    return response
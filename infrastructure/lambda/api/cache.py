@@ -0,0 +1,84 @@
+from collections import OrderedDict
+from threading import Lock
+from time import monotonic
+
+
+class TTLCache:
+    """
+    A size-bounded, thread-safe cache whose entries expire after ``ttl`` seconds.
+
+    Instances live at module level so entries survive between invocations of a
+    warm Lambda container. A ``ttl`` of 0 disables caching entirely.
+
+    Every invalidation advances the cache's version, and a value loaded on a
+    miss is only stored if the version is unchanged once it has loaded, so
+    that a load racing an invalidation cannot store what was invalidated.
+    """
+
+    def __init__(self, ttl, max_size=256):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self.version = 0
+        self._entries = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, key, loader):
+        """
+        Return the cached value for ``key``, calling ``loader`` to populate the
+        entry on a miss. Exceptions raised by ``loader`` are not cached.
+        """
+        if self.ttl <= 0:
+            return loader()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[0] > monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+            version = self.version
+
+        value = loader()
+        self.set(key, value, version)
+        return value
+
+    def set(self, key, value, version=None):
+        """
+        Store a value, unless ``version`` is given and the cache has since
+        been invalidated
+        """
+        if self.ttl <= 0:
+            return
+        with self._lock:
+            if version is not None and version != self.version:
+                return
+            self._entries[key] = (monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, *keys):
+        with self._lock:
+            self.version += 1
+            for key in keys:
+                self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self.version += 1
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "Hits": self.hits,
+                "Misses": self.misses,
+                "HitRatio": self.hits / lookups if lookups else 0.0,
+                "Size": len(self._entries),
+            }
@@ -0,0 +1,80 @@
+import json
+from time import time
+
+from boto3.dynamodb.conditions import Attr
+from botocore.exceptions import ClientError
+
+KEY_PREFIX = 'IDEMPOTENCY#'
+IN_PROGRESS = 'IN_PROGRESS'
+COMPLETED = 'COMPLETED'
+
+
+class IdempotencyStore:
+    """
+    Stores the responses of requests made with an idempotency key in the
+    channel table, partitioned by key and sorted by the request's method and
+    path, so that repeats within ``ttl`` seconds can be answered with the
+    stored response.
+
+    A key is claimed with a conditional write before the request is handled,
+    so that a repeat arriving whilst the first is still in progress can be
+    told so. Claims expire after ``in_progress_ttl`` seconds in case the
+    handler never completes, and are released if it fails so that the
+    request can be retried.
+
+    The table is returned by ``get_table`` on each call, so that the store
+    follows the table the API is configured with.
+    """
+
+    def __init__(self, get_table, ttl, in_progress_ttl):
+        self._get_table = get_table
+        self.ttl = ttl
+        self.in_progress_ttl = in_progress_ttl
+
+    def get(self, key, scope):
+        """
+        Returns the unexpired record of a key, or None. Expired records may not
+        yet have been removed by the table's TTL
+        """
+        item = self._get_table().get_item(Key=self._key(key, scope), ConsistentRead=True).get('Item')
+        if item and item['ExpiresAt'] > time():
+            return item
+        return None
+
+    def claim(self, key, scope, request_hash):
+        """
+        Claims a key for a request, returning False if it is already held by
+        an unexpired record
+        """
+        now = int(time())
+        try:
+            self._get_table().put_item(
+                Item={
+                    **self._key(key, scope),
+                    'Status': IN_PROGRESS,
+                    'RequestHash': request_hash,
+                    'ExpiresAt': now + self.in_progress_ttl,
+                },
+                ConditionExpression=Attr('ChannelId').not_exists() | Attr('ExpiresAt').lte(now),
+            )
+        except ClientError as ex:
+            if ex.response['Error']['Code'] == 'ConditionalCheckFailedException':
+                return False
+            raise
+        return True
+
+    def complete(self, key, scope, request_hash, response):
+        self._get_table().put_item(Item={
+            **self._key(key, scope),
+            'Status': COMPLETED,
+            'RequestHash': request_hash,
+            'Response': json.dumps(response),
+            'ExpiresAt': int(time()) + self.ttl,
+        })
+
+    def release(self, key, scope):
+        self._get_table().delete_item(Key=self._key(key, scope))
+
+    @staticmethod
+    def _key(key, scope):
+        return {'ChannelId': f'{KEY_PREFIX}{key}', 'SK': scope}
@@ -0,0 +1,35 @@
+from threading import Lock
+
+
+class Lazy:
+    """
+    Proxy that creates the wrapped object with ``factory`` on first attribute
+    access. Creating boto3 clients loads and parses their service models, so
+    deferring it means a cold start only pays for the clients a route uses.
+
+    Proxies whose factories share state that is not thread-safe, such as a
+    boto3 session, can share a ``lock`` so that only one of them is created
+    at a time. A shared lock should be reentrant if one factory uses another
+    proxy.
+    """
+
+    def __init__(self, factory, lock=None):
+        self._factory = factory
+        self._instance = None
+        self._lock = lock or Lock()
+
+    def __getattr__(self, name):
+        return getattr(self._get(), name)
+
+    @property
+    def created(self):
+        return self._instance is not None
+
+    def _get(self):
+        # Routes fan out across the shared executor, so guard against several
+        # threads creating the same client
+        if self._instance is None:
+            with self._lock:
+                if self._instance is None:
+                    self._instance = self._factory()
+        return self._instance
@@ -0,0 +1,123 @@
+from threading import Condition
+from time import monotonic
+
+from botocore.exceptions import ClientError
+
+READ = 'read'
+WRITE = 'write'
+READ_PREFIXES = ('Describe', 'List', 'Get')
+
+
+class TokenBucket:
+    """
+    Refills ``rate`` tokens per second up to ``capacity``, allowing short
+    bursts whilst holding the sustained call rate at ``rate``.
+    """
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or rate
+        self.tokens = self.capacity
+        self._updated_at = None
+
+    def take(self, now):
+        """
+        Take a token if one is available and return 0, otherwise return the
+        number of seconds until the next token is due
+        """
+        if self._updated_at is not None:
+            self.tokens = min(self.capacity, self.tokens + (now - self._updated_at) * self.rate)
+        self._updated_at = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0
+        return (1 - self.tokens) / self.rate
+
+
+class RateLimiter:
+    """
+    Client-side rate limiter with separate token buckets for read and write
+    calls. Reads yield to any write waiting for a token so that operator
+    actions are not queued behind background polling.
+
+    Instances are shared by every thread in the container, so rates should be
+    sized as the account limit divided by the expected container concurrency,
+    and capacities to the bursts a single request fans out into.
+
+    Calls are not held past ``deadline``, a ``monotonic`` time that should be
+    set to the end of the invocation being handled, so that waiting for a
+    token cannot run the function out of time.
+    """
+
+    def __init__(self, read_rate, write_rate, max_wait=1.0, read_capacity=None, write_capacity=None):
+        self.max_wait = max_wait
+        self.deadline = None
+        self._buckets = {READ: TokenBucket(read_rate, read_capacity),
+                         WRITE: TokenBucket(write_rate, write_capacity)}
+        self._stats = {kind: {"Acquired": 0, "Rejected": 0, "WaitTime": 0.0, "MaxWait": 0.0}
+                       for kind in self._buckets}
+        self._pending_writes = 0
+        self._condition = Condition()
+
+    def acquire(self, kind):
+        """
+        Block until a token of the given kind is available. Returns False
+        without waiting if one will not be available within ``max_wait`` or
+        before the deadline.
+        """
+        start = monotonic()
+        deadline = start + self.max_wait
+        if self.deadline is not None:
+            deadline = min(deadline, self.deadline)
+        with self._condition:
+            if kind == WRITE:
+                self._pending_writes += 1
+            try:
+                while True:
+                    now = monotonic()
+                    if kind == READ and self._pending_writes:
+                        wait = deadline - now
+                    else:
+                        wait = self._buckets[kind].take(now)
+                        if wait == 0:
+                            break
+                    if wait <= 0 or now + wait > deadline:
+                        self._stats[kind]["Rejected"] += 1
+                        return False
+                    self._condition.wait(wait)
+            finally:
+                if kind == WRITE:
+                    self._pending_writes -= 1
+                    self._condition.notify_all()
+
+            waited = monotonic() - start
+            stats = self._stats[kind]
+            stats["Acquired"] += 1
+            stats["WaitTime"] += waited
+            stats["MaxWait"] = max(stats["MaxWait"], waited)
+            return True
+
+    def attach(self, client):
+        """
+        Rate limit every call made through a boto3 client, raising the
+        client's TooManyRequestsException when no token can be acquired
+        """
+        service = client.meta.service_model.service_id.hyphenize()
+        throttled = getattr(client.exceptions, 'TooManyRequestsException', ClientError)
+
+        def before_parameter_build(model, **kwargs):
+            kind = READ if model.name.startswith(READ_PREFIXES) else WRITE
+            if not self.acquire(kind):
+                error = {"Error": {"Code": "TooManyRequestsException",
+                                   "Message": f"Client-side {kind} rate limit exceeded"}}
+                raise throttled(error, model.name)
+
+        client.meta.events.register(f'before-parameter-build.{service}', before_parameter_build)
+        return client
+
+    def stats(self):
+        with self._condition:
+            return {
+                kind: {**stats, "Tokens": round(self._buckets[kind].tokens, 2)}
+                for kind, stats in self._stats.items()
+            }
@@ -0,0 +1,179 @@
+from collections import OrderedDict
+from datetime import datetime, timezone
+from threading import Lock
+from time import monotonic
+
+# Actions replacing one another on the channel, so that only the latest to
+# start is current. Other actions are grouped by their settings type
+ACTION_GROUPS = {
+    'MotionGraphicsImageActivateSettings': 'MotionGraphics',
+    'MotionGraphicsImageDeactivateSettings': 'MotionGraphics',
+}
+
+
+class ScheduleCache:
+    """
+    A size-bounded, thread-safe cache of the schedule actions of each channel,
+    whose entries expire after ``ttl`` seconds. A ``ttl`` of 0 disables caching.
+
+    Actions written through the API are recorded as they are written, both
+    into the cached schedule, so that it stays current without listing the
+    schedule again, and by name for ``pending_ttl`` seconds, so that they are
+    kept across refreshes until describe_schedule returns them.
+    """
+
+    def __init__(self, ttl, pending_ttl=60, max_size=256):
+        self.ttl = ttl
+        self.pending_ttl = pending_ttl
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._pending = {}
+        self._lock = Lock()
+
+    def get(self, channel_id, loader):
+        """
+        Return the cached actions of a channel in schedule order, calling
+        ``loader`` to list them on a miss. Exceptions raised by ``loader`` are
+        not cached.
+        """
+        if self.ttl <= 0:
+            return loader()
+
+        with self._lock:
+            entry = self._entries.get(channel_id)
+            if entry and entry[0] > monotonic():
+                self._entries.move_to_end(channel_id)
+                self.hits += 1
+                return list(entry[1])
+            self.misses += 1
+
+        actions = list(loader())
+        with self._lock:
+            now = monotonic()
+            listed = {i['ActionName'] for i in actions}
+            pending = self._prune(channel_id, now, listed)
+            for action in pending.values():
+                _insert(actions, action)
+            self._entries[channel_id] = (now + self.ttl, actions)
+            self._entries.move_to_end(channel_id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+        return list(actions)
+
+    def record(self, channel_id, actions):
+        """
+        Record actions written to a channel's schedule, which should carry the
+        fixed start time they were written at if they started immediately
+        """
+        if self.ttl <= 0:
+            return
+        with self._lock:
+            now = monotonic()
+            self._prune(channel_id, now)
+            recorded = self._pending.setdefault(channel_id, {})
+            entry = self._entries.get(channel_id)
+            for action in actions:
+                recorded[action['ActionName']] = (now, action)
+                if entry:
+                    _insert(entry[1], action)
+
+    def invalidate(self, *channel_ids):
+        with self._lock:
+            for channel_id in channel_ids:
+                self._entries.pop(channel_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._pending.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "Hits": self.hits,
+                "Misses": self.misses,
+                "HitRatio": self.hits / lookups if lookups else 0.0,
+                "Size": len(self._entries),
+            }
+
+    def _prune(self, channel_id, now, listed=()):
+        """
+        Drop recorded actions that have been listed or have expired, returning
+        the remaining actions by name
+        """
+        recorded = self._pending.pop(channel_id, {})
+        remaining = {
+            name: entry for name, entry in recorded.items()
+            if name not in listed and entry[0] + self.pending_ttl > now
+        }
+        if remaining:
+            self._pending[channel_id] = remaining
+        return {name: action for name, (_, action) in remaining.items()}
+
+
+def start_time(action):
+    """
+    Returns the fixed start time of a schedule action, or None for actions
+    that start immediately or follow another action
+    """
+    fixed = action['ScheduleActionStartSettings'].get('FixedModeScheduleActionStartSettings')
+    if fixed is None:
+        return None
+    return datetime.fromisoformat(fixed['Time'].replace('Z', '+00:00'))
+
+
+def as_started(action, started_at):
+    """
+    Returns an immediate action as started at ``started_at``, the way
+    MediaLive lists immediate actions once they have run
+    """
+    if 'ImmediateModeScheduleActionStartSettings' not in action['ScheduleActionStartSettings']:
+        return action
+    time = started_at.astimezone(timezone.utc).isoformat(timespec='milliseconds').replace('+00:00', 'Z')
+    return {
+        **action,
+        'ScheduleActionStartSettings': {
+            'FixedModeScheduleActionStartSettings': {'Time': time},
+        },
+    }
+
+
+def split_schedule(actions, now):
+    """
+    Splits actions in schedule order into those current at ``now``, the
+    latest of each group to have started, and those yet to start. Actions
+    without a fixed start time are upcoming.
+    """
+    current, upcoming = {}, []
+    for action in actions:
+        started = start_time(action)
+        if started is not None and started <= now:
+            current[_group(action)] = action
+        else:
+            upcoming.append(action)
+    return sorted(current.values(), key=start_time), upcoming
+
+
+def _group(action):
+    settings = next(iter(action['ScheduleActionSettings']))
+    return ACTION_GROUPS.get(settings, settings)
+
+
+def _insert(actions, action):
+    """
+    Insert an action before the first action with a later fixed start time,
+    or at the end if there is none or it has no fixed start time
+    """
+    started = start_time(action)
+    if started is not None:
+        for i, existing in enumerate(actions):
+            existing_start = start_time(existing)
+            if existing_start is not None and existing_start > started:
+                actions.insert(i, action)
+                return
+    actions.append(action)
@@ -23,3 +23,65 @@ post_output_body = {
 }
 
 post_graphic_body = post_output_body
+
+post_schedule_body = {
+    "type": "object",
+    "properties": {
+        "Actions": {
+            "type": "array",
+            "minItems": 1,
+            "maxItems": 20,
+            "items": {
+                "oneOf": [
+                    {
+                        "type": "object",
+                        "properties": {
+                            "Type": {"enum": ["INPUT_SWITCH", "INPUT_PREPARE"]},
+                            "Input": {"type": "string", "minLength": 1}
+                        },
+                        "required": ["Type", "Input"],
+                        "additionalProperties": False
+                    },
+                    {
+                        "type": "object",
+                        "properties": {
+                            "Type": {"enum": ["GRAPHIC_START"]},
+                            "GraphicId": {"type": "string", "minLength": 1},
+                            "Duration": {"type": "integer"}
+                        },
+                        "required": ["Type", "GraphicId"],
+                        "additionalProperties": False
+                    },
+                    {
+                        "type": "object",
+                        "properties": {
+                            "Type": {"enum": ["GRAPHIC_STOP"]}
+                        },
+                        "required": ["Type"],
+                        "additionalProperties": False
+                    }
+                ]
+            }
+        }
+    },
+    "required": ["Actions"],
+    "additionalProperties": False
+}
+
+put_channels_status_body = {
+    "type": "object",
+    "properties": {
+        "ChannelIds": {
+            "type": "array",
+            "minItems": 1,
+            "maxItems": 100,
+            "uniqueItems": True,
+            "items": {
+                "type": "string",
+                "minLength": 1
+            }
+        }
+    },
+    "required": ["ChannelIds"],
+    "additionalProperties": False
+}
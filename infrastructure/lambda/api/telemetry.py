@@ -0,0 +1,87 @@
+from collections import defaultdict
+from functools import wraps
+from threading import Lock
+from time import perf_counter
+
+THROTTLING_ERROR_CODES = {
+    'TooManyRequestsException',
+    'ThrottlingException',
+    'Throttling',
+    'ProvisionedThroughputExceededException',
+    'RequestLimitExceeded',
+}
+
+
+class RequestMetrics:
+    """
+    Records what the metrics of a request are built from: the route that
+    handled it and the latency and outcome of every call made through an
+    attached boto3 client.
+
+    Calls are recorded from the executor's worker threads as well as the
+    request thread, so records are guarded by a lock. ``reset`` is called at
+    the start of each request as the instance lives at module level.
+    """
+
+    def __init__(self):
+        self.route = None
+        self._latencies = defaultdict(list)
+        self._throttles = defaultdict(int)
+        self._lock = Lock()
+
+    def reset(self):
+        with self._lock:
+            self.route = None
+            self._latencies.clear()
+            self._throttles.clear()
+
+    def route_handler(self, func):
+        """
+        Decorator recording ``func`` as the route handling the current request
+        """
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            self.route = func.__name__
+            return func(*args, **kwargs)
+
+        return wrapper
+
+    def attach(self, client):
+        """
+        Record the latency of every call made through a boto3 client, including
+        any retries, keyed by ``<ServiceId>.<OperationName>``
+        """
+        service_id = client.meta.service_model.service_id
+        service = service_id.hyphenize()
+
+        # Timed from parameter building, as before-call is short-circuited by
+        # any handler that returns a response, e.g. botocore's Stubber
+        def before_parameter_build(context, **kwargs):
+            context['RequestMetricsStart'] = perf_counter()
+
+        def after_call(model, parsed, context, **kwargs):
+            start = context.get('RequestMetricsStart')
+            if start is None:
+                return
+            operation = f"{service_id}.{model.name}"
+            code = parsed.get('Error', {}).get('Code')
+            with self._lock:
+                self._latencies[operation].append((perf_counter() - start) * 1000)
+                if code in THROTTLING_ERROR_CODES:
+                    self._throttles[operation] += 1
+
+        client.meta.events.register(f'before-parameter-build.{service}', before_parameter_build)
+        client.meta.events.register(f'after-call.{service}', after_call)
+        return client
+
+    def calls(self):
+        """
+        Returns the latencies in milliseconds of the calls made since the last
+        reset, by operation
+        """
+        with self._lock:
+            return {operation: list(latencies) for operation, latencies in self._latencies.items()}
+
+    def throttles(self):
+        with self._lock:
+            return dict(self._throttles)
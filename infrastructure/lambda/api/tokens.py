@@ -0,0 +1,38 @@
+import base64
+import hashlib
+import hmac
+import json
+
+SIGNATURE_SIZE = hashlib.sha256().digest_size
+
+
+class TokenSigner:
+    """
+    Encodes pagination state as opaque, URL safe tokens. Tokens are signed with
+    HMAC-SHA256 so that clients can neither forge nor alter them, and should
+    use the same key in every container so tokens survive between invocations.
+    """
+
+    def __init__(self, key):
+        self._key = key.encode() if isinstance(key, str) else key
+
+    def encode(self, payload):
+        data = json.dumps(payload, separators=(',', ':')).encode()
+        return base64.urlsafe_b64encode(self._sign(data) + data).decode().rstrip('=')
+
+    def decode(self, token):
+        """
+        Returns the payload of a token, raising ValueError if it is malformed or
+        was not signed with this key
+        """
+        try:
+            raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        except (ValueError, TypeError) as ex:
+            raise ValueError('Malformed token') from ex
+        signature, data = raw[:SIGNATURE_SIZE], raw[SIGNATURE_SIZE:]
+        if not hmac.compare_digest(signature, self._sign(data)):
+            raise ValueError('Invalid token signature')
+        return json.loads(data)
+
+    def _sign(self, data):
+        return hmac.new(self._key, data, hashlib.sha256).digest()
@@ -0,0 +1,204 @@
+"""
+Benchmarks every API route by driving app.lambda_handler with API Gateway
+events against stand-in MediaLive, MediaPackage and DynamoDB backends.
+
+Reports p50/p95/p99 latency, downstream calls and peak memory per route and
+fleet size, and compares them against a stored baseline. Downstream call
+counts are deterministic, so any increase is reported as a regression, whilst
+latency may exceed the baseline by --tolerance.
+
+Run from infrastructure/lambda:
+
+    python benchmarks/bench_api.py [--fleet 10 100 1000] [--latency 5] [--throttle-rate 0]
+    python benchmarks/bench_api.py --update-baseline
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import tracemalloc
+from contextlib import redirect_stdout
+from pathlib import Path
+from time import perf_counter
+from types import SimpleNamespace
+from unittest import mock
+
+ROOT = Path(__file__).parents[1]
+sys.path[:0] = [str(ROOT / "api"), str(ROOT / "shared"), str(ROOT / "benchmarks")]
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+os.environ.setdefault("CHANNEL_TABLE", "CHANNEL_TABLE")
+os.environ.setdefault("PAGE_TOKEN_KEY", "PAGE_TOKEN_KEY")
+os.environ.setdefault("POWERTOOLS_TRACE_DISABLED", "1")
+os.environ.setdefault("POWERTOOLS_LOG_LEVEL", "ERROR")
+
+import app  # noqa: E402
+import fakes  # noqa: E402
+
+DEFAULT_BASELINE = ROOT / "benchmarks" / "baseline.json"
+CHANNEL = "1000000"
+
+# (name, method, path, query, body, use channel summaries)
+ROUTES = [
+    ("list channels", "GET", "/channels", None, None, False),
+    ("list channels (summaries)", "GET", "/channels", None, None, True),
+    ("list channel changes", "GET", "/channels", {"since": "1650000000000"}, None, True),
+    ("list channel names", "GET", "/channels", {"fields": "Name,State"}, None, False),
+    ("list channels page", "GET", "/channels", {"limit": "20"}, None, False),
+    ("get channel", "GET", f"/channels/{CHANNEL}", None, None, False),
+    ("get channel alerts", "GET", f"/channels/{CHANNEL}", {"include": "alerts"}, None, False),
+    ("get alert history", "GET", f"/channels/{CHANNEL}/alerts", {"limit": "50"}, None, False),
+    ("discover outputs", "GET", f"/channels/{CHANNEL}/outputs/discover", {"refresh": "true"}, None, False),
+    ("get schedule", "GET", f"/channels/{CHANNEL}/schedule", None, None, False),
+    ("start channel", "PUT", f"/channels/{CHANNEL}/status/start", None, None, False),
+    ("start channels", "PUT", "/channels/status/start", None,
+     {"ChannelIds": [str(1000000 + i) for i in range(10)]}, False),
+    ("switch input", "PUT", f"/channels/{CHANNEL}/activeinput/Input%202", None, None, False),
+    ("prepare input", "POST", f"/channels/{CHANNEL}/prepareinput/Input%202", None, None, False),
+    ("start graphic", "POST", f"/channels/{CHANNEL}/graphics/0/start", None, {"Duration": 10}, False),
+    ("stop graphics", "POST", f"/channels/{CHANNEL}/graphics/stop", None, {}, False),
+    ("schedule actions", "POST", f"/channels/{CHANNEL}/schedule", None, {"Actions": [
+        {"Type": "INPUT_PREPARE", "Input": "Input 2"},
+        {"Type": "GRAPHIC_START", "GraphicId": "1"},
+        {"Type": "INPUT_SWITCH", "Input": "Input 2"},
+    ]}, False),
+    ("add graphic", "POST", f"/channels/{CHANNEL}/graphics", None,
+     {"Name": "Graphic", "Url": "https://example.com/graphic"}, False),
+    ("delete graphic", "DELETE", f"/channels/{CHANNEL}/graphics/9", None, None, False),
+    ("add output", "POST", f"/channels/{CHANNEL}/outputs", None,
+     {"Name": "Output", "Url": "https://example.com/output"}, False),
+    ("delete output", "DELETE", f"/channels/{CHANNEL}/outputs/9", None, None, False),
+]
+
+
+def api_event(method, path, query=None, body=None):
+    return {
+        "resource": "/{proxy+}",
+        "path": path,
+        "httpMethod": method,
+        "headers": {"Accept": "application/json"},
+        "multiValueHeaders": {},
+        "queryStringParameters": query,
+        "multiValueQueryStringParameters": None,
+        "pathParameters": {"proxy": path.lstrip("/")},
+        "requestContext": {"stage": "dev", "requestId": "c6af9ac6-7b61-11e6-9a41-93e8deadbeef"},
+        "body": json.dumps(body) if body is not None else None,
+        "isBase64Encoded": False,
+    }
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def run_route(route, fleet_size, args, context):
+    name, method, path, query, body, summaries = route
+    backend = fakes.Backend(latency=args.latency / 1000, throttle_rate=args.throttle_rate)
+    medialive, mediapackage, table = fakes.build_fleet(
+        backend, fleet_size, alerts_per_channel=args.alerts)
+    if not summaries:
+        table.summaries = []
+        table.partitions.pop("SUMMARIES")
+    app.summaries_populated = False
+    event = api_event(method, path, query, body)
+
+    # Metrics are printed as EMF objects, discard them rather than the report
+    with mock.patch.multiple(app, medialive=medialive, mediapackage=mediapackage, table=table), \
+            open(os.devnull, "w") as devnull, redirect_stdout(devnull):
+        def invoke():
+            # Measure each request against cold caches unless asked otherwise
+            if not args.warm_cache:
+                app.describe_cache.clear()
+                app.list_cache.clear()
+                app.endpoint_cache.clear()
+                app.schedule_cache.clear()
+                app.graphics_cache.clear()
+            return app.lambda_handler(event, context)
+
+        invoke()
+        backend.reset()
+        latencies, statuses = [], {}
+        for _ in range(args.iterations):
+            start = perf_counter()
+            response = invoke()
+            latencies.append((perf_counter() - start) * 1000)
+            statuses[response["statusCode"]] = statuses.get(response["statusCode"], 0) + 1
+        calls = {k: v / args.iterations for k, v in sorted(backend.calls.items())}
+
+        tracemalloc.start()
+        invoke()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    return {
+        "p50": percentile(latencies, 50),
+        "p95": percentile(latencies, 95),
+        "p99": percentile(latencies, 99),
+        "calls": calls,
+        "peak_kb": peak / 1024,
+        "statuses": statuses,
+    }
+
+
+def compare(results, baseline, tolerance):
+    regressions = []
+    for key, result in results.items():
+        expected = baseline.get(key)
+        if expected is None:
+            continue
+        for operation, count in result["calls"].items():
+            if count > expected["calls"].get(operation, 0):
+                regressions.append(f"{key}: {operation} calls {expected['calls'].get(operation, 0)} -> {count}")
+        if result["p95"] > expected["p95"] * (1 + tolerance):
+            regressions.append(f"{key}: p95 {expected['p95']:.1f}ms -> {result['p95']:.1f}ms")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--fleet", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--iterations", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=5, help="per-call latency in milliseconds")
+    parser.add_argument("--throttle-rate", type=float, default=0, help="fraction of media calls throttled")
+    parser.add_argument("--alerts", type=int, default=20, help="current alerts per channel")
+    parser.add_argument("--route", action="append", help="only run routes with names containing this")
+    parser.add_argument("--warm-cache", action="store_true")
+    parser.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE)
+    parser.add_argument("--update-baseline", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=0.5, help="allowed p95 increase over the baseline")
+    args = parser.parse_args()
+
+    logging.disable(logging.CRITICAL)
+    context = SimpleNamespace(function_name="ApiHandler", memory_limit_in_mb=128,
+                              invoked_function_arn="arn:aws:lambda:us-east-1:123456789012:function:ApiHandler",
+                              aws_request_id="52fdfc07-2182-154f-163f-5f0f9a621d72",
+                              get_remaining_time_in_millis=lambda: 5000)
+    routes = [r for r in ROUTES if not args.route or any(n in r[0] for n in args.route)]
+
+    results = {}
+    print(f"{'route':<28}{'fleet':>6}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'calls':>8}{'peak KB':>10}  statuses")
+    for fleet_size in args.fleet:
+        for route in routes:
+            result = run_route(route, fleet_size, args, context)
+            results[f"{route[0]} [{fleet_size}]"] = result
+            print(f"{route[0]:<28}{fleet_size:>6}{result['p50']:>9.1f}{result['p95']:>9.1f}{result['p99']:>9.1f}"
+                  f"{sum(result['calls'].values()):>8.0f}{result['peak_kb']:>10.0f}  {result['statuses']}")
+
+    if args.update_baseline:
+        baseline = json.loads(args.baseline.read_text()) if args.baseline.exists() else {}
+        baseline.update({k: {"p95": round(v["p95"], 2), "calls": v["calls"]} for k, v in results.items()})
+        args.baseline.write_text(json.dumps(baseline, indent=2, sort_keys=True) + "\n")
+        print(f"Baseline written to {args.baseline}")
+        return
+
+    if args.baseline.exists():
+        regressions = compare(results, json.loads(args.baseline.read_text()), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""
+Compares the CPU time of gzipping API responses against the bytes saved, for
+the channel list at several fleet sizes and channel data at several alert
+counts, at each gzip level. The transfer time saved assumes the given client
+bandwidth. API Gateway compresses responses from the template's
+ResponseCompressionMinSize, which this helps to choose.
+
+Run from infrastructure/lambda:
+
+    python benchmarks/bench_compression.py [--fleet 1 10 100 1000] [--alerts 0 20 100] [--levels 1 5 9]
+"""
+import argparse
+import base64
+import gzip
+import sys
+from pathlib import Path
+from timeit import repeat
+from types import SimpleNamespace
+from unittest import mock
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+from bench_api import CHANNEL, api_event, app, fakes  # noqa: E402
+
+LIST_CHANNELS = ("list channels", "/channels", None)
+GET_CHANNEL = ("get channel", f"/channels/{CHANNEL}", {"include": "alerts,graphics,outputs"})
+
+
+def response_body(path, query, fleet_size, alerts):
+    backend = fakes.Backend()
+    medialive, mediapackage, table = fakes.build_fleet(backend, fleet_size, alerts_per_channel=alerts)
+    context = SimpleNamespace(function_name="ApiHandler", memory_limit_in_mb=128,
+                              invoked_function_arn="arn:aws:lambda:us-east-1:123456789012:function:ApiHandler",
+                              aws_request_id="52fdfc07-2182-154f-163f-5f0f9a621d72",
+                              get_remaining_time_in_millis=lambda: 5000)
+    with mock.patch.multiple(app, medialive=medialive, mediapackage=mediapackage, table=table), mock.patch("builtins.print"):
+        return app.lambda_handler(api_event("GET", path, query), context)["body"].encode()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--fleet", type=int, nargs="+", default=[1, 10, 100, 1000])
+    parser.add_argument("--alerts", type=int, nargs="+", default=[0, 20, 100], help="current alerts per channel")
+    parser.add_argument("--levels", type=int, nargs="+", default=[1, 5, 9])
+    parser.add_argument("--bandwidth", type=float, default=10, help="client bandwidth in Mbit/s")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    bytes_per_ms = args.bandwidth * 1e6 / 8 / 1000
+    cases = [(LIST_CHANNELS, fleet_size, 0) for fleet_size in args.fleet]
+    cases += [(GET_CHANNEL, 1, alerts) for alerts in args.alerts]
+
+    print(f"{'route':<16}{'fleet':>6}{'alerts':>7}{'bytes':>9}{'level':>7}{'gzip bytes':>12}{'ratio':>7}"
+          f"{'cpu ms':>9}{'saved ms':>10}")
+    for (name, path, query), fleet_size, alerts in cases:
+        body = response_body(path, query, fleet_size, alerts)
+        for level in args.levels:
+            compressed = gzip.compress(body, compresslevel=level)
+            cpu = min(repeat(lambda: base64.b64encode(gzip.compress(body, compresslevel=level)),
+                             number=1, repeat=args.repeat)) * 1000
+            saved = (len(body) - len(compressed)) / bytes_per_ms
+            print(f"{name:<16}{fleet_size:>6}{alerts:>7}{len(body):>9}{level:>7}{len(compressed):>12}"
+                  f"{len(compressed) / len(body):>7.2f}{cpu:>9.3f}{saved:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
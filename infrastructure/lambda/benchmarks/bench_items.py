@@ -0,0 +1,65 @@
+"""
+Compares the per-item cost of converting channel table items with boto3's
+TypeSerializer/TypeDeserializer, as used by the table resource, against the
+schema aware conversion in shared/items.py.
+
+Run from infrastructure/lambda:
+
+    python benchmarks/bench_items.py [--items 1000] [--repeat 5]
+"""
+import argparse
+import sys
+from pathlib import Path
+from timeit import repeat
+
+from boto3.dynamodb.types import TypeDeserializer, TypeSerializer
+
+sys.path.insert(0, str(Path(__file__).parents[1] / "shared"))
+
+import items  # noqa: E402
+
+
+def build_items(count):
+    results = []
+    for i in range(count):
+        kind = ("GRAPHIC", "OUTPUT", "ALERT")[i % 3]
+        item = {"ChannelId": "1234567", "SK": f"{kind}#{i}", "Id": str(i)}
+        if kind == "ALERT":
+            item.update({"State": "SET", "Message": "Stopped receiving network data on [rtp://:5000]",
+                         "AlertedAt": 1650000000 + i, "ExpiresAt": 1650043200 + i})
+        else:
+            item.update({"Name": f"{kind.title()} {i}", "Url": f"https://example.com/{kind.lower()}/{i}"})
+        results.append(item)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--items", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    serializer = TypeSerializer()
+    deserializer = TypeDeserializer()
+    plain = build_items(args.items)
+    typed = [items.serialize(i) for i in plain]
+
+    cases = {
+        "deserialize (TypeDeserializer)":
+            lambda: [{k: deserializer.deserialize(v) for k, v in i.items()} for i in typed],
+        "deserialize (items)":
+            lambda: [items.deserialize(i) for i in typed],
+        "serialize (TypeSerializer)":
+            lambda: [{k: serializer.serialize(v) for k, v in i.items()} for i in plain],
+        "serialize (items)":
+            lambda: [items.serialize(i) for i in plain],
+    }
+
+    print(f"{'case':<34}{'us/item':>10}")
+    for name, case in cases.items():
+        best = min(repeat(case, number=1, repeat=args.repeat))
+        print(f"{name:<34}{best / args.items * 1e6:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,271 @@
+"""
+Stand-in MediaLive, MediaPackage and DynamoDB backends for benchmarking the
+API offline. Every call is counted, delayed by a configurable latency and,
+for the media services, throttled at a configurable rate.
+"""
+import random
+from collections import Counter
+from threading import Lock
+from time import sleep
+
+from botocore.exceptions import ClientError
+
+import items
+
+PAGE_SIZE = 100
+SCHEDULE_PAGE_SIZE = 100
+
+
+class Backend:
+    """
+    Shared call accounting for the stand-in clients
+    """
+
+    def __init__(self, latency=0.0, throttle_rate=0.0, seed=0):
+        self.latency = latency
+        self.throttle_rate = throttle_rate
+        self.calls = Counter()
+        self._random = random.Random(seed)
+        self._lock = Lock()
+
+    def call(self, service, operation, throttle=False):
+        with self._lock:
+            self.calls[f"{service}.{operation}"] += 1
+            throttled = throttle and self._random.random() < self.throttle_rate
+        if self.latency:
+            sleep(self.latency)
+        if throttled:
+            raise ClientError({"Error": {"Code": "TooManyRequestsException"}}, operation)
+
+    def reset(self):
+        with self._lock:
+            self.calls.clear()
+
+
+class Paginator:
+    """
+    Pages through ``items`` under ``key``, supporting the PageSize, MaxItems
+    and StartingToken pagination options of botocore's paginators
+    """
+
+    def __init__(self, key, items, page_size, call):
+        self._key = key
+        self._items = items
+        self._page_size = page_size
+        self._call = call
+
+    def paginate(self, PaginationConfig=None, **kwargs):
+        return PageIterator(self, PaginationConfig or {})
+
+
+class PageIterator:
+    def __init__(self, paginator, config):
+        self._paginator = paginator
+        self._config = config
+
+    def __iter__(self):
+        paginator = self._paginator
+        page_size = self._config.get("PageSize", paginator._page_size)
+        start = int(self._config.get("StartingToken") or 0)
+        end = min(len(paginator._items), start + self._config.get("MaxItems", len(paginator._items)))
+        for i in range(start, max(end, start + 1), page_size):
+            paginator._call()
+            yield {paginator._key: paginator._items[i:min(i + page_size, end)]}
+
+    def build_full_result(self):
+        items = [item for page in self for item in page[self._paginator._key]]
+        result = {self._paginator._key: items}
+        end = int(self._config.get("StartingToken") or 0) + len(items)
+        if end < len(self._paginator._items):
+            result["NextToken"] = str(end)
+        return result
+
+
+class FakeMediaLive:
+    def __init__(self, backend, channels, schedule_per_channel=100):
+        self.backend = backend
+        self.channels = {c["Id"]: c for c in channels}
+        self.schedule_per_channel = schedule_per_channel
+        self.schedules = {}
+
+    def _call(self, operation):
+        self.backend.call("medialive", operation, throttle=True)
+
+    def get_paginator(self, operation):
+        if operation == "describe_schedule":
+            return SchedulePaginator(self)
+        summaries = [
+            {k: c[k] for k in ("Id", "Name", "State", "InputAttachments")}
+            for c in self.channels.values()
+        ]
+        return Paginator("Channels", summaries, 20, lambda: self._call("ListChannels"))
+
+    def describe_channel(self, ChannelId):
+        self._call("DescribeChannel")
+        if ChannelId not in self.channels:
+            raise ClientError({"Error": {"Code": "NotFoundException"}}, "DescribeChannel")
+        return self.channels[ChannelId]
+
+    def start_channel(self, ChannelId):
+        self._call("StartChannel")
+        return {"Id": ChannelId, "State": "STARTING"}
+
+    def stop_channel(self, ChannelId):
+        self._call("StopChannel")
+        return {"Id": ChannelId, "State": "STOPPING"}
+
+    def batch_update_schedule(self, ChannelId, Creates):
+        self._call("BatchUpdateSchedule")
+        self.schedule(ChannelId).extend(Creates["ScheduleActions"])
+        return {"Creates": Creates}
+
+    def schedule(self, channel_id):
+        """
+        Returns the schedule of a channel, starting with input switches that
+        have already run
+        """
+        if channel_id not in self.schedules:
+            self.schedules[channel_id] = [{
+                "ActionName": f"{channel_id}-{n}",
+                "ScheduleActionSettings": {"InputSwitchSettings": {"InputAttachmentNameReference": f"Input {n % 2 + 1}"}},
+                "ScheduleActionStartSettings": {
+                    "FixedModeScheduleActionStartSettings": {"Time": f"2022-04-15T{n // 60 % 24:02d}:{n % 60:02d}:00.000Z"},
+                },
+            } for n in range(self.schedule_per_channel)]
+        return self.schedules[channel_id]
+
+
+class SchedulePaginator:
+    def __init__(self, medialive):
+        self._medialive = medialive
+
+    def paginate(self, ChannelId, **kwargs):
+        actions = self._medialive.schedule(ChannelId)
+        for i in range(0, max(len(actions), 1), SCHEDULE_PAGE_SIZE):
+            self._medialive._call("DescribeSchedule")
+            yield {"ScheduleActions": actions[i:i + SCHEDULE_PAGE_SIZE]}
+
+
+class FakeMediaPackage:
+    def __init__(self, backend, endpoints):
+        self.backend = backend
+        self.endpoints = endpoints
+
+    def get_paginator(self, operation):
+        return Paginator("OriginEndpoints", self.endpoints, 50,
+                         lambda: self.backend.call("mediapackage", "ListOriginEndpoints", throttle=True))
+
+
+class FakeLowLevelTable:
+    def __init__(self, table):
+        self._table = table
+
+    def query(self, TableName, KeyConditionExpression, ExpressionAttributeValues, ExclusiveStartKey=None,
+              ScanIndexForward=True, Limit=PAGE_SIZE, **kwargs):
+        self._table.backend.call("dynamodb", "Query")
+        partition = ExpressionAttributeValues[":ChannelId"]["S"]
+        keys = sorted(self._table.partitions.get(partition, {}), reverse=not ScanIndexForward)
+        prefix = ExpressionAttributeValues.get(":Prefix", {}).get("S", "")
+        start = ExpressionAttributeValues.get(":From", {}).get("S", "")
+        end = ExpressionAttributeValues.get(":To", {}).get("S", "\uffff")
+        keys = [k for k in keys if k.startswith(prefix) and start <= k <= end]
+        if ExclusiveStartKey is not None:
+            last = ExclusiveStartKey["SK"]["S"]
+            keys = [k for k in keys if (k > last if ScanIndexForward else k < last)]
+
+        page = keys[:Limit]
+        response = {"Items": [self._table.partitions[partition][k] for k in page]}
+        if len(keys) > Limit:
+            response["LastEvaluatedKey"] = {"ChannelId": {"S": partition}, "SK": {"S": page[-1]}}
+        return response
+
+
+    def put_item(self, TableName, Item, **kwargs):
+        self._table.backend.call("dynamodb", "PutItem")
+        self._table.partitions.setdefault(Item["ChannelId"]["S"], {})[Item["SK"]["S"]] = Item
+        return {}
+
+
+class FakeTable:
+    """
+    Holds items in their low-level form, keyed by partition and sort key
+    """
+
+    def __init__(self, backend, name="CHANNEL_TABLE"):
+        self.backend = backend
+        self.name = name
+        self.partitions = {}
+        self.summaries = []
+        self.meta = type("Meta", (), {})()
+        self.meta.client = FakeLowLevelTable(self)
+
+    def add(self, item):
+        self.partitions.setdefault(item["ChannelId"], {})[item["SK"]] = items.serialize(item)
+
+    def query(self, IndexName=None, ExclusiveStartKey=None, **kwargs):
+        self.backend.call("dynamodb", "Query")
+        return {"Items": self.summaries if IndexName else []}
+
+    def get_item(self, Key, **kwargs):
+        self.backend.call("dynamodb", "GetItem")
+        item = self.partitions.get(Key["ChannelId"], {}).get(Key["SK"])
+        return {"Item": items.deserialize(item)} if item else {}
+
+    def put_item(self, Item, **kwargs):
+        self.backend.call("dynamodb", "PutItem")
+        self.add(Item)
+        return {}
+
+    def delete_item(self, Key, **kwargs):
+        self.backend.call("dynamodb", "DeleteItem")
+        self.partitions.get(Key["ChannelId"], {}).pop(Key["SK"], None)
+        return {}
+
+
+def build_fleet(backend, channel_count, alerts_per_channel=5, history_per_channel=100):
+    """
+    Returns stand-in clients for a fleet of running channels, each with two
+    inputs, a MediaPackage destination with HLS and DASH endpoints, graphics,
+    outputs, alerts and alert history
+    """
+    channels, endpoints = [], []
+    table = FakeTable(backend)
+    for i in range(channel_count):
+        channel_id = f"{1000000 + i}"
+        inputs = [{"InputAttachmentName": f"Input {n}", "InputId": f"{channel_id}{n}"} for n in (1, 2)]
+        channels.append({
+            "Id": channel_id,
+            "Name": f"Channel {i}",
+            "State": "RUNNING",
+            "InputAttachments": inputs,
+            "PipelineDetails": [{"ActiveInputAttachmentName": "Input 1", "PipelineId": "0"}],
+            "Destinations": [{"Id": "mp", "MediaPackageSettings": [{"ChannelId": f"mp-{channel_id}"}]}],
+            "EncoderSettings": {"MotionGraphicsConfiguration": {"MotionGraphicsInsertion": "ENABLED"}},
+        })
+        for kind, package in (("HLS", "HlsPackage"), ("DASH", "DashPackage")):
+            endpoints.append({"Id": f"{channel_id}{kind}", "ChannelId": f"mp-{channel_id}", package: {},
+                              "Url": f"https://example.com/{channel_id}/{kind.lower()}"})
+        # Endpoints belonging to MediaPackage channels without a MediaLive channel
+        endpoints.append({"Id": f"other{i}", "ChannelId": f"other-{i}", "HlsPackage": {},
+                          "Url": f"https://example.com/other/{i}"})
+
+        for n in range(3):
+            for kind in ("GRAPHIC", "OUTPUT"):
+                table.add({"ChannelId": channel_id, "SK": f"{kind}#{n}", "Id": str(n),
+                           "Name": f"{kind.title()} {n}", "Url": f"https://example.com/{kind.lower()}/{n}"})
+        for n in range(alerts_per_channel):
+            table.add({"ChannelId": channel_id, "SK": f"ALERT#{n}", "Id": str(n), "State": "SET",
+                       "Message": "Stopped receiving network data", "AlertedAt": 1650000000 + n})
+        for n in range(history_per_channel):
+            table.add({"ChannelId": f"ALERTLOG#{channel_id}", "SK": f"{1650000000 + n:010d}#{n % 5}",
+                       "S": ("SET", "CLEARED")[n % 2], "M": "Stopped receiving network data"})
+        table.summaries.append({
+            "ChannelId": channel_id, "SK": "CHANNEL#summary", "EntityType": "CHANNEL",
+            "Name": f"Channel {i}", "State": "RUNNING", "ModifiedAt": 1650000000000 + i,
+            "InputAttachments": [{"Id": n["InputId"], "Name": n["InputAttachmentName"]} for n in inputs],
+            "Pipeline0ActiveInput": "Input 1",
+        })
+
+    table.add({"ChannelId": "SUMMARIES", "SK": "POPULATED", "ReconciledAt": 1650000000})
+
+    return FakeMediaLive(backend, channels), FakeMediaPackage(backend, endpoints), table
@@ -0,0 +1,93 @@
+from os import getenv
+
+import jwt
+from aws_lambda_powertools import Logger, Tracer
+from aws_lambda_powertools.utilities.typing import LambdaContext
+
+tracer = Tracer()
+logger = Logger(service="CONNECTIONS")
+
+region = getenv("AWS_REGION", getenv("AWS_DEFAULT_REGION"))
+user_pool_id = getenv("USER_POOL_ID")
+user_pool_client_id = getenv("USER_POOL_CLIENT_ID")
+issuer = f"https://cognito-idp.{region}.amazonaws.com/{user_pool_id}"
+
+# Browsers cannot set headers on WebSocket connections, so the access token
+# is sent as a subprotocol alongside this one, which the connection accepts
+PROTOCOL = "channel-orchestrator"
+# Minimum seconds between fetches of the user pool's signing keys, which are
+# refetched when a token is signed with an unknown key
+JWKS_REFRESH_INTERVAL = 300
+# Seconds for which the user pool's signing keys are cached
+JWKS_LIFESPAN = 3600
+
+jwks = jwt.PyJWKClient(f"{issuer}/.well-known/jwks.json", lifespan=JWKS_LIFESPAN, timeout=2,
+                       cooldown_duration=JWKS_REFRESH_INTERVAL)
+
+
+class Unauthorized(Exception):
+    pass
+
+
+def get_token(event):
+    """
+    Returns the access token sent as a subprotocol in the
+    Sec-WebSocket-Protocol header, or None
+    """
+    headers = {k.lower(): v for k, v in (event.get("headers") or {}).items()}
+    protocols = [i.strip() for i in headers.get("sec-websocket-protocol", "").split(",")]
+    return next((i for i in protocols if i and i != PROTOCOL), None)
+
+
+def verify(token):
+    """
+    Returns the claims of an access token issued to the stack's app client by
+    its user pool, raising Unauthorized for any other token
+    """
+    try:
+        header = jwt.get_unverified_header(token)
+    except jwt.InvalidTokenError as ex:
+        raise Unauthorized("Malformed token") from ex
+    try:
+        key = jwks.get_signing_key(header.get("kid"))
+    except jwt.PyJWKClientConnectionError:
+        raise
+    except jwt.PyJWKClientError as ex:
+        raise Unauthorized("Unknown signing key") from ex
+
+    try:
+        # Access tokens carry no aud claim, their audience is the client_id
+        claims = jwt.decode(token, key.key, algorithms=["RS256"], issuer=issuer,
+                            options={"require": ["exp", "iss", "token_use", "client_id"]})
+    except jwt.InvalidTokenError as ex:
+        raise Unauthorized(f"Invalid token: {ex}") from ex
+    if claims["token_use"] != "access":
+        raise Unauthorized("Invalid token use")
+    if claims["client_id"] != user_pool_client_id:
+        raise Unauthorized("Invalid client")
+    return claims
+
+
+def _policy(principal_id, effect, resource):
+    return {
+        "principalId": principal_id,
+        "policyDocument": {
+            "Version": "2012-10-17",
+            "Statement": [{"Action": "execute-api:Invoke", "Effect": effect, "Resource": resource}],
+        },
+    }
+
+
+@logger.inject_lambda_context
+@tracer.capture_lambda_handler
+def lambda_handler(event: dict, context: LambdaContext):
+    token = get_token(event)
+    try:
+        if token is None:
+            raise Unauthorized("Missing token")
+        claims = verify(token)
+    except Unauthorized as ex:
+        logger.warning(f"Rejected connection: {ex}")
+        # API Gateway responds with a 401 for this exact message
+        raise Exception("Unauthorized")
+    return _policy(claims["sub"], "Allow", event["methodArn"])
@@ -0,0 +1,92 @@
+import json
+from datetime import datetime, timedelta, timezone
+from os import getenv
+
+import boto3
+from boto3.dynamodb.conditions import Key
+
+from aws_lambda_powertools import Logger, Tracer
+from aws_lambda_powertools.logging import correlation_paths
+from aws_lambda_powertools.utilities.typing import LambdaContext
+
+from authorizer import PROTOCOL
+
+tracer = Tracer()
+logger = Logger(service="CONNECTIONS")
+
+session = boto3.Session()
+dynamodb = session.resource('dynamodb')
+table = dynamodb.Table(getenv('CHANNEL_TABLE'))
+# API Gateway closes WebSocket connections after two hours
+connection_expiry = int(getenv('CONNECTION_EXPIRY', 2))
+
+ALL_CHANNELS = "*"
+
+
+def connect(event):
+    # Connections are authorized by the $connect route's authorizer, which
+    # reads the access token from the subprotocols offered by the client.
+    # Browsers close the connection unless one of them is accepted
+    return {"statusCode": 200, "headers": {"Sec-WebSocket-Protocol": PROTOCOL}}
+
+
+@tracer.capture_method
+def subscribe(connection_id, channel_id):
+    expiry = datetime.now(timezone.utc) + timedelta(hours=connection_expiry)
+    with table.batch_writer() as batch:
+        batch.put_item(Item={
+            "ChannelId": f"SUBSCRIPTIONS#{channel_id}",
+            "SK": f"CONNECTION#{connection_id}",
+            "ConnectionId": connection_id,
+            "ExpiresAt": int(expiry.timestamp())
+        })
+        batch.put_item(Item={
+            "ChannelId": f"CONNECTION#{connection_id}",
+            "SK": f"SUBSCRIPTION#{channel_id}",
+            "ExpiresAt": int(expiry.timestamp())
+        })
+    return {"statusCode": 200}
+
+
+@tracer.capture_method
+def unsubscribe(connection_id, channel_id):
+    with table.batch_writer() as batch:
+        batch.delete_item(Key={"ChannelId": f"SUBSCRIPTIONS#{channel_id}", "SK": f"CONNECTION#{connection_id}"})
+        batch.delete_item(Key={"ChannelId": f"CONNECTION#{connection_id}", "SK": f"SUBSCRIPTION#{channel_id}"})
+    return {"statusCode": 200}
+
+
+@tracer.capture_method
+def disconnect(connection_id):
+    response = table.query(
+        KeyConditionExpression=Key("ChannelId").eq(f"CONNECTION#{connection_id}"),
+    )
+    for item in response["Items"]:
+        unsubscribe(connection_id, item["SK"].split("#", 1)[1])
+    return {"statusCode": 200}
+
+
+@logger.inject_lambda_context(correlation_id_path=correlation_paths.API_GATEWAY_REST)
+@tracer.capture_lambda_handler
+def lambda_handler(event: dict, context: LambdaContext):
+    route = event["requestContext"]["routeKey"]
+    connection_id = event["requestContext"]["connectionId"]
+
+    if route == "$connect":
+        return connect(event)
+    if route == "$disconnect":
+        return disconnect(connection_id)
+
+    try:
+        channel_id = json.loads(event.get("body") or "{}")["channelId"]
+    except (KeyError, ValueError):
+        logger.error(f"Invalid message received: {event.get('body')}")
+        return {"statusCode": 400}
+
+    if not isinstance(channel_id, str) or (channel_id != ALL_CHANNELS and not channel_id.isalnum()):
+        return {"statusCode": 400}
+    if route == "subscribe":
+        return subscribe(connection_id, channel_id)
+    if route == "unsubscribe":
+        return unsubscribe(connection_id, channel_id)
+    return {"statusCode": 400}
@@ -1,31 +1,88 @@
-from datetime import datetime, timedelta
+import json
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
 from os import getenv
+from threading import Lock
+from time import perf_counter
 
 import boto3
+from boto3.dynamodb.conditions import Key
+from botocore.exceptions import BotoCoreError, ClientError
 from aws_lambda_powertools.utilities.data_classes import event_source, EventBridgeEvent
 
-from aws_lambda_powertools import Logger, Tracer
+from aws_lambda_powertools import Logger, Metrics, Tracer
 from aws_lambda_powertools.logging import correlation_paths
+from aws_lambda_powertools.metrics import MetricUnit
 from aws_lambda_powertools.utilities.typing import LambdaContext
 
+import items
+
 tracer = Tracer()
 logger = Logger(service="EVENTS")
+metrics = Metrics(namespace=getenv("POWERTOOLS_METRICS_NAMESPACE", "ChannelOrchestrator"), service="EVENTS")
+# Metrics are added from the executor's worker threads whilst writing alerts
+metrics_lock = Lock()
 
 session = boto3.Session()
 dynamodb = session.resource('dynamodb')
+medialive = session.client('medialive')
 table = dynamodb.Table(getenv('CHANNEL_TABLE'))
 alert_expiry = int(getenv('ALERT_EXPIRY', 12))
+alert_write_concurrency = int(getenv('ALERT_WRITE_CONCURRENCY', 10))
+alert_flap_window = int(getenv('ALERT_FLAP_WINDOW', 30))
+alert_history_expiry = int(getenv('ALERT_HISTORY_EXPIRY', 30))
+websocket_endpoint = getenv('WEBSOCKET_ENDPOINT')
+connections = session.client('apigatewaymanagementapi', endpoint_url=websocket_endpoint) \
+    if websocket_endpoint else None
+executor = ThreadPoolExecutor(max_workers=alert_write_concurrency)
+
+SUMMARY_SK = "CHANNEL#summary"
+SUMMARY_ENTITY_TYPE = "CHANNEL"
+SUMMARY_INDEX = "EntityTypeIndex"
+# Marks the summaries as populated once a reconcile has summarised every
+# channel, until which the API lists channels from MediaLive
+SUMMARIES_POPULATED_KEY = {"ChannelId": "SUMMARIES", "SK": "POPULATED"}
+TOMBSTONE_EXPIRY = 24
+ALL_CHANNELS = "*"
+ALERT_HISTORY_PREFIX = "ALERTLOG#"
+ALERT_MEMO_SIZE = 10000
+# Last alert written per (channel_id, alarm_id) as (AlertedAt, State, FlapCount),
+# kept for the lifetime of the container
+alert_memo = OrderedDict()
+alert_memo_lock = Lock()
 
 
-def process_event(event: EventBridgeEvent):
+def process_event(event: EventBridgeEvent, flaps=0, history=True):
+    """
+    Stores the latest state of an alarm. ``flaps`` is the number of state
+    changes already collapsed into this event, e.g. from the same SQS batch.
+    ``history`` is False when the event has already been added to the alert
+    history.
+    """
     try:
-        alarm_id = event.detail["alarm_id"]
-        alarm_state = event.detail["alarm_state"].upper()
-        message = event.detail["message"]
-        channel_id = event.detail["channel_arn"].split(":")[-1]
+        alert = _parse_alert(event)
+        channel_id, alarm_id, alarm_state, message, event_ts = alert
         logger.info(f"Received {alarm_state} alert for channel {channel_id}: {message} ({alarm_id})")
-        event_datetime = datetime.strptime(event.time, '%Y-%m-%dT%H:%M:%S%z')
-        event_ts = int(event_datetime.timestamp())
+        _add_metric("AlertIngestLag", MetricUnit.Milliseconds,
+                    (datetime.now(timezone.utc).timestamp() - event_ts) * 1000)
+        if history:
+            _record_alert_history([alert])
+
+        key = (channel_id, alarm_id)
+        previous = alert_memo.get(key)
+        if previous is not None:
+            previous_ts, previous_state, previous_flaps = previous
+            if event_ts <= previous_ts:
+                logger.info("Skipping alert older than the last alert written")
+                return
+            if event_ts - previous_ts <= alert_flap_window:
+                if alarm_state == previous_state and not flaps:
+                    logger.info("Skipping repeated alert within flap window")
+                    return
+                # Accumulate state changes whilst the alarm keeps flapping
+                flaps += previous_flaps + (alarm_state != previous_state)
+
         params = {
             "ChannelId": channel_id,
             "SK": f"ALERT#{alarm_id}",
@@ -34,28 +91,398 @@ def process_event(event: EventBridgeEvent):
             "Message": message,
             "AlertedAt": event_ts
         }
+        if flaps:
+            params["FlapCount"] = flaps
         if alarm_state == "CLEARED" and alert_expiry > 0:
-            event_datetime = datetime.strptime(event.time, '%Y-%m-%dT%H:%M:%S%z')
-            expiry = event_datetime + timedelta(hours=alert_expiry)
-            params["ExpiresAt"] = int(expiry.timestamp())
-        table.put_item(
-            Item=params,
+            params["ExpiresAt"] = event_ts + alert_expiry * 3600
+        table.meta.client.put_item(
+            TableName=table.name,
+            Item=items.serialize(params),
             ConditionExpression='attribute_not_exists(#SK) OR #AlertedAt < :AlertedAt',
             ExpressionAttributeNames={"#SK": "SK", "#AlertedAt": "AlertedAt"},
-            ExpressionAttributeValues={':AlertedAt': event_ts}
+            ExpressionAttributeValues={':AlertedAt': {"N": str(event_ts)}}
         )
-    except KeyError as err:
+        _remember_alert(key, (event_ts, alarm_state, flaps))
+        notify_subscribers(channel_id, {"Type": "ALERT", "ChannelId": channel_id, "Alert": params})
+    except (KeyError, ValueError) as err:
         logger.error(f"Invalid event received: {event.detail}")
         raise err
     except dynamodb.meta.client.exceptions.ConditionalCheckFailedException:
         logger.warning("Skipping older alert")
+        # The stored alert is at least as new as this one
+        _remember_alert(key, (event_ts, alarm_state, flaps))
     except dynamodb.meta.client.exceptions.ClientError as err:
         logger.error(f"Unable to write event to DynamoDB: {event.detail}")
         raise err
 
 
+def process_alert_batch(records):
+    """
+    Processes a batch of alert events delivered through SQS. Only the newest
+    event for each alarm is written as older events would fail the conditional
+    write, and messages that fail are reported so that only they are retried.
+    Every message is retried if the history cannot be written, which is safe
+    as history items are keyed by the alert they record. Messages that are
+    not channel alerts would fail on every retry, so they are logged and
+    acknowledged.
+    """
+    failures = []
+    alarms = {}
+    alerts = []
+    message_ids = []
+    for record in records:
+        try:
+            event = EventBridgeEvent(json.loads(record["body"]))
+            alert = _parse_alert(event)
+        except (KeyError, ValueError):
+            logger.error(f"Discarding invalid message: {record.get('body')}")
+            continue
+        alerts.append(alert)
+        message_ids.append(record["messageId"])
+        channel_id, alarm_id, _, _, event_ts = alert
+        alarms.setdefault((channel_id, alarm_id), []).append((event_ts, record["messageId"], event))
+
+    # Every transition is kept in the history, even those not written below
+    try:
+        _record_alert_history(alerts)
+    except (BotoCoreError, ClientError) as err:
+        logger.error(f"Unable to write alert history: {err}")
+        failures.extend(message_ids)
+
+    survivors = []
+    for alarm_events in alarms.values():
+        # Sorting is stable, so later records win ties
+        alarm_events.sort(key=lambda i: i[0])
+        _, message_id, event = alarm_events[-1]
+        survivors.append((message_id, event, _count_flaps(alarm_events)))
+
+    logger.info(f"Writing {len(survivors)} of {len(records)} alerts")
+    futures = [executor.submit(process_event, event, flaps, False) for _, event, flaps in survivors]
+    for (message_id, _, _), future in zip(survivors, futures):
+        if future.exception() is not None and message_id not in failures:
+            failures.append(message_id)
+
+    return {"batchItemFailures": [{"itemIdentifier": i} for i in failures]}
+
+
+def process_state_change(event: EventBridgeEvent):
+    try:
+        channel_id = event.detail["channel_arn"].split(":")[-1]
+        state = event.detail["state"].upper()
+        event_ts = _event_timestamp(event)
+        logger.info(f"Received {state} state change for channel {channel_id}")
+        if state == "DELETED":
+            _mark_channel_deleted(channel_id)
+            return
+        response = table.update_item(
+            Key={"ChannelId": channel_id, "SK": SUMMARY_SK},
+            UpdateExpression="SET #State = :State, #EntityType = :EntityType, "
+                             "#StateUpdatedAt = :EventAt, #LastEventAt = :EventAt, #ModifiedAt = :ModifiedAt",
+            ConditionExpression="(attribute_not_exists(#StateUpdatedAt) OR #StateUpdatedAt <= :EventAt) "
+                                "AND (attribute_not_exists(#State) OR #State <> :State)",
+            ExpressionAttributeNames={
+                "#State": "State",
+                "#EntityType": "EntityType",
+                "#StateUpdatedAt": "StateUpdatedAt",
+                "#LastEventAt": "LastEventAt",
+                "#ModifiedAt": "ModifiedAt",
+            },
+            ExpressionAttributeValues={
+                ":State": state,
+                ":EntityType": SUMMARY_ENTITY_TYPE,
+                ":EventAt": event_ts,
+                ":ModifiedAt": _modified_at(),
+            },
+            ReturnValues="ALL_NEW",
+        )
+        _add_channel_details(channel_id, response["Attributes"])
+        notify_subscribers(channel_id, {"Type": "STATE", "ChannelId": channel_id, "State": state})
+    except KeyError as err:
+        logger.error(f"Invalid event received: {event.detail}")
+        raise err
+    except dynamodb.meta.client.exceptions.ConditionalCheckFailedException:
+        logger.warning("Skipping older or unchanged state change")
+
+
+def process_input_change(event: EventBridgeEvent):
+    try:
+        channel_id = event.detail["channel_arn"].split(":")[-1]
+        pipeline = event.detail["pipeline"]
+        input_name = event.detail["active_input_attachment_name"]
+        event_ts = _event_timestamp(event)
+        logger.info(f"Received input change to {input_name} on pipeline {pipeline} for channel {channel_id}")
+        response = table.update_item(
+            Key={"ChannelId": channel_id, "SK": SUMMARY_SK},
+            UpdateExpression="SET #ActiveInput = :ActiveInput, #EntityType = :EntityType, "
+                             "#InputUpdatedAt = :EventAt, #LastEventAt = :EventAt, #ModifiedAt = :ModifiedAt",
+            ConditionExpression="(attribute_not_exists(#InputUpdatedAt) OR #InputUpdatedAt <= :EventAt) "
+                                "AND (attribute_not_exists(#ActiveInput) OR #ActiveInput <> :ActiveInput)",
+            ExpressionAttributeNames={
+                "#ActiveInput": f"Pipeline{pipeline}ActiveInput",
+                "#EntityType": "EntityType",
+                "#InputUpdatedAt": f"Pipeline{pipeline}UpdatedAt",
+                "#LastEventAt": "LastEventAt",
+                "#ModifiedAt": "ModifiedAt",
+            },
+            ExpressionAttributeValues={
+                ":ActiveInput": input_name,
+                ":EntityType": SUMMARY_ENTITY_TYPE,
+                ":EventAt": event_ts,
+                ":ModifiedAt": _modified_at(),
+            },
+            ReturnValues="ALL_NEW",
+        )
+        _add_channel_details(channel_id, response["Attributes"])
+        notify_subscribers(channel_id, {
+            "Type": "INPUT", "ChannelId": channel_id, "Pipeline": pipeline, "ActiveInput": input_name})
+    except KeyError as err:
+        logger.error(f"Invalid event received: {event.detail}")
+        raise err
+    except dynamodb.meta.client.exceptions.ConditionalCheckFailedException:
+        logger.warning("Skipping older or unchanged input change")
+
+
+@tracer.capture_method
+def reconcile_channels():
+    """
+    Repairs drift between the channel summaries and MediaLive, e.g. for
+    channels created or deleted without a corresponding event being delivered,
+    and then marks the summaries as populated. Summaries are only written when
+    they differ so that ModifiedAt only changes when a channel does
+    """
+    now = int(datetime.now(timezone.utc).timestamp())
+    summaries = {
+        item["ChannelId"]: item for item in _get_channel_summaries()
+        if not item.get("Deleted")
+    }
+
+    paginator = medialive.get_paginator('list_channels')
+    for page in paginator.paginate():
+        for channel in page['Channels']:
+            summary = summaries.pop(channel["Id"], {})
+            fields = dict(_channel_details(channel), State=channel["State"])
+            # Only running channels have an active input to repair
+            if channel["State"] == "RUNNING":
+                description = medialive.describe_channel(ChannelId=channel["Id"])
+                for pipeline in description.get("PipelineDetails", []):
+                    fields[f"Pipeline{pipeline['PipelineId']}ActiveInput"] = pipeline["ActiveInputAttachmentName"]
+
+            changed = {key: value for key, value in fields.items() if summary.get(key) != value}
+            if not changed:
+                continue
+
+            updated_at = {"StateUpdatedAt"} if "State" in changed else set()
+            updated_at.update(key.replace("ActiveInput", "UpdatedAt") for key in changed if key.endswith("ActiveInput"))
+            values = dict(changed, EntityType=SUMMARY_ENTITY_TYPE, ModifiedAt=_modified_at())
+            values.update({key: now for key in updated_at})
+            table.update_item(
+                Key={"ChannelId": channel["Id"], "SK": SUMMARY_SK},
+                UpdateExpression="SET " + ", ".join(f"#{key} = :{key}" for key in values),
+                ExpressionAttributeNames={f"#{key}": key for key in values},
+                ExpressionAttributeValues={f":{key}": value for key, value in values.items()}
+            )
+            notify_subscribers(channel["Id"], {"Type": "STATE", "ChannelId": channel["Id"], "State": channel["State"]})
+
+    for channel_id in summaries:
+        logger.info(f"Removing summary for deleted channel {channel_id}")
+        _mark_channel_deleted(channel_id)
+
+    table.put_item(Item=dict(SUMMARIES_POPULATED_KEY, ReconciledAt=now))
+
+
+@tracer.capture_method
+def notify_subscribers(channel_id, message):
+    """
+    Pushes a message to every WebSocket connection subscribed to the channel or
+    to all channels. Subscriptions for closed connections are removed
+    """
+    if connections is None:
+        return
+
+    data = json.dumps(message).encode()
+    notified = set()
+    for subscription in (channel_id, ALL_CHANNELS):
+        response = table.query(
+            KeyConditionExpression=Key("ChannelId").eq(f"SUBSCRIPTIONS#{subscription}"),
+        )
+        for item in response["Items"]:
+            connection_id = item["ConnectionId"]
+            if connection_id in notified:
+                continue
+            notified.add(connection_id)
+            try:
+                connections.post_to_connection(ConnectionId=connection_id, Data=data)
+            except connections.exceptions.GoneException:
+                logger.info(f"Removing subscription for closed connection {connection_id}")
+                table.delete_item(Key={"ChannelId": item["ChannelId"], "SK": item["SK"]})
+            except ClientError as err:
+                # Clients fall back to polling, so a failed push must not fail the event
+                logger.warning(f"Unable to notify connection {connection_id}: {err}")
+
+
+def _add_channel_details(channel_id, summary):
+    """
+    Adds the name and input attachments to a summary first written by a state
+    or input change, e.g. for a channel created since the last reconcile.
+    Details written since by a reconcile are kept
+    """
+    if "Name" in summary:
+        return
+    try:
+        details = _channel_details(medialive.describe_channel(ChannelId=channel_id))
+    except ClientError as err:
+        # The next reconcile adds them instead
+        logger.warning(f"Unable to describe channel {channel_id}: {err}")
+        return
+    table.update_item(
+        Key={"ChannelId": channel_id, "SK": SUMMARY_SK},
+        UpdateExpression="SET #Name = if_not_exists(#Name, :Name), "
+                         "#InputAttachments = if_not_exists(#InputAttachments, :InputAttachments), "
+                         "#ModifiedAt = :ModifiedAt",
+        ExpressionAttributeNames={
+            "#Name": "Name",
+            "#InputAttachments": "InputAttachments",
+            "#ModifiedAt": "ModifiedAt",
+        },
+        ExpressionAttributeValues={
+            ":Name": details["Name"],
+            ":InputAttachments": details["InputAttachments"],
+            ":ModifiedAt": _modified_at(),
+        }
+    )
+
+
+def _channel_details(channel):
+    # Fields of a summary taken from a listed or described channel
+    return {
+        "Name": channel.get("Name", ""),
+        "InputAttachments": [
+            {"Id": i["InputId"], "Name": i["InputAttachmentName"]}
+            for i in channel.get("InputAttachments", [])
+        ],
+    }
+
+
+def _mark_channel_deleted(channel_id):
+    # Keep a tombstone so that delta requests can report the deletion
+    expiry = datetime.now(timezone.utc) + timedelta(hours=TOMBSTONE_EXPIRY)
+    table.update_item(
+        Key={"ChannelId": channel_id, "SK": SUMMARY_SK},
+        UpdateExpression="SET #Deleted = :Deleted, #EntityType = :EntityType, "
+                         "#ModifiedAt = :ModifiedAt, #ExpiresAt = :ExpiresAt",
+        ExpressionAttributeNames={
+            "#Deleted": "Deleted",
+            "#EntityType": "EntityType",
+            "#ModifiedAt": "ModifiedAt",
+            "#ExpiresAt": "ExpiresAt",
+        },
+        ExpressionAttributeValues={
+            ":Deleted": True,
+            ":EntityType": SUMMARY_ENTITY_TYPE,
+            ":ModifiedAt": _modified_at(),
+            ":ExpiresAt": int(expiry.timestamp()),
+        }
+    )
+    notify_subscribers(channel_id, {"Type": "STATE", "ChannelId": channel_id, "State": "DELETED"})
+
+
+def _parse_alert(event: EventBridgeEvent):
+    return (
+        event.detail["channel_arn"].split(":")[-1],
+        event.detail["alarm_id"],
+        event.detail["alarm_state"].upper(),
+        event.detail["message"],
+        _event_timestamp(event),
+    )
+
+
+@tracer.capture_method
+def _record_alert_history(alerts):
+    """
+    Adds alerts to the history of their channel. History items are kept in a
+    separate partition ordered by time, and use short attribute names as there
+    is an item for every transition
+    """
+    with table.batch_writer(overwrite_by_pkeys=["ChannelId", "SK"]) as batch:
+        for channel_id, alarm_id, alarm_state, message, event_ts in alerts:
+            item = {
+                "ChannelId": f"{ALERT_HISTORY_PREFIX}{channel_id}",
+                "SK": f"{event_ts:010d}#{alarm_id}",
+                "S": alarm_state,
+                "M": message,
+            }
+            if alert_history_expiry > 0:
+                item["ExpiresAt"] = event_ts + alert_history_expiry * 86400
+            batch.put_item(Item=item)
+
+
+def _count_flaps(alarm_events):
+    # State changes within the flap window of the newest event
+    newest_ts = alarm_events[-1][0]
+    states = [e.detail["alarm_state"].upper() for ts, _, e in alarm_events if newest_ts - ts <= alert_flap_window]
+    return sum(a != b for a, b in zip(states, states[1:]))
+
+
+def _remember_alert(key, alert):
+    with alert_memo_lock:
+        alert_memo[key] = alert
+        alert_memo.move_to_end(key)
+        while len(alert_memo) > ALERT_MEMO_SIZE:
+            alert_memo.popitem(last=False)
+
+
+def _add_metric(name, unit, value):
+    with metrics_lock:
+        metrics.add_metric(name=name, unit=unit, value=value)
+
+
+def _modified_at():
+    # Millisecond resolution version used by GET /channels?since=
+    return int(datetime.now(timezone.utc).timestamp() * 1000)
+
+
+def _get_channel_summaries():
+    kwargs = {
+        "IndexName": SUMMARY_INDEX,
+        "KeyConditionExpression": Key("EntityType").eq(SUMMARY_ENTITY_TYPE),
+    }
+    while True:
+        response = table.query(**kwargs)
+        yield from response["Items"]
+        if "LastEvaluatedKey" not in response:
+            return
+        kwargs["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+
+
+def _event_timestamp(event: EventBridgeEvent):
+    return int(datetime.strptime(event.time, '%Y-%m-%dT%H:%M:%S%z').timestamp())
+
+
 @logger.inject_lambda_context(correlation_id_path=correlation_paths.EVENT_BRIDGE)
+@metrics.log_metrics
 @event_source(data_class=EventBridgeEvent)
 def lambda_handler(event: EventBridgeEvent, context: LambdaContext):
+    start = perf_counter()
+    try:
+        return _handle_event(event)
+    finally:
+        # Alert batches delivered through SQS have no detail type of their own
+        route = "Alert Batch" if event.get("Records") is not None else event.get("detail-type", "Unknown")
+        metrics.add_dimension(name="Route", value=route)
+        _add_metric("Latency", MetricUnit.Milliseconds, (perf_counter() - start) * 1000)
+
+
+def _handle_event(event: EventBridgeEvent):
+    # Alerts are buffered through SQS and delivered in batches
+    if event.get("Records") is not None:
+        return process_alert_batch(event["Records"])
     if "Alert" in event.detail_type and "MediaLive" in event.detail_type:
         process_event(event)
+    elif event.detail_type == "MediaLive Channel State Change":
+        process_state_change(event)
+    elif event.detail_type == "MediaLive Channel Input Change":
+        process_input_change(event)
+    # Stacks are reconciled as they are deployed, so that the summaries are
+    # populated without waiting for the schedule
+    elif event.detail_type in ("Scheduled Event", "CloudFormation Stack Status Change"):
+        reconcile_channels()
@@ -0,0 +1,79 @@
+from decimal import Decimal
+
+from boto3.dynamodb.types import TypeDeserializer, TypeSerializer
+
+# DynamoDB types of the attributes of GRAPHIC#, OUTPUT#, ALERT# and alert
+# history items. The shapes are fixed, so these attributes are converted by
+# name rather than by inspecting each value as boto3's TypeSerializer and
+# TypeDeserializer do. This module is shared by the API and event handler
+# through a layer, so that both write items the same way
+ATTRIBUTE_TYPES = {
+    'ChannelId': 'S',
+    'SK': 'S',
+    'Id': 'S',
+    'Name': 'S',
+    'Url': 'S',
+    'State': 'S',
+    'Message': 'S',
+    'AlertedAt': 'N',
+    'ExpiresAt': 'N',
+    'FlapCount': 'N',
+    # Alert history items use short attribute names for state and message
+    'S': 'S',
+    'M': 'S',
+}
+
+_serializer = TypeSerializer()
+_deserializer = TypeDeserializer()
+
+
+def serialize(item):
+    """
+    Converts an item to DynamoDB attribute values, falling back to boto3's
+    TypeSerializer for attributes outside of the known item shapes
+    """
+    result = {}
+    for name, value in item.items():
+        attribute_type = ATTRIBUTE_TYPES.get(name)
+        if attribute_type == 'S' and isinstance(value, str):
+            result[name] = {'S': value}
+        elif attribute_type == 'N' and isinstance(value, int):
+            result[name] = {'N': str(value)}
+        else:
+            result[name] = _serializer.serialize(value)
+    return result
+
+
+def deserialize(item):
+    """
+    Converts DynamoDB attribute values to an item. Numbers are returned as int
+    or float rather than Decimal so that items can be serialized as JSON
+    """
+    result = {}
+    for name, value in item.items():
+        attribute_type = ATTRIBUTE_TYPES.get(name)
+        if attribute_type in value:
+            result[name] = value['S'] if attribute_type == 'S' else _to_number(value['N'])
+        else:
+            result[name] = _deserializer.deserialize(value)
+    return result
+
+
+def query_all(client, **kwargs):
+    """
+    Returns the deserialized items of every page of a low-level client query
+    """
+    results = []
+    while True:
+        response = client.query(**kwargs)
+        results.extend(deserialize(i) for i in response['Items'])
+        if not response.get('LastEvaluatedKey'):
+            return results
+        kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+
+def _to_number(value):
+    try:
+        return int(value)
+    except ValueError:
+        return float(Decimal(value))
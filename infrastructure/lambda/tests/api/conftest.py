@@ -1,8 +1,10 @@
 import logging
+from decimal import Decimal
 from unittest import mock
 from unittest.mock import MagicMock
 
 import pytest
+from boto3.dynamodb.types import TypeSerializer
 
 logger = logging.getLogger(__name__)
 
@@ -18,6 +20,11 @@ def generate_ml_resp(client, pagination_tuples):
     return side_effect
 
 
+def to_attribute_values(item):
+    serializer = TypeSerializer()
+    return {k: serializer.serialize(Decimal(str(v)) if isinstance(v, float) else v) for k, v in item.items()}
+
+
 @pytest.fixture()
 def medialive_client(list_channels_stub, describe_channel_stub):
     mock_ml = MagicMock()
@@ -38,8 +45,57 @@ def mediapackage_client(list_origin_endpoints_stub):
 
 
 @pytest.fixture()
-def ddb_table(query_table_stub):
+def channel_summaries():
+    return []
+
+
+@pytest.fixture()
+def ddb_table(query_table_stub, channel_summaries):
+    def query(**kwargs):
+        if kwargs.get("IndexName") == "EntityTypeIndex":
+            return {"Items": channel_summaries}
+        return query_table_stub
+
+    def get_item(Key, **kwargs):
+        # Summaries are populated whenever there are any
+        if Key == {"ChannelId": "SUMMARIES", "SK": "POPULATED"}:
+            return {"Item": Key} if channel_summaries else {}
+        return mock.DEFAULT
+
     mock_ddb = MagicMock()
-    mock_ddb.query.return_value = query_table_stub
+    mock_ddb.name = "CHANNEL_TABLE"
+    mock_ddb.query.side_effect = query
+    mock_ddb.get_item.side_effect = get_item
+    mock_ddb.meta.client.query.return_value = {"Items": [to_attribute_values(i) for i in query_table_stub["Items"]]}
     with mock.patch("app.table", mock_ddb):
         yield mock_ddb
+
+
+@pytest.fixture()
+def api_event():
+    def build(method, path, headers=None, query=None, body=None):
+        return {
+            "resource": "/{proxy+}",
+            "path": path,
+            "httpMethod": method,
+            "headers": headers or {},
+            "multiValueHeaders": {},
+            "queryStringParameters": query,
+            "multiValueQueryStringParameters": None,
+            "pathParameters": {"proxy": path.lstrip("/")},
+            "requestContext": {"stage": "dev", "requestId": "c6af9ac6-7b61-11e6-9a41-93e8deadbeef"},
+            "body": body,
+            "isBase64Encoded": False,
+        }
+    return build
+
+
+@pytest.fixture()
+def lambda_context():
+    context = MagicMock()
+    context.function_name = "ApiHandler"
+    context.memory_limit_in_mb = 128
+    context.invoked_function_arn = "arn:aws:lambda:us-east-1:123456789012:function:ApiHandler"
+    context.aws_request_id = "52fdfc07-2182-154f-163f-5f0f9a621d72"
+    context.get_remaining_time_in_millis.return_value = 5000
+    return context
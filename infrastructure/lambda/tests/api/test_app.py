@@ -1,13 +1,22 @@
+import base64
+import hashlib
+import json
 import logging
+from itertools import count
+from time import time
 from unittest import mock
+from unittest.mock import MagicMock
 
+import boto3
 import pytest
 from importlib import import_module
 
+from aws_lambda_powertools.utilities.data_classes import APIGatewayProxyEvent
 from aws_lambda_powertools.utilities.validation import SchemaValidationError
 from aws_lambda_powertools.event_handler.exceptions import (
     NotFoundError, BadRequestError)
-from boto3.dynamodb.conditions import Key
+from botocore.exceptions import ClientError
+from botocore.stub import Stubber
 
 logger = logging.getLogger(__name__)
 ENV_REGION_KEY = 'AWS_DEFAULT_REGION'
@@ -15,16 +24,74 @@ ENV_REGION_KEY = 'AWS_DEFAULT_REGION'
 channel_id = 'foo'
 
 
+def emitted_metrics(output):
+    """
+    Returns the EMF objects printed alongside the JSON log records, with every
+    metric value as a list as Powertools only uses lists for repeated values
+    in some versions
+    """
+    results = []
+    for line in output.splitlines():
+        if '"_aws"' in line:
+            emitted = json.loads(line)
+            for metric in emitted["_aws"]["CloudWatchMetrics"][0]["Metrics"]:
+                value = emitted[metric["Name"]]
+                emitted[metric["Name"]] = value if isinstance(value, list) else [value]
+            results.append(emitted)
+    return results
+
+
 @pytest.fixture()
 def app():
     yield import_module('app')
 
 
 @pytest.fixture(autouse=True)
-def reset_event(app):
+def reset_event(app, api_event):
+    app.app.current_event = APIGatewayProxyEvent(api_event("GET", "/"))
+
+
+@pytest.fixture()
+def resolver(app):
+    # Allow the resolver to populate the event when invoking lambda_handler
+    del app.app.current_event
+    yield
     app.app.current_event = None
 
 
+@pytest.fixture(autouse=True)
+def reset_caches(app):
+    app.describe_cache.clear()
+    app.list_cache.clear()
+    app.endpoint_cache.clear()
+    app.schedule_cache.clear()
+    app.graphics_cache.clear()
+    app.summaries_populated = False
+
+
+@pytest.fixture()
+def table_items(ddb_table):
+    """
+    Stores the items written with put_item, get_item and delete_item.
+    Conditional writes only succeed for missing or expired items
+    """
+    items = {}
+
+    def key(item):
+        return item['ChannelId'], item['SK']
+
+    def put_item(Item, ConditionExpression=None, **kwargs):
+        existing = items.get(key(Item))
+        if ConditionExpression is not None and existing and existing['ExpiresAt'] > time():
+            raise ClientError({"Error": {"Code": "ConditionalCheckFailedException"}}, "PutItem")
+        items[key(Item)] = Item
+
+    ddb_table.get_item.side_effect = lambda Key, **kwargs: {'Item': items[key(Key)]} if key(Key) in items else {}
+    ddb_table.put_item.side_effect = put_item
+    ddb_table.delete_item.side_effect = lambda Key, **kwargs: items.pop(key(Key), None)
+    return items
+
+
 @pytest.mark.usefixtures('medialive_client', 'mediapackage_client', 'ddb_table', 'app')
 class TestApp:
     def test_it_returns_channels(self, list_channels_stub, medialive_client, app):
@@ -51,6 +118,224 @@ class TestApp:
             ]
         }
 
+    def test_it_returns_channels_from_summaries(self, channel_summaries, medialive_client, app):
+        channel_summaries.append({
+            "ChannelId": "abcdef01234567890",
+            "SK": "CHANNEL#summary",
+            "EntityType": "CHANNEL",
+            "Name": "Channel 1",
+            "State": "RUNNING",
+            "InputAttachments": [
+                {"Id": "021345abcdef6789", "Name": "Input 1"},
+                {"Id": "021345abcdef6789", "Name": "Input 2"},
+            ],
+            "Pipeline0ActiveInput": "Input 2",
+            "ModifiedAt": 1000,
+        })
+
+        result = app.get_channels()
+        assert result == {
+            "Channels": [
+                {
+                    "Id": "abcdef01234567890",
+                    "State": "RUNNING",
+                    "Name": "Channel 1",
+                    "InputAttachments": [
+                        {
+                            "Id": "021345abcdef6789",
+                            "Name": "Input 1",
+                            "Active": False,
+                        },
+                        {
+                            "Id": "021345abcdef6789",
+                            "Name": "Input 2",
+                            "Active": True,
+                        },
+                    ],
+                }
+            ],
+            "Version": 1000,
+        }
+        medialive_client.get_paginator.assert_not_called()
+        medialive_client.describe_channel.assert_not_called()
+
+    def test_it_returns_channels_from_medialive_until_summaries_are_populated(
+            self, channel_summaries, ddb_table, medialive_client, app):
+        # Summaries written from events before the first reconcile
+        channel_summaries.append({"ChannelId": "abcdef01234567890", "State": "RUNNING", "ModifiedAt": 1000})
+        ddb_table.get_item.side_effect = lambda **kwargs: {}
+
+        result = app.get_channels()
+        assert result["Channels"][0]["Name"] == "Channel 1"
+        assert "Version" not in result
+        medialive_client.get_paginator.assert_called_with("list_channels")
+
+        ddb_table.get_item.side_effect = lambda **kwargs: {"Item": kwargs["Key"]}
+        assert app.get_channels()["Version"] == 1000
+        app.get_channels()
+        # The marker is not read again once found
+        assert ddb_table.get_item.call_count == 2
+
+    def test_it_returns_changed_channels_since_version(self, channel_summaries, app, api_event):
+        channel_summaries.extend([
+            {"ChannelId": "unchanged", "Name": "Unchanged", "State": "IDLE", "ModifiedAt": 1000},
+            {"ChannelId": "changed", "Name": "Changed", "State": "RUNNING", "ModifiedAt": 20000},
+            {"ChannelId": "deleted", "Deleted": True, "ModifiedAt": 21000},
+            {"ChannelId": "deleted-earlier", "Deleted": True, "ModifiedAt": 2000},
+        ])
+        app.app.current_event = APIGatewayProxyEvent(api_event("GET", "/channels", query={"since": "15000"}))
+
+        result = app.get_channels()
+        assert result == {
+            "Channels": [{"Id": "changed", "Name": "Changed", "State": "RUNNING", "InputAttachments": []}],
+            "Deleted": ["deleted"],
+            "Version": 21000,
+        }
+
+    def test_it_excludes_deleted_channels_without_version(self, channel_summaries, app):
+        channel_summaries.extend([
+            {"ChannelId": "channel", "Name": "Channel", "State": "IDLE", "ModifiedAt": 1000},
+            {"ChannelId": "deleted", "Deleted": True, "ModifiedAt": 2000},
+        ])
+
+        result = app.get_channels()
+        assert [channel["Id"] for channel in result["Channels"]] == ["channel"]
+        assert "Deleted" not in result
+
+    def test_it_throws_for_invalid_versions(self, app, api_event):
+        app.app.current_event = APIGatewayProxyEvent(api_event("GET", "/channels", query={"since": "abc"}))
+
+        with pytest.raises(BadRequestError):
+            app.get_channels()
+
+    def test_it_lists_selected_fields_without_describing_channels(self, medialive_client, app, api_event):
+        app.app.current_event = APIGatewayProxyEvent(api_event("GET", "/channels", query={"fields": "Name,State"}))
+
+        result = app.get_channels()
+        assert result == {
+            "Channels": [{"Id": "abcdef01234567890", "State": "IDLE", "Name": "Channel 1"}],
+        }
+        medialive_client.get_paginator.assert_called_once_with("list_channels")
+        medialive_client.describe_channel.assert_not_called()
+
+    def test_it_returns_selected_fields_from_summaries(self, channel_summaries, app, api_event):
+        channel_summaries.append({"ChannelId": "channel", "Name": "Channel", "State": "IDLE", "ModifiedAt": 1000})
+        app.app.current_event = APIGatewayProxyEvent(api_event("GET", "/channels", query={"fields": "Name"}))
+
+        result = app.get_channels()
+        assert result == {"Channels": [{"Id": "channel", "Name": "Channel"}], "Version": 1000}
+
+    @pytest.mark.parametrize("fields", ["", "Name,Foo", "Degraded"])
+    def test_it_throws_for_invalid_fields(self, app, api_event, fields):
+        app.app.current_event = APIGatewayProxyEvent(api_event("GET", "/channels", query={"fields": fields}))
+
+        with pytest.raises(BadRequestError):
+            app.get_channels()
+
+    def test_it_pages_channels_from_summaries(self, channel_summaries, ddb_table, app, api_event):
+        channel_summaries.append({"ChannelId": "channel"})
+        last_key = {"ChannelId": "channel", "SK": "CHANNEL#summary", "EntityType": "CHANNEL"}
+        ddb_table.query.side_effect = None
+        ddb_table.query.return_value = {
+            "Items": [{"ChannelId": "channel", "Name": "Channel", "State": "IDLE", "ModifiedAt": 1000}],
+            "LastEvaluatedKey": last_key,
+        }
+        app.app.current_event = APIGatewayProxyEvent(api_event("GET", "/channels", query={"limit": "1"}))
+
+        result = app.get_channels()
+        assert result["Channels"] == [{"Id": "channel", "Name": "Channel", "State": "IDLE", "InputAttachments": []}]
+        assert ddb_table.query.call_args.kwargs["Limit"] == 1
+        assert "ExclusiveStartKey" not in ddb_table.query.call_args.kwargs
+
+        ddb_table.query.return_value = {"Items": []}
+        app.app.current_event = APIGatewayProxyEvent(
+            api_event("GET", "/channels", query={"limit": "1", "nextToken": result["NextToken"]}))
+        assert app.get_channels() == {"Channels": [], "NextToken": None}
+        assert ddb_table.query.call_args.kwargs["ExclusiveStartKey"] == last_key
+
+    def test_it_pages_channels_from_medialive(self, medialive_client, app, api_event):
+        paginator = MagicMock()
+        paginator.paginate.return_value.build_full_result.return_value = {
+            "Channels": [{"Id": "channel", "Name": "Channel", "State": "IDLE", "InputAttachments": []}],
+            "NextToken": "medialive-token",
+        }
+        medialive_client.get_paginator.side_effect = None
+        medialive_client.get_paginator.return_value = paginator
+        app.app.current_event = APIGatewayProxyEvent(
+            api_event("GET", "/channels", query={"limit": "1", "fields": "Name"}))
+
+        result = app.get_channels()
+        assert result["Channels"] == [{"Id": "channel", "Name": "Channel"}]
+        paginator.paginate.assert_called_with(PaginationConfig={"MaxItems": 1, "PageSize": 1})
+
+        app.app.current_event = APIGatewayProxyEvent(
+            api_event("GET", "/channels", query={"limit": "1", "nextToken": result["NextToken"]}))
+        app.get_channels()
+        paginator.paginate.assert_called_with(
+            PaginationConfig={"MaxItems": 1, "PageSize": 1, "StartingToken": "medialive-token"})
+
+    @pytest.mark.parametrize("query", [
+        {"limit": "0"},
+        {"limit": "101"},
+        {"limit": "abc"},
+        {"limit": "10", "since": "1000"},
+        {"nextToken": "abc"},
+    ])
+    def test_it_throws_for_invalid_page_queries(self, app, api_event, query):
+        app.app.current_event = APIGatewayProxyEvent(api_event("GET", "/channels", query=query))
+
+        with pytest.raises(BadRequestError):
+            app.get_channels()
+
+    def test_it_throws_for_tampered_page_tokens(self, app, api_event):
+        token = app.page_tokens.encode({"Source": "medialive", "Token": "token"})
+        tampered = app.page_tokens.encode({"Source": "medialive", "Token": "other"})[:43] + token[43:]
+        app.app.current_event = APIGatewayProxyEvent(api_event("GET", "/channels", query={"nextToken": tampered}))
+
+        with pytest.raises(BadRequestError):
+            app.get_channels()
+
+    def test_it_marks_channels_degraded_when_describe_fails(self, list_channels_stub, describe_channel_stub,
+                                                           medialive_client, app):
+        second_channel = dict(list_channels_stub["Channels"][0], Id="second", Name="Channel 2")
+        list_channels_stub["Channels"].append(second_channel)
+
+        def describe_channel(ChannelId):
+            if ChannelId == "abcdef01234567890":
+                raise ClientError({"Error": {"Code": "InternalServerErrorException"}}, "DescribeChannel")
+            return describe_channel_stub
+
+        medialive_client.describe_channel.side_effect = describe_channel
+
+        result = app.get_channels()
+        assert [channel["Id"] for channel in result["Channels"]] == ["abcdef01234567890", "second"]
+        assert result["Channels"][0]["Degraded"] is True
+        assert [i["Active"] for i in result["Channels"][0]["InputAttachments"]] == [False, False]
+        assert "Degraded" not in result["Channels"][1]
+        assert [i["Active"] for i in result["Channels"][1]["InputAttachments"]] == [True, False]
+
+    def test_it_caches_channel_descriptions(self, medialive_client, app):
+        app.get_channels()
+        app.get_channels()
+        app.get_channel_data(channel_id)
+        app.get_channel_data(channel_id)
+
+        assert medialive_client.get_paginator.call_count == 1
+        assert medialive_client.describe_channel.call_count == 2
+        assert app.describe_cache.stats()["Hits"] == 2
+        assert app.list_cache.stats()["Hits"] == 1
+
+    def test_it_invalidates_cached_channels_on_change(self, medialive_client, app):
+        medialive_client.start_channel.return_value = {"Id": channel_id, "State": "Starting"}
+
+        app.get_channel_data(channel_id)
+        app.put_channel_status(channel_id, "start")
+        app.get_channel_data(channel_id)
+        app.put_active_input(channel_id, "Input 2")
+        app.get_channel_data(channel_id)
+
+        assert medialive_client.describe_channel.call_count == 3
+
     def test_it_starts_channels(self, medialive_client, app):
         status = "start"
 
@@ -85,6 +370,76 @@ class TestApp:
         with pytest.raises(BadRequestError):
             app.put_channel_status(channel_id, status)
 
+    def test_it_starts_multiple_channels(self, medialive_client, app, lambda_context):
+        missing = ClientError({"Error": {"Code": "NotFoundException"}}, "StartChannel")
+
+        def start_channel(ChannelId):
+            if ChannelId == "missing":
+                raise missing
+            return {"Id": ChannelId, "State": "STARTING"}
+
+        medialive_client.start_channel.side_effect = start_channel
+        app.app.current_event = mock.MagicMock()
+        app.app.current_event.json_body = {"ChannelIds": ["first", "second", "missing"]}
+        app.app.lambda_context = lambda_context
+
+        result = app.put_channels_status("START")
+
+        assert result == {
+            "Channels": {
+                "first": {"Id": "first", "State": "STARTING"},
+                "second": {"Id": "second", "State": "STARTING"},
+                "missing": {"Id": "missing", "Error": "NotFoundException"},
+            },
+            "UnprocessedChannelIds": [],
+        }
+
+    def test_it_does_not_retry_throttled_channels(self, medialive_client, app, lambda_context):
+        # Throttled calls are retried by the client before reaching the route
+        medialive_client.stop_channel.side_effect = ClientError(
+            {"Error": {"Code": "TooManyRequestsException"}}, "StopChannel")
+        app.app.current_event = mock.MagicMock()
+        app.app.current_event.json_body = {"ChannelIds": ["first"]}
+        app.app.lambda_context = lambda_context
+
+        result = app.put_channels_status("stop")
+
+        assert result == {
+            "Channels": {"first": {"Id": "first", "Error": "TooManyRequestsException"}},
+            "UnprocessedChannelIds": [],
+        }
+        medialive_client.stop_channel.assert_called_once_with(ChannelId="first")
+
+    def test_it_returns_channels_not_started_on_before_the_deadline(self, medialive_client, app, lambda_context):
+        channel_ids = [f"channel-{i}" for i in range(10)]
+        app.app.current_event = mock.MagicMock()
+        app.app.current_event.json_body = {"ChannelIds": channel_ids}
+        app.app.lambda_context = lambda_context
+        # The deadline is taken at 0 and falls between the third and fourth
+        # channels, each of which is checked a second later than the last
+        lambda_context.get_remaining_time_in_millis.return_value = 1000 * (app.BULK_STATUS_DEADLINE_MARGIN + 3.5)
+        medialive_client.start_channel.side_effect = lambda ChannelId: {"Id": ChannelId, "State": "STARTING"}
+
+        with mock.patch("app.monotonic", side_effect=count()):
+            result = app.put_channels_status("start")
+
+        processed = list(result["Channels"])
+        assert len(processed) == 3
+        assert sorted(processed + result["UnprocessedChannelIds"]) == sorted(channel_ids)
+        assert medialive_client.start_channel.call_count == len(processed)
+
+    def test_it_throws_for_invalid_bulk_requests(self, app):
+        app.app.current_event = mock.MagicMock()
+        app.app.current_event.json_body = {"ChannelIds": ["first"]}
+
+        with pytest.raises(BadRequestError):
+            app.put_channels_status("invalid")
+
+        app.app.current_event.json_body = {"ChannelIds": []}
+
+        with pytest.raises(SchemaValidationError):
+            app.put_channels_status("start")
+
     def test_it_switches_inputs(self, medialive_client, app):
         input_name = 'Input 2'
 
@@ -135,16 +490,6 @@ class TestApp:
         app.app.current_event = mock.MagicMock()
         app.app.current_event.json_body = {}
 
-        ddb_table.get_item.return_value = {
-            'Item': {
-                "ChannelId": channel_id,
-                "Id": graphic_id,
-                "Name": "Overlay 1",
-                "SK": f'GRAPHIC#{graphic_id}',
-                "Url": url
-            }
-        }
-
         result = app.post_start_graphics(channel_id, graphic_id)
         assert result is None
         medialive_client.batch_update_schedule.assert_called_with(**{
@@ -173,16 +518,6 @@ class TestApp:
         app.app.current_event = mock.MagicMock()
         app.app.current_event.json_body = {'Duration': 123}
 
-        ddb_table.get_item.return_value = {
-            'Item': {
-                "ChannelId": channel_id,
-                "Id": graphic_id,
-                "Name": "Overlay 1",
-                "SK": f'GRAPHIC#{graphic_id}',
-                "Url": url
-            }
-        }
-
         result = app.post_start_graphics(channel_id, graphic_id)
         assert result is None
         medialive_client.batch_update_schedule.assert_called_with(**{
@@ -204,15 +539,53 @@ class TestApp:
         })
 
     def test_it_throws_if_graphic_not_found(self, ddb_table, medialive_client, app):
-        graphic_id = '101'
+        graphic_id = '999'
 
         app.app.current_event = mock.MagicMock()
         app.app.current_event.json_body = {'Duration': 123}
 
-        ddb_table.get_item.return_value = {}
-
         with pytest.raises(NotFoundError):
             app.post_start_graphics(channel_id, graphic_id)
+        ddb_table.meta.client.query.assert_called_once()
+        medialive_client.batch_update_schedule.assert_not_called()
+
+    def test_it_caches_graphics(self, ddb_table, medialive_client, app):
+        app.app.current_event = mock.MagicMock()
+        app.app.current_event.json_body = {}
+
+        app.post_start_graphics(channel_id, '101')
+        app.post_start_graphics(channel_id, '101')
+        ddb_table.meta.client.query.assert_called_once()
+        query = ddb_table.meta.client.query.call_args.kwargs
+        assert query['ExpressionAttributeValues'] == {':ChannelId': {'S': channel_id}, ':Prefix': {'S': 'GRAPHIC#'}}
+        ddb_table.get_item.assert_not_called()
+
+        # Graphics missing from the cached entry are loaded again
+        with pytest.raises(NotFoundError):
+            app.post_start_graphics(channel_id, '999')
+        assert ddb_table.meta.client.query.call_count == 2
+
+    def test_it_invalidates_cached_graphics_on_change(self, ddb_table, medialive_client, app):
+        app.app.current_event = mock.MagicMock()
+        app.app.current_event.json_body = {}
+        app.post_start_graphics(channel_id, '101')
+
+        app.delete_graphic(channel_id, '101')
+        ddb_table.update_item.assert_not_called()
+        ddb_table.meta.client.query.return_value = {"Items": []}
+        with pytest.raises(NotFoundError):
+            app.post_start_graphics(channel_id, '101')
+        medialive_client.batch_update_schedule.assert_called_once()
+
+        app.app.current_event.json_body = {'Name': 'Graphic', 'Url': 'https://example.com/graphic'}
+        graphic = app.post_graphic(channel_id)
+        ddb_table.meta.client.query.return_value = {"Items": [{
+            'ChannelId': {'S': channel_id}, 'SK': {'S': f'GRAPHIC#{graphic["Id"]}'},
+            'Id': {'S': graphic['Id']}, 'Url': {'S': graphic['Url']},
+        }]}
+        app.app.current_event.json_body = {}
+        app.post_start_graphics(channel_id, graphic['Id'])
+        assert ddb_table.meta.client.query.call_count == 3
 
     def test_it_stops_motion_graphics(self, medialive_client, app):
         result = app.post_stop_graphics(channel_id)
@@ -231,6 +604,99 @@ class TestApp:
                 }]
             }})
 
+    def test_it_writes_batched_schedule_actions(self, ddb_table, medialive_client, app):
+        url = 'https://example.com/output/12345678?aspect=16x9'
+        app.app.current_event = mock.MagicMock()
+        app.app.current_event.json_body = {'Actions': [
+            {'Type': 'INPUT_PREPARE', 'Input': 'Input 2'},
+            {'Type': 'INPUT_SWITCH', 'Input': 'Input 2'},
+            {'Type': 'GRAPHIC_START', 'GraphicId': '101', 'Duration': 10},
+            {'Type': 'GRAPHIC_STOP'},
+        ]}
+
+        result = app.post_schedule(channel_id)
+        assert result == {'ActionNames': [mock.ANY] * 4}
+        ddb_table.meta.client.query.assert_called_once()
+        medialive_client.batch_update_schedule.assert_called_once_with(**{
+            'ChannelId': channel_id,
+            'Creates': {
+                'ScheduleActions': [
+                    {
+                        'ActionName': name,
+                        'ScheduleActionSettings': settings,
+                        'ScheduleActionStartSettings': {'ImmediateModeScheduleActionStartSettings': {}}
+                    }
+                    for name, settings in zip(result['ActionNames'], [
+                        {'InputPrepareSettings': {'InputAttachmentNameReference': 'Input 2'}},
+                        {'InputSwitchSettings': {'InputAttachmentNameReference': 'Input 2'}},
+                        {'MotionGraphicsImageActivateSettings': {'Duration': 10, 'Url': url}},
+                        {'MotionGraphicsImageDeactivateSettings': {}},
+                    ])
+                ]
+            }
+        })
+
+    def test_it_writes_schedule_actions_without_graphics(self, ddb_table, medialive_client, app):
+        app.app.current_event = mock.MagicMock()
+        app.app.current_event.json_body = {'Actions': [
+            {'Type': 'INPUT_PREPARE', 'Input': 'Input 2'},
+            {'Type': 'GRAPHIC_STOP'},
+        ]}
+
+        result = app.post_schedule(channel_id)
+        assert result == {'ActionNames': [mock.ANY] * 2}
+        ddb_table.meta.client.query.assert_not_called()
+        medialive_client.batch_update_schedule.assert_called_once()
+
+    def test_it_returns_current_and_upcoming_schedule_actions(self, describe_schedule_stub, medialive_client, app):
+        medialive_client.get_paginator.side_effect = None
+        medialive_client.get_paginator.return_value.paginate.return_value = [describe_schedule_stub]
+
+        result = app.get_schedule(channel_id)
+        assert result["ChannelId"] == channel_id
+        assert [i["ActionName"] for i in result["Current"]] == ["graphic-1", "switch-2"]
+        assert [i["ActionName"] for i in result["Upcoming"]] == ["graphic-stop", "prepare-1"]
+        medialive_client.get_paginator.assert_called_once_with("describe_schedule")
+        medialive_client.get_paginator.return_value.paginate.assert_called_once_with(ChannelId=channel_id)
+
+    def test_it_records_written_actions_in_cached_schedules(self, describe_schedule_stub, medialive_client, app):
+        medialive_client.get_paginator.side_effect = None
+        medialive_client.get_paginator.return_value.paginate.return_value = [describe_schedule_stub]
+        app.get_schedule(channel_id)
+
+        app.put_active_input(channel_id, "Input%203")
+        result = app.get_schedule(channel_id)
+
+        written = medialive_client.batch_update_schedule.call_args.kwargs["Creates"]["ScheduleActions"][0]
+        assert result["Current"][-1]["ActionName"] == written["ActionName"]
+        assert result["Current"][-1]["ScheduleActionSettings"] == written["ScheduleActionSettings"]
+        assert "switch-2" not in [i["ActionName"] for i in result["Current"]]
+        assert [i["ActionName"] for i in result["Upcoming"]] == ["graphic-stop", "prepare-1"]
+        medialive_client.get_paginator.assert_called_once_with("describe_schedule")
+
+    def test_it_throws_for_missing_scheduled_graphics(self, ddb_table, medialive_client, app):
+        app.app.current_event = mock.MagicMock()
+        app.app.current_event.json_body = {'Actions': [
+            {'Type': 'INPUT_SWITCH', 'Input': 'Input 2'},
+            {'Type': 'GRAPHIC_START', 'GraphicId': '999'},
+        ]}
+
+        with pytest.raises(NotFoundError):
+            app.post_schedule(channel_id)
+        medialive_client.batch_update_schedule.assert_not_called()
+
+    def test_it_throws_for_invalid_schedule_actions(self, app):
+        app.app.current_event = mock.MagicMock()
+        app.app.current_event.json_body = {'Actions': [{'Type': 'INPUT_SWITCH'}]}
+
+        with pytest.raises(SchemaValidationError):
+            app.post_schedule(channel_id)
+
+        app.app.current_event.json_body = {'Actions': []}
+
+        with pytest.raises(SchemaValidationError):
+            app.post_schedule(channel_id)
+
     def test_it_returns_channel_data(self, ddb_table, medialive_client, app):
         result = app.get_channel_data(channel_id)
         assert result == {
@@ -259,13 +725,137 @@ class TestApp:
             ],
             'GraphicsEnabled': True,
         }
-        ddb_table.query.assert_called_with(**{
-            'KeyConditionExpression': Key('ChannelId').eq(channel_id)
-        })
+        ddb_table.meta.client.query.assert_called_with(
+            TableName="CHANNEL_TABLE",
+            KeyConditionExpression="#ChannelId = :ChannelId",
+            ExpressionAttributeNames={"#ChannelId": "ChannelId"},
+            ExpressionAttributeValues={":ChannelId": {"S": channel_id}},
+        )
         medialive_client.describe_channel.assert_called_with(**{
             'ChannelId': channel_id
         })
 
+    def test_it_returns_selected_channel_items(self, ddb_table, app, api_event):
+        alert = {"ChannelId": {"S": channel_id}, "SK": {"S": "ALERT#100"}, "Id": {"S": "100"},
+                 "Message": {"S": "foobar"}, "AlertedAt": {"N": "0"}, "State": {"S": "CLEARED"}}
+        ddb_table.meta.client.query.side_effect = [
+            {"Items": [alert], "LastEvaluatedKey": {"ChannelId": {"S": channel_id}, "SK": {"S": "ALERT#100"}}},
+            {"Items": [dict(alert, SK={"S": "ALERT#200"}, Id={"S": "200"})]},
+        ]
+        app.app.current_event = APIGatewayProxyEvent(
+            api_event("GET", f"/channels/{channel_id}", query={"include": "alerts"}))
+
+        result = app.get_channel_data(channel_id)
+        assert result == {
+            'ChannelId': channel_id,
+            'Alerts': [
+                {'Id': '100', 'Message': 'foobar', 'AlertedAt': 0, 'State': 'CLEARED'},
+                {'Id': '200', 'Message': 'foobar', 'AlertedAt': 0, 'State': 'CLEARED'},
+            ],
+            'GraphicsEnabled': True,
+        }
+        query = {
+            "TableName": "CHANNEL_TABLE",
+            "KeyConditionExpression": "#ChannelId = :ChannelId AND begins_with(#SK, :Prefix)",
+            "ExpressionAttributeNames": {"#ChannelId": "ChannelId", "#SK": "SK"},
+            "ExpressionAttributeValues": {":ChannelId": {"S": channel_id}, ":Prefix": {"S": "ALERT#"}},
+        }
+        ddb_table.meta.client.query.assert_has_calls([
+            mock.call(**query),
+            mock.call(**query, ExclusiveStartKey={"ChannelId": {"S": channel_id}, "SK": {"S": "ALERT#100"}}),
+        ])
+        assert isinstance(result['Alerts'][0]['AlertedAt'], int)
+
+    def test_it_queries_repeated_channel_item_types_once(self, ddb_table, app, api_event):
+        ddb_table.meta.client.query.return_value = {"Items": []}
+        app.app.current_event = APIGatewayProxyEvent(
+            api_event("GET", f"/channels/{channel_id}", query={"include": "alerts,,graphics,alerts,"}))
+
+        result = app.get_channel_data(channel_id)
+        assert result == {'ChannelId': channel_id, 'Alerts': [], 'Graphics': [], 'GraphicsEnabled': True}
+        prefixes = [c.kwargs["ExpressionAttributeValues"][":Prefix"]["S"]
+                    for c in ddb_table.meta.client.query.call_args_list]
+        assert sorted(prefixes) == ["ALERT#", "GRAPHIC#"]
+
+    def test_it_returns_alert_history(self, ddb_table, medialive_client, app, api_event):
+        last_key = {"ChannelId": {"S": f"ALERTLOG#{channel_id}"}, "SK": {"S": "0000000010#100"}}
+        ddb_table.meta.client.query.return_value = {
+            "Items": [
+                {"ChannelId": {"S": f"ALERTLOG#{channel_id}"}, "SK": {"S": "0000000020#100"},
+                 "S": {"S": "CLEARED"}, "M": {"S": "foobar"}},
+                last_key | {"S": {"S": "SET"}, "M": {"S": "foobar"}},
+            ],
+            "LastEvaluatedKey": last_key,
+        }
+        app.app.current_event = APIGatewayProxyEvent(api_event(
+            "GET", f"/channels/{channel_id}/alerts", query={"from": "5", "to": "20", "limit": "2"}))
+
+        result = app.get_channel_alerts(channel_id)
+        assert result["Alerts"] == [
+            {"Id": "100", "State": "CLEARED", "Message": "foobar", "AlertedAt": 20},
+            {"Id": "100", "State": "SET", "Message": "foobar", "AlertedAt": 10},
+        ]
+        ddb_table.meta.client.query.assert_called_with(
+            TableName="CHANNEL_TABLE",
+            KeyConditionExpression="#ChannelId = :ChannelId AND #SK BETWEEN :From AND :To",
+            ExpressionAttributeNames={"#ChannelId": "ChannelId", "#SK": "SK"},
+            ExpressionAttributeValues={
+                ":ChannelId": {"S": f"ALERTLOG#{channel_id}"},
+                ":From": {"S": "0000000005#"},
+                ":To": {"S": "0000000020$"},
+            },
+            ScanIndexForward=False,
+            Limit=2,
+        )
+
+        app.app.current_event = APIGatewayProxyEvent(api_event(
+            "GET", f"/channels/{channel_id}/alerts", query={"nextToken": result["NextToken"]}))
+        ddb_table.meta.client.query.return_value = {"Items": []}
+
+        assert app.get_channel_alerts(channel_id) == {"Alerts": [], "NextToken": None}
+        assert ddb_table.meta.client.query.call_args.kwargs["ExclusiveStartKey"] == last_key
+        assert ddb_table.meta.client.query.call_args.kwargs["KeyConditionExpression"] == \
+            "#ChannelId = :ChannelId AND #SK >= :From"
+        medialive_client.describe_channel.assert_called_with(ChannelId=channel_id)
+
+    def test_it_throws_for_alert_history_of_missing_channels(self, ddb_table, medialive_client, app, api_event):
+        medialive_client.describe_channel.side_effect = ClientError(
+            {"Error": {"Code": "NotFoundException"}}, "DescribeChannel")
+        app.app.current_event = APIGatewayProxyEvent(api_event("GET", f"/channels/{channel_id}/alerts"))
+
+        with pytest.raises(ClientError):
+            app.get_channel_alerts(channel_id)
+
+    @pytest.mark.parametrize("query", [
+        {"limit": "0"},
+        {"limit": "101"},
+        {"from": "yesterday"},
+        {"from": "1.5"},
+        {"to": "-1"},
+        {"from": "20", "to": "5"},
+        {"nextToken": "invalid"},
+        # Unsigned start key of this channel
+        {"nextToken": base64.urlsafe_b64encode(json.dumps(
+            {"ChannelId": {"S": f"ALERTLOG#{channel_id}"}, "SK": {"S": "1"}}).encode()).decode()},
+        {"nextToken": {"ChannelId": {"S": "ALERTLOG#other"}, "SK": {"S": "1"}}},
+    ])
+    def test_it_throws_for_invalid_alert_history_queries(self, app, api_event, query):
+        if isinstance(query.get("nextToken"), dict):
+            query = {"nextToken": app.page_tokens.encode(query["nextToken"])}
+        app.app.current_event = APIGatewayProxyEvent(
+            api_event("GET", f"/channels/{channel_id}/alerts", query=query))
+
+        with pytest.raises(BadRequestError):
+            app.get_channel_alerts(channel_id)
+
+    @pytest.mark.parametrize("include", ["alerts,invalid", "", ","])
+    def test_it_throws_for_invalid_channel_item_types(self, app, api_event, include):
+        app.app.current_event = APIGatewayProxyEvent(
+            api_event("GET", f"/channels/{channel_id}", query={"include": include}))
+
+        with pytest.raises(BadRequestError):
+            app.get_channel_data(channel_id)
+
     def test_it_returns_disabled_graphics(self, ddb_table, describe_channel_stub, medialive_client, app):
         describe_channel_stub["EncoderSettings"] = {
             "MotionGraphicsConfiguration": {
@@ -303,9 +893,12 @@ class TestApp:
             ],
             'GraphicsEnabled': False,
         }
-        ddb_table.query.assert_called_with(**{
-            'KeyConditionExpression': Key('ChannelId').eq(channel_id)
-        })
+        ddb_table.meta.client.query.assert_called_with(
+            TableName="CHANNEL_TABLE",
+            KeyConditionExpression="#ChannelId = :ChannelId",
+            ExpressionAttributeNames={"#ChannelId": "ChannelId"},
+            ExpressionAttributeValues={":ChannelId": {"S": channel_id}},
+        )
         medialive_client.describe_channel.assert_called_with(**{
             'ChannelId': channel_id
         })
@@ -349,12 +942,12 @@ class TestApp:
         }
 
         result_id = result['Id']
-        ddb_table.put_item.assert_called_with(Item={
-            'ChannelId': channel_id,
-            'SK': f'OUTPUT#{result_id}',
-            'Id': result_id,
-            'Url': url,
-            'Name': name
+        ddb_table.meta.client.put_item.assert_called_with(TableName='CHANNEL_TABLE', Item={
+            'ChannelId': {'S': channel_id},
+            'SK': {'S': f'OUTPUT#{result_id}'},
+            'Id': {'S': result_id},
+            'Url': {'S': url},
+            'Name': {'S': name}
         })
         medialive_client.describe_channel.assert_called_with(**{
             'ChannelId': channel_id
@@ -379,17 +972,51 @@ class TestApp:
         }
 
         result_id = result['Id']
-        ddb_table.put_item.assert_called_with(Item={
-            'ChannelId': channel_id,
-            'SK': f'GRAPHIC#{result_id}',
-            'Id': result_id,
-            'Url': url,
-            'Name': name
+        ddb_table.meta.client.put_item.assert_called_with(TableName='CHANNEL_TABLE', Item={
+            'ChannelId': {'S': channel_id},
+            'SK': {'S': f'GRAPHIC#{result_id}'},
+            'Id': {'S': result_id},
+            'Url': {'S': url},
+            'Name': {'S': name}
         })
         medialive_client.describe_channel.assert_called_with(**{
             'ChannelId': channel_id
         })
 
+    def test_it_does_not_post_items_for_missing_channels(self, ddb_table, medialive_client, app):
+        app.app.current_event = mock.MagicMock()
+        app.app.current_event.json_body = {
+            'Url': 'https://example.com/output/12345678?aspect=16x9',
+            'Name': 'My Graphic'
+        }
+        medialive_client.describe_channel.side_effect = ClientError(
+            {"Error": {"Code": "NotFoundException"}}, "DescribeChannel")
+
+        with pytest.raises(ClientError):
+            app.post_graphic(channel_id)
+
+        ddb_table.meta.client.put_item.assert_not_called()
+        ddb_table.delete_item.assert_not_called()
+
+    def test_it_reads_secrets(self, app):
+        with mock.patch.object(app, "session") as session:
+            session.client.return_value.get_secret_value.return_value = {"SecretString": "key"}
+            assert app._get_secret("arn:aws:secretsmanager:us-east-1:123456789012:secret:key") == "key"
+        session.client.assert_called_once_with("secretsmanager")
+        session.client.return_value.get_secret_value.assert_called_once_with(
+            SecretId="arn:aws:secretsmanager:us-east-1:123456789012:secret:key")
+
+    def test_it_runs_calls_concurrently(self, app):
+        assert app._run_concurrently(lambda: 1, lambda: 2) == [1, 2]
+
+        first, second = ValueError("first"), KeyError("second")
+
+        def fail(ex):
+            raise ex
+
+        with pytest.raises(ValueError):
+            app._run_concurrently(lambda: fail(first), lambda: fail(second))
+
     def test_it_throws_with_invalid_data(self, app):
         app.app.current_event = mock.MagicMock()
         app.app.current_event.json_body = {}
@@ -432,6 +1059,26 @@ class TestApp:
             }]
         }
 
+    def test_it_caches_mediapackage_origin_endpoints(self, mediapackage_client, app, api_event):
+        first = app.discover_outputs(channel_id)
+        mediapackage_client.get_paginator.side_effect = None
+        mediapackage_client.get_paginator.return_value.paginate.return_value = iter([{"OriginEndpoints": []}])
+
+        assert app.discover_outputs(channel_id) == first
+        assert mediapackage_client.get_paginator.call_count == 1
+
+        app.app.current_event = APIGatewayProxyEvent(
+            api_event("GET", f"/channels/{channel_id}/outputs/discover", query={"refresh": "true"}))
+        assert app.discover_outputs(channel_id) == {'Outputs': []}
+        assert mediapackage_client.get_paginator.call_count == 2
+
+    def test_it_throws_for_invalid_refresh(self, app, api_event):
+        app.app.current_event = APIGatewayProxyEvent(
+            api_event("GET", f"/channels/{channel_id}/outputs/discover", query={"refresh": "yes"}))
+
+        with pytest.raises(BadRequestError):
+            app.discover_outputs(channel_id)
+
     def test_it_ignores_irrelevant_mediapackage_origin_endpoints(self, describe_channel_stub, app):
         describe_channel_stub["Destinations"] = [
             {
@@ -449,3 +1096,162 @@ class TestApp:
         assert result == {
             'Outputs': []
         }
+
+    def test_it_replays_idempotent_requests(self, table_items, ddb_table, medialive_client, app, api_event):
+        app.app.current_event = APIGatewayProxyEvent(
+            api_event("PUT", f"/channels/{channel_id}/activeinput/Input%202", headers={"Idempotency-Key": "abc"}))
+
+        assert app.put_active_input(channel_id, "Input%202") == {"ActiveInput": "Input%202"}
+        # A new key is claimed without being read first
+        ddb_table.get_item.assert_not_called()
+        assert app.put_active_input(channel_id, "Input%202") == {"ActiveInput": "Input%202"}
+        medialive_client.batch_update_schedule.assert_called_once()
+        record = table_items[("IDEMPOTENCY#abc", f"PUT /channels/{channel_id}/activeinput/Input%202")]
+        assert record["Status"] == "COMPLETED"
+
+    def test_it_handles_requests_without_idempotency_keys(self, table_items, medialive_client, app, api_event):
+        app.app.current_event = APIGatewayProxyEvent(api_event("POST", f"/channels/{channel_id}/graphics/stop"))
+
+        app.post_stop_graphics(channel_id)
+        app.post_stop_graphics(channel_id)
+        assert medialive_client.batch_update_schedule.call_count == 2
+        assert table_items == {}
+
+    def test_it_rejects_reused_idempotency_keys(self, table_items, medialive_client, app, api_event):
+        path = f"/channels/{channel_id}/graphics/stop"
+        app.app.current_event = APIGatewayProxyEvent(
+            api_event("POST", path, headers={"Idempotency-Key": "abc"}, body="{}"))
+        app.post_stop_graphics(channel_id)
+
+        app.app.current_event = APIGatewayProxyEvent(
+            api_event("POST", path, headers={"Idempotency-Key": "abc"}, body='{"Other": true}'))
+        with pytest.raises(BadRequestError):
+            app.post_stop_graphics(channel_id)
+        medialive_client.batch_update_schedule.assert_called_once()
+
+    def test_it_returns_conflict_for_requests_in_progress(self, table_items, medialive_client, app, api_event):
+        path = f"/channels/{channel_id}/graphics/stop"
+        table_items[("IDEMPOTENCY#abc", f"POST {path}")] = {
+            "Status": "IN_PROGRESS", "RequestHash": hashlib.sha256(b"").hexdigest(), "ExpiresAt": 2 ** 40}
+        app.app.current_event = APIGatewayProxyEvent(api_event("POST", path, headers={"Idempotency-Key": "abc"}))
+
+        result = app.post_stop_graphics(channel_id)
+        assert result.status_code == 409
+        medialive_client.batch_update_schedule.assert_not_called()
+
+    def test_it_releases_idempotency_keys_for_failed_requests(self, table_items, medialive_client, app, api_event):
+        medialive_client.batch_update_schedule.side_effect = [
+            ClientError({"Error": {"Code": "TooManyRequestsException"}}, "BatchUpdateSchedule"), {}]
+        app.app.current_event = APIGatewayProxyEvent(
+            api_event("POST", f"/channels/{channel_id}/graphics/stop", headers={"Idempotency-Key": "abc"}))
+
+        with pytest.raises(ClientError):
+            app.post_stop_graphics(channel_id)
+        assert table_items == {}
+
+        app.post_stop_graphics(channel_id)
+        assert medialive_client.batch_update_schedule.call_count == 2
+
+    def test_it_throws_for_invalid_idempotency_keys(self, medialive_client, app, api_event):
+        app.app.current_event = APIGatewayProxyEvent(
+            api_event("POST", f"/channels/{channel_id}/graphics/stop", headers={"Idempotency-Key": "a b"}))
+
+        with pytest.raises(BadRequestError):
+            app.post_stop_graphics(channel_id)
+        medialive_client.batch_update_schedule.assert_not_called()
+
+    @pytest.mark.usefixtures('resolver')
+    def test_it_returns_etags_for_get_requests(self, api_event, lambda_context, app):
+        response = app.lambda_handler(api_event("GET", "/channels"), lambda_context)
+
+        assert response["statusCode"] == 200
+        assert response["multiValueHeaders"]["ETag"] == [mock.ANY]
+        assert response["body"]
+
+    @pytest.mark.usefixtures('resolver')
+    def test_it_returns_not_modified_for_matching_etags(self, api_event, lambda_context, app):
+        response = app.lambda_handler(api_event("GET", f"/channels/{channel_id}"), lambda_context)
+        etag = response["multiValueHeaders"]["ETag"][0]
+
+        response = app.lambda_handler(
+            api_event("GET", f"/channels/{channel_id}", headers={"If-None-Match": f'W/{etag}, "other"'}),
+            lambda_context)
+        assert response["statusCode"] == 304
+        assert response["body"] == ""
+        assert response["multiValueHeaders"]["ETag"] == [etag]
+
+    @pytest.mark.usefixtures('resolver')
+    def test_it_returns_body_for_changed_etags(self, api_event, lambda_context, app):
+        response = app.lambda_handler(
+            api_event("GET", "/channels", headers={"if-none-match": '"stale"'}), lambda_context)
+
+        assert response["statusCode"] == 200
+        assert response["body"]
+
+    @pytest.mark.usefixtures('resolver')
+    def test_it_omits_etags_for_mutations(self, api_event, lambda_context, medialive_client, app):
+        medialive_client.start_channel.return_value = {"Id": channel_id, "State": "Starting"}
+        response = app.lambda_handler(api_event("PUT", f"/channels/{channel_id}/status/start"), lambda_context)
+
+        assert response["statusCode"] == 200
+        assert "ETag" not in response["multiValueHeaders"]
+
+    @pytest.mark.usefixtures('resolver')
+    @pytest.mark.parametrize("code, status_code", [
+        ("NotFoundException", 404),
+        ("UnprocessableEntityException", 400),
+        ("TooManyRequestsException", 429),
+        ("InternalServerErrorException", 502),
+    ])
+    def test_it_maps_client_errors(self, api_event, lambda_context, medialive_client, app, code, status_code):
+        medialive_client.start_channel.side_effect = ClientError({"Error": {"Code": code}}, "StartChannel")
+        response = app.lambda_handler(api_event("PUT", f"/channels/{channel_id}/status/start"), lambda_context)
+
+        assert response["statusCode"] == status_code
+
+    @pytest.mark.usefixtures('resolver')
+    def test_it_rejects_invalid_bodies(self, api_event, lambda_context, app):
+        response = app.lambda_handler(
+            api_event("POST", f"/channels/{channel_id}/graphics", body='{"Name": "missing url"}'), lambda_context)
+
+        assert response["statusCode"] == 400
+
+    @pytest.mark.usefixtures('resolver')
+    def test_it_emits_route_metrics(self, api_event, lambda_context, capsys, app):
+        response = app.lambda_handler(api_event("GET", f"/channels/{channel_id}"), lambda_context)
+
+        assert response["statusCode"] == 200
+        [metrics] = emitted_metrics(capsys.readouterr().out)
+        directive = metrics["_aws"]["CloudWatchMetrics"][0]
+        assert directive["Namespace"] == "ChannelOrchestrator"
+        assert sorted(directive["Dimensions"][0]) == ["Route", "service"]
+        assert metrics["Route"] == "get_channel_data"
+        assert metrics["Latency"][0] > 0
+        assert metrics["DescribeChannelCacheMisses"] == [1]
+        assert metrics["DescribeChannelCacheHits"] == [0]
+        assert metrics["Throttles"] == [0]
+
+    @pytest.mark.usefixtures('resolver')
+    def test_it_emits_downstream_call_metrics(self, api_event, lambda_context, capsys, app):
+        client = app.request_metrics.attach(boto3.client("medialive", region_name="us-east-1"))
+        with Stubber(client) as stubber, mock.patch("app.medialive", client):
+            stubber.add_response("start_channel", {"Id": channel_id, "State": "STARTING"}, {"ChannelId": channel_id})
+            stubber.add_client_error("stop_channel", "TooManyRequestsException", http_status_code=429)
+            app.lambda_handler(api_event("PUT", f"/channels/{channel_id}/status/start"), lambda_context)
+            response = app.lambda_handler(api_event("PUT", f"/channels/{channel_id}/status/stop"), lambda_context)
+
+        assert response["statusCode"] == 429
+        emitted = emitted_metrics(capsys.readouterr().out)
+        assert [(m["Route"], m.get("Operation")) for m in emitted] == [
+            ("put_channel_status", "MediaLive.StartChannel"),
+            ("put_channel_status", None),
+            ("put_channel_status", "MediaLive.StopChannel"),
+            ("put_channel_status", None),
+        ]
+        start_call, start, stop_call, stop = emitted
+        assert sorted(start_call["_aws"]["CloudWatchMetrics"][0]["Dimensions"][0]) == ["Operation", "Route", "service"]
+        assert len(start_call["DownstreamLatency"]) == 1
+        assert start["MediaLiveCalls"] == [1]
+        assert start["Throttles"] == [0]
+        assert len(stop_call["DownstreamLatency"]) == 1
+        assert stop["Throttles"] == [1]
@@ -0,0 +1,70 @@
+import logging
+from unittest import mock
+from unittest.mock import MagicMock
+
+import pytest
+
+from cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+
+class TestTTLCache:
+    def test_it_returns_cached_values_until_expiry(self):
+        cache = TTLCache(ttl=10)
+        loader = MagicMock(return_value="value")
+
+        with mock.patch("cache.monotonic", return_value=100):
+            assert cache.get("key", loader) == "value"
+            assert cache.get("key", loader) == "value"
+        assert loader.call_count == 1
+
+        with mock.patch("cache.monotonic", return_value=111):
+            assert cache.get("key", loader) == "value"
+        assert loader.call_count == 2
+        assert cache.stats() == {"Hits": 1, "Misses": 2, "HitRatio": 1 / 3, "Size": 1}
+
+    def test_it_evicts_least_recently_used_entries(self):
+        cache = TTLCache(ttl=10, max_size=2)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a", MagicMock())
+        cache.set("c", 3)
+
+        assert cache.get("a", MagicMock()) == 1
+        assert cache.get("c", MagicMock()) == 3
+        assert cache.get("b", MagicMock(return_value="reloaded")) == "reloaded"
+
+    def test_it_invalidates_entries(self):
+        cache = TTLCache(ttl=10)
+        cache.set("key", "stale")
+        cache.invalidate("key", "missing")
+
+        assert cache.get("key", MagicMock(return_value="fresh")) == "fresh"
+
+    def test_it_does_not_store_values_loaded_across_invalidation(self):
+        cache = TTLCache(ttl=10)
+
+        def load():
+            cache.invalidate("key")
+            return "stale"
+
+        assert cache.get("key", load) == "stale"
+        assert cache.get("key", MagicMock(return_value="fresh")) == "fresh"
+
+    def test_it_does_not_cache_errors(self):
+        cache = TTLCache(ttl=10)
+        loader = MagicMock(side_effect=[ValueError, "value"])
+
+        with pytest.raises(ValueError):
+            cache.get("key", loader)
+        assert cache.get("key", loader) == "value"
+
+    def test_it_is_disabled_with_zero_ttl(self):
+        cache = TTLCache(ttl=0)
+        loader = MagicMock(return_value="value")
+        cache.get("key", loader)
+        cache.get("key", loader)
+
+        assert loader.call_count == 2
+        assert cache.stats()["Size"] == 0
@@ -0,0 +1,66 @@
+import logging
+from unittest import mock
+from unittest.mock import MagicMock
+
+import pytest
+from botocore.exceptions import ClientError
+
+from idempotency import COMPLETED, IN_PROGRESS, IdempotencyStore
+
+logger = logging.getLogger(__name__)
+
+
+@pytest.fixture()
+def table():
+    return MagicMock()
+
+
+@pytest.fixture()
+def store(table):
+    return IdempotencyStore(lambda: table, ttl=3600, in_progress_ttl=30)
+
+
+class TestIdempotencyStore:
+    def test_it_claims_keys_until_in_progress_expiry(self, table, store):
+        with mock.patch("idempotency.time", return_value=1000):
+            assert store.claim("key", "PUT /path", "hash")
+
+        item = table.put_item.call_args.kwargs["Item"]
+        assert item == {"ChannelId": "IDEMPOTENCY#key", "SK": "PUT /path", "Status": IN_PROGRESS,
+                        "RequestHash": "hash", "ExpiresAt": 1030}
+        assert "ConditionExpression" in table.put_item.call_args.kwargs
+
+    def test_it_does_not_claim_held_keys(self, table, store):
+        table.put_item.side_effect = ClientError(
+            {"Error": {"Code": "ConditionalCheckFailedException"}}, "PutItem")
+
+        assert not store.claim("key", "PUT /path", "hash")
+
+    def test_it_raises_other_errors_when_claiming(self, table, store):
+        table.put_item.side_effect = ClientError({"Error": {"Code": "InternalServerError"}}, "PutItem")
+
+        with pytest.raises(ClientError):
+            store.claim("key", "PUT /path", "hash")
+
+    def test_it_stores_completed_responses(self, table, store):
+        with mock.patch("idempotency.time", return_value=1000):
+            store.complete("key", "PUT /path", "hash", {"Result": None})
+
+        table.put_item.assert_called_once_with(Item={
+            "ChannelId": "IDEMPOTENCY#key", "SK": "PUT /path", "Status": COMPLETED,
+            "RequestHash": "hash", "Response": '{"Result": null}', "ExpiresAt": 4600})
+
+    def test_it_ignores_expired_records(self, table, store):
+        table.get_item.return_value = {"Item": {"ChannelId": "IDEMPOTENCY#key", "ExpiresAt": 1000}}
+
+        with mock.patch("idempotency.time", return_value=999):
+            assert store.get("key", "PUT /path") is not None
+        with mock.patch("idempotency.time", return_value=1000):
+            assert store.get("key", "PUT /path") is None
+        table.get_item.assert_called_with(Key={"ChannelId": "IDEMPOTENCY#key", "SK": "PUT /path"},
+                                          ConsistentRead=True)
+
+    def test_it_releases_keys(self, table, store):
+        store.release("key", "PUT /path")
+
+        table.delete_item.assert_called_once_with(Key={"ChannelId": "IDEMPOTENCY#key", "SK": "PUT /path"})
@@ -0,0 +1,54 @@
+import logging
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+API_DIR = Path(__file__).parents[2] / "api"
+# Modules shared with the other functions through a layer
+SHARED_DIR = Path(__file__).parents[2] / "shared"
+# Time spent importing app on a cold start, including the libraries it
+# depends on. About 1.2 times the 650-700ms measured with lazily created
+# clients, which CHECK_CLIENTS asserts. Raise through the environment on slow
+# machines
+IMPORT_BUDGET_MS = int(os.getenv("IMPORT_BUDGET_MS", 825))
+
+CHECK_CLIENTS = (
+    "import app; "
+    "assert not any(c.created for c in (app.session, app.medialive, app.mediapackage, app.dynamodb, app.table)); "
+    "import sys; "
+    "assert 'aws_lambda_powertools.utilities.validation' not in sys.modules"
+)
+
+
+def _import_times():
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", CHECK_CLIENTS],
+        cwd=API_DIR, env=dict(os.environ, PYTHONPATH=str(SHARED_DIR)), capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr
+
+    # Lines are formatted as "import time: self [us] | cumulative | module"
+    times = {}
+    for line in result.stderr.splitlines():
+        if line.startswith("import time:") and "|" in line:
+            _, cumulative_us, module = line.removeprefix("import time:").split("|")
+            if cumulative_us.strip().isdigit():
+                times[module.strip()] = int(cumulative_us)
+    return times
+
+
+def test_it_imports_within_budget():
+    elapsed_ms = _import_times()["app"] / 1000
+
+    logger.info(f"app imported in {elapsed_ms:.1f}ms")
+    assert elapsed_ms <= IMPORT_BUDGET_MS
+
+
+def test_it_requires_a_page_token_key():
+    env = {k: v for k, v in os.environ.items() if not k.startswith("PAGE_TOKEN_")}
+    result = subprocess.run([sys.executable, "-c", "import app"], cwd=API_DIR,
+                            env=dict(env, PYTHONPATH=str(SHARED_DIR)), capture_output=True, text=True)
+    assert result.returncode != 0
+    assert "PAGE_TOKEN_SECRET_ARN or PAGE_TOKEN_KEY must be set" in result.stderr
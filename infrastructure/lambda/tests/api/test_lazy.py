@@ -0,0 +1,43 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from threading import Event, RLock
+from unittest.mock import MagicMock
+
+from lazy import Lazy
+
+logger = logging.getLogger(__name__)
+
+
+class TestLazy:
+    def test_it_creates_the_wrapped_object_on_first_access(self):
+        factory = MagicMock()
+        proxy = Lazy(factory)
+        assert not proxy.created
+
+        proxy.describe_channel(ChannelId="1")
+        proxy.describe_channel(ChannelId="2")
+
+        factory.assert_called_once_with()
+        assert proxy.created
+        assert factory.return_value.describe_channel.call_count == 2
+
+    def test_it_creates_proxies_sharing_a_lock_one_at_a_time(self):
+        lock = RLock()
+        running = []
+        overlapped = Event()
+
+        def create():
+            if running:
+                overlapped.set()
+            running.append(1)
+            overlapped.wait(0.05)
+            running.pop()
+            return MagicMock()
+
+        session = Lazy(create, lock=lock)
+        clients = [Lazy(lambda: session.client() and create(), lock=lock) for _ in range(8)]
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            list(executor.map(lambda c: c.describe_channel(), clients))
+
+        assert not overlapped.is_set()
+        assert all(c.created for c in clients)
@@ -0,0 +1,104 @@
+import logging
+import threading
+from time import monotonic, sleep
+
+import boto3
+import pytest
+from botocore.stub import Stubber
+
+from limiter import READ, WRITE, RateLimiter, TokenBucket
+
+logger = logging.getLogger(__name__)
+
+
+class TestTokenBucket:
+    def test_it_allows_bursts_up_to_capacity(self):
+        bucket = TokenBucket(rate=2, capacity=2)
+
+        assert bucket.take(100) == 0
+        assert bucket.take(100) == 0
+        assert bucket.take(100) == 0.5
+
+    def test_it_refills_at_rate(self):
+        bucket = TokenBucket(rate=2)
+        bucket.take(100)
+        bucket.take(100)
+
+        assert bucket.take(100.5) == 0
+        assert bucket.take(100.5) == 0.5
+        # Tokens do not accumulate past capacity
+        assert bucket.take(110) == 0
+        assert bucket.tokens == 1
+
+
+class TestRateLimiter:
+    def test_it_rejects_when_token_is_not_available_within_max_wait(self):
+        limiter = RateLimiter(read_rate=1, write_rate=1, max_wait=0.1)
+
+        assert limiter.acquire(READ)
+        assert not limiter.acquire(READ)
+        # Buckets are independent
+        assert limiter.acquire(WRITE)
+        assert limiter.stats()[READ]["Acquired"] == 1
+        assert limiter.stats()[READ]["Rejected"] == 1
+
+    def test_it_waits_for_next_token(self):
+        limiter = RateLimiter(read_rate=20, write_rate=20, max_wait=1)
+        limiter._buckets[READ].tokens = 0
+
+        assert limiter.acquire(READ)
+        stats = limiter.stats()[READ]
+        assert stats["Acquired"] == 1
+        assert 0 < stats["MaxWait"] < 1
+        assert stats["WaitTime"] == stats["MaxWait"]
+
+    def test_it_does_not_wait_past_the_deadline(self):
+        limiter = RateLimiter(read_rate=1, write_rate=1, max_wait=10)
+        limiter._buckets[READ].tokens = 0
+        limiter.deadline = monotonic() + 0.1
+
+        assert not limiter.acquire(READ)
+        assert limiter.stats()[READ]["Rejected"] == 1
+
+    def test_it_allows_bursts_up_to_capacity(self):
+        limiter = RateLimiter(read_rate=1, write_rate=1, max_wait=0, read_capacity=10)
+
+        assert all(limiter.acquire(READ) for _ in range(10))
+        assert not limiter.acquire(READ)
+        # Capacity defaults to the rate
+        assert limiter.acquire(WRITE)
+        assert not limiter.acquire(WRITE)
+
+    def test_reads_yield_to_waiting_writes(self):
+        limiter = RateLimiter(read_rate=100, write_rate=10, max_wait=1)
+        limiter._buckets[WRITE].tokens = 0
+        order = []
+
+        writer = threading.Thread(target=lambda: limiter.acquire(WRITE) and order.append(WRITE))
+        writer.start()
+        sleep(0.02)
+        assert limiter.acquire(READ)
+        order.append(READ)
+        writer.join()
+
+        assert order == [WRITE, READ]
+
+    def test_it_throttles_client_calls(self):
+        client = boto3.client("medialive", region_name="us-east-1")
+        limiter = RateLimiter(read_rate=1, write_rate=1, max_wait=0)
+        limiter.attach(client)
+
+        with Stubber(client) as stubber:
+            stubber.add_response("describe_channel", {"Id": "1"}, {"ChannelId": "1"})
+            stubber.add_response("start_channel", {"Id": "1"}, {"ChannelId": "1"})
+            stubber.add_response("describe_channel", {"Id": "1"}, {"ChannelId": "1"})
+            client.describe_channel(ChannelId="1")
+            client.start_channel(ChannelId="1")
+
+            with pytest.raises(client.exceptions.TooManyRequestsException):
+                client.describe_channel(ChannelId="1")
+
+        stats = limiter.stats()
+        assert stats[READ]["Acquired"] == 1
+        assert stats[READ]["Rejected"] == 1
+        assert stats[WRITE]["Acquired"] == 1
@@ -0,0 +1,114 @@
+import logging
+from datetime import datetime, timezone
+from unittest import mock
+from unittest.mock import MagicMock
+
+from schedules import ScheduleCache, as_started, split_schedule
+
+logger = logging.getLogger(__name__)
+
+
+def fixed_action(name, time, settings="InputSwitchSettings"):
+    return {
+        "ActionName": name,
+        "ScheduleActionSettings": {settings: {}},
+        "ScheduleActionStartSettings": {"FixedModeScheduleActionStartSettings": {"Time": time}},
+    }
+
+
+def immediate_action(name, settings="InputSwitchSettings"):
+    return {
+        "ActionName": name,
+        "ScheduleActionSettings": {settings: {}},
+        "ScheduleActionStartSettings": {"ImmediateModeScheduleActionStartSettings": {}},
+    }
+
+
+def names(actions):
+    return [i["ActionName"] for i in actions]
+
+
+class TestScheduleCache:
+    def test_it_returns_cached_schedules_until_expiry(self):
+        cache = ScheduleCache(ttl=10)
+        loader = MagicMock(return_value=[fixed_action("a", "2022-01-01T00:00:00.000Z")])
+
+        with mock.patch("schedules.monotonic", return_value=100):
+            assert names(cache.get("channel", loader)) == ["a"]
+            assert names(cache.get("channel", loader)) == ["a"]
+        assert loader.call_count == 1
+
+        with mock.patch("schedules.monotonic", return_value=111):
+            cache.get("channel", loader)
+        assert loader.call_count == 2
+        assert cache.stats() == {"Hits": 1, "Misses": 2, "HitRatio": 1 / 3, "Size": 1}
+
+    def test_it_inserts_recorded_actions_in_schedule_order(self):
+        cache = ScheduleCache(ttl=10)
+        loader = MagicMock(return_value=[
+            fixed_action("past", "2022-01-01T00:00:00.000Z"),
+            fixed_action("future", "2099-01-01T00:00:00.000Z"),
+        ])
+        cache.get("channel", loader)
+
+        cache.record("channel", [fixed_action("written", "2022-06-01T00:00:00.000Z")])
+        assert names(cache.get("channel", loader)) == ["past", "written", "future"]
+        assert loader.call_count == 1
+
+    def test_it_keeps_recorded_actions_until_listed(self):
+        cache = ScheduleCache(ttl=10, pending_ttl=60)
+        written = fixed_action("written", "2022-06-01T00:00:00.000Z")
+
+        with mock.patch("schedules.monotonic", return_value=100):
+            cache.record("channel", [written])
+            assert names(cache.get("channel", lambda: [])) == ["written"]
+
+        with mock.patch("schedules.monotonic", return_value=111):
+            assert names(cache.get("channel", lambda: [written])) == ["written"]
+
+        with mock.patch("schedules.monotonic", return_value=122):
+            assert names(cache.get("channel", lambda: [])) == []
+
+    def test_it_expires_recorded_actions(self):
+        cache = ScheduleCache(ttl=10, pending_ttl=15)
+
+        with mock.patch("schedules.monotonic", return_value=100):
+            cache.record("channel", [fixed_action("written", "2022-06-01T00:00:00.000Z")])
+        with mock.patch("schedules.monotonic", return_value=116):
+            assert cache.get("channel", lambda: []) == []
+
+    def test_it_does_not_cache_with_zero_ttl(self):
+        cache = ScheduleCache(ttl=0)
+        loader = MagicMock(return_value=[])
+
+        cache.record("channel", [fixed_action("written", "2022-06-01T00:00:00.000Z")])
+        cache.get("channel", loader)
+        assert cache.get("channel", loader) == []
+        assert loader.call_count == 2
+
+
+class TestSchedules:
+    def test_it_marks_immediate_actions_as_started(self):
+        started_at = datetime(2022, 4, 15, 10, 0, 0, 123000, tzinfo=timezone.utc)
+
+        action = as_started(immediate_action("a"), started_at)
+        assert action["ScheduleActionStartSettings"] == {
+            "FixedModeScheduleActionStartSettings": {"Time": "2022-04-15T10:00:00.123Z"},
+        }
+        fixed = fixed_action("b", "2099-01-01T00:00:00.000Z")
+        assert as_started(fixed, started_at) is fixed
+
+    def test_it_splits_current_and_upcoming_actions(self):
+        now = datetime(2022, 4, 15, 12, 0, tzinfo=timezone.utc)
+        actions = [
+            fixed_action("switch-1", "2022-04-15T10:00:00.000Z"),
+            fixed_action("graphic", "2022-04-15T10:30:00.000Z", "MotionGraphicsImageActivateSettings"),
+            fixed_action("switch-2", "2022-04-15T11:00:00.000Z"),
+            fixed_action("graphic-stop", "2022-04-15T11:30:00.000Z", "MotionGraphicsImageDeactivateSettings"),
+            fixed_action("switch-3", "2022-04-15T13:00:00.000Z"),
+            immediate_action("pending"),
+        ]
+
+        current, upcoming = split_schedule(actions, now)
+        assert names(current) == ["switch-2", "graphic-stop"]
+        assert names(upcoming) == ["switch-3", "pending"]
@@ -0,0 +1,57 @@
+import logging
+
+import boto3
+import pytest
+from botocore.stub import Stubber
+
+from telemetry import RequestMetrics
+
+logger = logging.getLogger(__name__)
+
+
+class TestRequestMetrics:
+    def test_it_records_the_route(self):
+        request_metrics = RequestMetrics()
+
+        @request_metrics.route_handler
+        def get_channels():
+            return "result"
+
+        assert get_channels() == "result"
+        assert get_channels.__name__ == "get_channels"
+        assert request_metrics.route == "get_channels"
+
+    def test_it_records_client_calls(self):
+        client = boto3.client("medialive", region_name="us-east-1")
+        request_metrics = RequestMetrics()
+        request_metrics.attach(client)
+
+        with Stubber(client) as stubber:
+            stubber.add_response("describe_channel", {"Id": "1"}, {"ChannelId": "1"})
+            stubber.add_response("describe_channel", {"Id": "2"}, {"ChannelId": "2"})
+            stubber.add_client_error("start_channel", "TooManyRequestsException", http_status_code=429)
+            client.describe_channel(ChannelId="1")
+            client.describe_channel(ChannelId="2")
+            with pytest.raises(client.exceptions.TooManyRequestsException):
+                client.start_channel(ChannelId="1")
+
+        calls = request_metrics.calls()
+        assert sorted(calls) == ["MediaLive.DescribeChannel", "MediaLive.StartChannel"]
+        assert len(calls["MediaLive.DescribeChannel"]) == 2
+        assert all(latency >= 0 for latency in calls["MediaLive.DescribeChannel"])
+        assert request_metrics.throttles() == {"MediaLive.StartChannel": 1}
+
+    def test_it_resets_between_requests(self):
+        client = boto3.client("medialive", region_name="us-east-1")
+        request_metrics = RequestMetrics()
+        request_metrics.attach(client)
+        request_metrics.route = "get_channels"
+
+        with Stubber(client) as stubber:
+            stubber.add_response("describe_channel", {"Id": "1"}, {"ChannelId": "1"})
+            client.describe_channel(ChannelId="1")
+        request_metrics.reset()
+
+        assert request_metrics.route is None
+        assert request_metrics.calls() == {}
+        assert request_metrics.throttles() == {}
@@ -0,0 +1,36 @@
+import logging
+
+import pytest
+
+from tokens import TokenSigner
+
+logger = logging.getLogger(__name__)
+
+
+class TestTokenSigner:
+    def test_it_round_trips_payloads(self):
+        signer = TokenSigner("key")
+        payload = {"Source": "summaries", "Key": {"ChannelId": "1234", "SK": "CHANNEL#summary"}}
+
+        token = signer.encode(payload)
+        assert "=" not in token and "+" not in token and "/" not in token
+        assert signer.decode(token) == payload
+
+    def test_it_rejects_altered_tokens(self):
+        signer = TokenSigner(b"key")
+        token = signer.encode({"Source": "medialive", "Token": "a"})
+        forged = signer.encode({"Source": "medialive", "Token": "b"})
+
+        with pytest.raises(ValueError):
+            signer.decode(token[:43] + forged[43:])
+
+    def test_it_rejects_tokens_signed_with_other_keys(self):
+        token = TokenSigner("other").encode({"Source": "medialive", "Token": "a"})
+
+        with pytest.raises(ValueError):
+            TokenSigner("key").decode(token)
+
+    @pytest.mark.parametrize("token", ["", "abc", "not base64!"])
+    def test_it_rejects_malformed_tokens(self, token):
+        with pytest.raises(ValueError):
+            TokenSigner("key").decode(token)
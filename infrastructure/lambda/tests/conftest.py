@@ -11,7 +11,8 @@ logger = logging.getLogger(__name__)
 
 @pytest.fixture(autouse=True, scope="module")
 def env_vars():
-    with mock.patch.dict(os.environ, {"AWS_DEFAULT_REGION": "us-east-1", "CHANNEL_TABLE": "CHANNEL_TABLE", "ALERT_EXPIRY": "1"}):
+    with mock.patch.dict(os.environ, {"AWS_DEFAULT_REGION": "us-east-1", "CHANNEL_TABLE": "CHANNEL_TABLE", "ALERT_EXPIRY": "1",
+                                     "PAGE_TOKEN_KEY": "PAGE_TOKEN_KEY"}):
         yield
 
 
@@ -48,6 +49,16 @@ def list_origin_endpoints_stub():
     return load_stub("list_origin_endpoints.json")
 
 
+@pytest.fixture(scope="function")
+def describe_schedule_stub():
+    return load_stub("describe_schedule.json")
+
+
+@pytest.fixture(scope="function")
+def jwk_private_stub():
+    return load_stub("jwk_private.json")
+
+
 @pytest.fixture(scope="function")
 def query_table_stub():
     return load_stub("query_table.json")
@@ -0,0 +1,15 @@
+import logging
+from unittest import mock
+from unittest.mock import MagicMock
+
+import pytest
+
+logger = logging.getLogger(__name__)
+
+
+@pytest.fixture()
+def ddb_table():
+    mock_ddb = MagicMock()
+    mock_ddb.query.return_value = {"Items": []}
+    with mock.patch("subscriptions.table", mock_ddb):
+        yield mock_ddb
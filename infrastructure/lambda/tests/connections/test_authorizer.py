@@ -0,0 +1,140 @@
+import base64
+import hashlib
+import io
+import json
+import logging
+from unittest import mock
+from unittest.mock import MagicMock
+
+import pytest
+from importlib import import_module
+
+logger = logging.getLogger(__name__)
+
+issuer = "https://cognito-idp.us-east-1.amazonaws.com/us-east-1_pool"
+client_id = "client"
+method_arn = "arn:aws:execute-api:us-east-1:123456789012:api/dev/$connect"
+
+
+def b64encode(value):
+    return base64.urlsafe_b64encode(value).decode().rstrip("=")
+
+
+def b64int(value):
+    return int.from_bytes(base64.urlsafe_b64decode(value + "=" * (-len(value) % 4)), "big")
+
+
+@pytest.fixture()
+def private_key(jwk_private_stub):
+    return jwk_private_stub
+
+
+@pytest.fixture()
+def sign(private_key):
+    def build(claims=None, header=None, key=private_key):
+        claims = {"sub": "user", "iss": issuer, "token_use": "access", "client_id": client_id,
+                  "exp": 2 ** 40, **(claims or {})}
+        header = {"alg": "RS256", "kid": key["kid"], **(header or {})}
+        signing_input = f"{b64encode(json.dumps(header).encode())}.{b64encode(json.dumps(claims).encode())}"
+        n, d = b64int(key["n"]), b64int(key["d"])
+        size = (n.bit_length() + 7) // 8
+        digest_info = bytes.fromhex("3031300d060960864801650304020105000420") + \
+            hashlib.sha256(signing_input.encode()).digest()
+        message = b"\x00\x01" + b"\xff" * (size - len(digest_info) - 3) + b"\x00" + digest_info
+        signature = pow(int.from_bytes(message, "big"), d, n).to_bytes(size, "big")
+        return f"{signing_input}.{b64encode(signature)}"
+    return build
+
+
+@pytest.fixture()
+def jwks_opener(private_key):
+    public_key = {k: private_key[k] for k in ("kid", "kty", "alg", "use", "n", "e")}
+    opener = MagicMock()
+    opener.open.side_effect = lambda *args, **kwargs: io.BytesIO(json.dumps({"keys": [public_key]}).encode())
+    with mock.patch("jwt.jwks_client.urllib.request.build_opener", MagicMock(return_value=opener)):
+        yield opener
+
+
+@pytest.fixture()
+def app(jwks_opener):
+    module = import_module("authorizer")
+    jwks = module.jwt.PyJWKClient(f"{issuer}/.well-known/jwks.json", lifespan=module.JWKS_LIFESPAN,
+                                  cooldown_duration=module.JWKS_REFRESH_INTERVAL)
+    with mock.patch.multiple(module, issuer=issuer, user_pool_client_id=client_id, jwks=jwks):
+        yield module
+
+
+def connect_event(protocols):
+    return {
+        "type": "REQUEST",
+        "methodArn": method_arn,
+        "headers": {"Sec-WebSocket-Protocol": protocols} if protocols is not None else {},
+        "requestContext": {"routeKey": "$connect", "connectionId": "L0SM9cOFvHcCIhw="},
+    }
+
+
+class TestAuthorizer:
+    def test_it_allows_access_tokens_from_the_user_pool(self, sign, app):
+        result = app.lambda_handler(connect_event(f"channel-orchestrator, {sign()}"), MagicMock())
+        assert result == {
+            "principalId": "user",
+            "policyDocument": {
+                "Version": "2012-10-17",
+                "Statement": [{"Action": "execute-api:Invoke", "Effect": "Allow", "Resource": method_arn}],
+            },
+        }
+
+    @pytest.mark.parametrize("claims", [
+        {"iss": "https://cognito-idp.us-east-1.amazonaws.com/us-east-1_other"},
+        {"iss": None},
+        {"token_use": "id"},
+        {"client_id": None},
+        {"exp": None},
+        {"exp": "2099-01-01"},
+    ])
+    def test_it_rejects_tokens_with_invalid_claims(self, sign, app, claims):
+        with pytest.raises(Exception, match="^Unauthorized$"):
+            app.lambda_handler(connect_event(f"channel-orchestrator, {sign(claims)}"), MagicMock())
+
+    def test_it_rejects_expired_tokens(self, sign, app):
+        with pytest.raises(Exception, match="^Unauthorized$"):
+            app.lambda_handler(connect_event(sign({"exp": 1})), MagicMock())
+
+    @pytest.mark.parametrize("claims", [{"client_id": "other"}, {"aud": "other"}])
+    def test_it_rejects_tokens_for_other_audiences(self, sign, app, claims):
+        with pytest.raises(Exception, match="^Unauthorized$"):
+            app.lambda_handler(connect_event(sign(claims)), MagicMock())
+
+    def test_it_rejects_tokens_with_unknown_key_ids(self, sign, app):
+        with pytest.raises(app.Unauthorized, match="^Unknown signing key$"):
+            app.verify(sign(header={"kid": "unknown"}))
+
+    def test_it_rejects_tampered_tokens(self, sign, app):
+        header, _, signature = sign().split(".")
+        claims = b64encode(json.dumps({"sub": "other", "iss": issuer, "token_use": "access",
+                                       "client_id": client_id, "exp": 2 ** 40}).encode())
+
+        with pytest.raises(Exception, match="^Unauthorized$"):
+            app.lambda_handler(connect_event(f"{header}.{claims}.{signature}"), MagicMock())
+
+    def test_it_rejects_tokens_signed_with_other_keys(self, sign, private_key, app):
+        other = {**private_key, "d": b64encode((b64int(private_key["d"]) + 2).to_bytes(256, "big"))}
+
+        with pytest.raises(Exception, match="^Unauthorized$"):
+            app.lambda_handler(connect_event(sign(key=other)), MagicMock())
+
+    @pytest.mark.parametrize("header", [{"alg": "none"}, {"alg": "HS256"}])
+    def test_it_rejects_tokens_with_invalid_headers(self, sign, app, header):
+        with pytest.raises(Exception, match="^Unauthorized$"):
+            app.lambda_handler(connect_event(sign(header=header)), MagicMock())
+
+    @pytest.mark.parametrize("protocols", [None, "channel-orchestrator", "abc", "a.b.c"])
+    def test_it_rejects_missing_and_malformed_tokens(self, app, protocols):
+        with pytest.raises(Exception, match="^Unauthorized$"):
+            app.lambda_handler(connect_event(protocols), MagicMock())
+
+    def test_it_refetches_keys_for_unknown_key_ids_at_most_once_per_interval(self, sign, jwks_opener, app):
+        for _ in range(3):
+            with pytest.raises(Exception):
+                app.lambda_handler(connect_event(sign(header={"kid": "unknown"})), MagicMock())
+        jwks_opener.open.assert_called_once()
@@ -0,0 +1,79 @@
+import json
+import logging
+from unittest import mock
+from unittest.mock import MagicMock
+
+import pytest
+from importlib import import_module
+
+logger = logging.getLogger(__name__)
+
+connection_id = "L0SM9cOFvHcCIhw="
+
+
+@pytest.fixture()
+def app():
+    yield import_module('subscriptions')
+
+
+@pytest.fixture()
+def websocket_event():
+    def build(route, body=None, query=None):
+        return {
+            "requestContext": {
+                "routeKey": route,
+                "connectionId": connection_id,
+                "requestId": "c6af9ac6-7b61-11e6-9a41-93e8deadbeef",
+            },
+            "queryStringParameters": query,
+            "body": json.dumps(body) if body is not None else None,
+            "isBase64Encoded": False,
+        }
+    return build
+
+
+@pytest.mark.usefixtures('ddb_table', 'app')
+class TestSubscriptions:
+    def test_it_accepts_authorized_connections_with_protocol(self, websocket_event, app):
+        result = app.lambda_handler(websocket_event("$connect"), MagicMock())
+        assert result == {"statusCode": 200, "headers": {"Sec-WebSocket-Protocol": "channel-orchestrator"}}
+
+    def test_it_subscribes_to_channels(self, websocket_event, ddb_table, app):
+        batch = ddb_table.batch_writer.return_value.__enter__.return_value
+
+        result = app.lambda_handler(websocket_event("subscribe", body={"channelId": "123456"}), MagicMock())
+        assert result == {"statusCode": 200}
+        batch.put_item.assert_has_calls([
+            mock.call(Item={
+                "ChannelId": "SUBSCRIPTIONS#123456",
+                "SK": f"CONNECTION#{connection_id}",
+                "ConnectionId": connection_id,
+                "ExpiresAt": mock.ANY
+            }),
+            mock.call(Item={
+                "ChannelId": f"CONNECTION#{connection_id}",
+                "SK": "SUBSCRIPTION#123456",
+                "ExpiresAt": mock.ANY
+            }),
+        ])
+
+    def test_it_rejects_invalid_subscriptions(self, websocket_event, ddb_table, app):
+        result = app.lambda_handler(websocket_event("subscribe", body={"channelId": "ALERT#1"}), MagicMock())
+        assert result == {"statusCode": 400}
+
+        result = app.lambda_handler(websocket_event("subscribe", body={}), MagicMock())
+        assert result == {"statusCode": 400}
+        ddb_table.batch_writer.assert_not_called()
+
+    def test_it_removes_subscriptions_on_disconnect(self, websocket_event, ddb_table, app):
+        batch = ddb_table.batch_writer.return_value.__enter__.return_value
+        ddb_table.query.return_value = {"Items": [
+            {"ChannelId": f"CONNECTION#{connection_id}", "SK": "SUBSCRIPTION#*"},
+        ]}
+
+        result = app.lambda_handler(websocket_event("$disconnect"), MagicMock())
+        assert result == {"statusCode": 200}
+        batch.delete_item.assert_has_calls([
+            mock.call(Key={"ChannelId": "SUBSCRIPTIONS#*", "SK": f"CONNECTION#{connection_id}"}),
+            mock.call(Key={"ChannelId": f"CONNECTION#{connection_id}", "SK": "SUBSCRIPTION#*"}),
+        ])
@@ -1,3 +1,4 @@
+import json
 import logging
 from unittest import mock
 from unittest.mock import MagicMock
@@ -10,6 +11,48 @@ logger = logging.getLogger(__name__)
 @pytest.fixture()
 def ddb_table(query_table_stub):
     mock_ddb = MagicMock()
-    mock_ddb.put_item.return_value = {}
+    mock_ddb.name = "CHANNEL_TABLE"
+    mock_ddb.meta.client.put_item.return_value = {}
+    mock_ddb.update_item.return_value = {"Attributes": {"Name": "Channel 1", "InputAttachments": []}}
+    mock_ddb.query.return_value = {"Items": []}
     with mock.patch("index.table", mock_ddb):
         yield mock_ddb
+
+
+@pytest.fixture()
+def medialive_client(list_channels_stub, describe_channel_stub):
+    mock_ml = MagicMock()
+    mock_ml.get_paginator.return_value.paginate.return_value = iter([list_channels_stub])
+    mock_ml.describe_channel.return_value = describe_channel_stub
+
+    with mock.patch("index.medialive", mock_ml):
+        yield mock_ml
+
+
+class GoneException(Exception):
+    pass
+
+
+class InMemoryConnections:
+    """
+    Stand-in for the apigatewaymanagementapi client which records the messages
+    posted to each open connection
+    """
+    class exceptions:
+        GoneException = GoneException
+
+    def __init__(self, open_connections=()):
+        self.open_connections = set(open_connections)
+        self.messages = {}
+
+    def post_to_connection(self, ConnectionId, Data):
+        if ConnectionId not in self.open_connections:
+            raise GoneException(ConnectionId)
+        self.messages.setdefault(ConnectionId, []).append(json.loads(Data))
+
+
+@pytest.fixture()
+def connections():
+    in_memory = InMemoryConnections()
+    with mock.patch("index.connections", in_memory):
+        yield in_memory
@@ -1,5 +1,7 @@
+import json
 import logging
 from datetime import datetime
+from unittest import mock
 from unittest.mock import MagicMock
 
 import pytest
@@ -13,6 +15,11 @@ def app():
     yield import_module('index')
 
 
+@pytest.fixture(autouse=True)
+def reset_alert_memo(app):
+    app.alert_memo.clear()
+
+
 @pytest.fixture()
 def event_stub():
     yield {
@@ -35,64 +42,460 @@ def event_stub():
     }
 
 
-@pytest.mark.usefixtures('ddb_table', 'app')
+@pytest.fixture()
+def state_change_stub():
+    yield {
+        "version": "0",
+        "id": "0495e5eb-9b99-56f2-7849-96389e4b2d8f",
+        "detail-type": "MediaLive Channel State Change",
+        "source": "aws.medialive",
+        "account": "123456789012",
+        "time": "1970-01-01T00:00:10Z",
+        "region": "us-east-1",
+        "resources": ["arn:aws:medialive:us-east-1:123456789012:channel:123456"],
+        "detail": {
+            "channel_arn": "arn:aws:medialive:us-east-1:123456789012:channel:123456",
+            "state": "RUNNING",
+            "message": "ChannelStateChanged",
+            "pipelines_running_count": 1
+        }
+    }
+
+
+@pytest.fixture()
+def input_change_stub():
+    yield {
+        "version": "0",
+        "id": "8a3a2c3e-8a9f-4ac4-b6a5-3d6b1e0f3c61",
+        "detail-type": "MediaLive Channel Input Change",
+        "source": "aws.medialive",
+        "account": "123456789012",
+        "time": "1970-01-01T00:00:20Z",
+        "region": "us-east-1",
+        "resources": ["arn:aws:medialive:us-east-1:123456789012:channel:123456"],
+        "detail": {
+            "channel_arn": "arn:aws:medialive:us-east-1:123456789012:channel:123456",
+            "pipeline": "0",
+            "message": "Input switch to [Input 2] was successful",
+            "active_input_attachment_name": "Input 2",
+            "active_input_switch_action_name": "a1b2c3d4-5678-90ab-cdef-EXAMPLE11111"
+        }
+    }
+
+
+@pytest.fixture()
+def scheduled_event_stub():
+    yield {
+        "version": "0",
+        "id": "53dc4d37-cffa-4f76-80c9-8b7d4a4d2eaa",
+        "detail-type": "Scheduled Event",
+        "source": "aws.events",
+        "account": "123456789012",
+        "time": "1970-01-01T00:00:00Z",
+        "region": "us-east-1",
+        "resources": ["arn:aws:events:us-east-1:123456789012:rule/reconcile"],
+        "detail": {}
+    }
+
+
+@pytest.fixture()
+def sqs_event():
+    def build(*events):
+        return {
+            "Records": [
+                {"messageId": f"message{i}", "body": body if isinstance(body, str) else json.dumps(body)}
+                for i, body in enumerate(events)
+            ]
+        }
+    return build
+
+
+def alert(event_stub, time, state="set", alarm_id="foobar"):
+    return dict(event_stub, time=time, detail=dict(event_stub["detail"], alarm_state=state, alarm_id=alarm_id))
+
+
+@pytest.mark.usefixtures('ddb_table', 'medialive_client', 'app')
 class TestEvents:
     def test_it_sets_alerts(self, event_stub, ddb_table, app):
         app.lambda_handler(event_stub, MagicMock())
-        ddb_table.put_item.assert_called_with(
+        ddb_table.meta.client.put_item.assert_called_with(
+            TableName='CHANNEL_TABLE',
             Item={
-                'ChannelId': '123456',
-                'SK': 'ALERT#foobar',
-                'Id': 'foobar',
-                'State': 'SET',
-                'Message': 'Stopped receiving network data on [rtp://:5000]',
-                'AlertedAt': 0
+                'ChannelId': {'S': '123456'},
+                'SK': {'S': 'ALERT#foobar'},
+                'Id': {'S': 'foobar'},
+                'State': {'S': 'SET'},
+                'Message': {'S': 'Stopped receiving network data on [rtp://:5000]'},
+                'AlertedAt': {'N': '0'}
             },
             ConditionExpression='attribute_not_exists(#SK) OR #AlertedAt < :AlertedAt',
             ExpressionAttributeNames={'#SK': 'SK', '#AlertedAt': 'AlertedAt'},
-            ExpressionAttributeValues={':AlertedAt': 0}
+            ExpressionAttributeValues={':AlertedAt': {'N': '0'}}
         )
 
     def test_it_clears_alerts_with_ttl(self, event_stub, ddb_table, app):
         event_stub["detail"]["alarm_state"] = "cleared"
         app.lambda_handler(event_stub, MagicMock())
-        ddb_table.put_item.assert_called_with(
+        ddb_table.meta.client.put_item.assert_called_with(
+            TableName='CHANNEL_TABLE',
             Item={
-                'ChannelId': '123456',
-                'SK': 'ALERT#foobar',
-                'Id': 'foobar',
-                'State': 'CLEARED',
-                'Message': 'Stopped receiving network data on [rtp://:5000]',
-                'AlertedAt': 0,
-                'ExpiresAt': 3600
+                'ChannelId': {'S': '123456'},
+                'SK': {'S': 'ALERT#foobar'},
+                'Id': {'S': 'foobar'},
+                'State': {'S': 'CLEARED'},
+                'Message': {'S': 'Stopped receiving network data on [rtp://:5000]'},
+                'AlertedAt': {'N': '0'},
+                'ExpiresAt': {'N': '3600'}
             },
             ConditionExpression='attribute_not_exists(#SK) OR #AlertedAt < :AlertedAt',
             ExpressionAttributeNames={'#SK': 'SK', '#AlertedAt': 'AlertedAt'},
-            ExpressionAttributeValues={':AlertedAt': 0}
+            ExpressionAttributeValues={':AlertedAt': {'N': '0'}}
         )
 
     def test_it_omits_expires_at_when_ttl_configured_as_zero(self, event_stub, ddb_table, app):
         event_stub["detail"]["alarm_state"] = "cleared"
         app.alert_expiry = 0
         app.lambda_handler(event_stub, MagicMock())
-        ddb_table.put_item.assert_called_with(
+        ddb_table.meta.client.put_item.assert_called_with(
+            TableName='CHANNEL_TABLE',
             Item={
-                'ChannelId': '123456',
-                'SK': 'ALERT#foobar',
-                'Id': 'foobar',
-                'State': 'CLEARED',
-                'Message': 'Stopped receiving network data on [rtp://:5000]',
-                'AlertedAt': 0
+                'ChannelId': {'S': '123456'},
+                'SK': {'S': 'ALERT#foobar'},
+                'Id': {'S': 'foobar'},
+                'State': {'S': 'CLEARED'},
+                'Message': {'S': 'Stopped receiving network data on [rtp://:5000]'},
+                'AlertedAt': {'N': '0'}
             },
             ConditionExpression='attribute_not_exists(#SK) OR #AlertedAt < :AlertedAt',
             ExpressionAttributeNames={'#SK': 'SK', '#AlertedAt': 'AlertedAt'},
-            ExpressionAttributeValues={':AlertedAt': 0}
+            ExpressionAttributeValues={':AlertedAt': {'N': '0'}}
         )
 
     def test_it_handles_conditional_errors(self, event_stub, ddb_table, app):
-        ddb_table.put_item.side_effect = [ddb_table.meta.client.ConditionalCheckFailedException()]
+        ddb_table.meta.client.put_item.side_effect = [ddb_table.meta.client.ConditionalCheckFailedException()]
         app.lambda_handler(event_stub, MagicMock())
 
     def test_it_throws_for_malformed_events(self, event_stub, ddb_table, app):
         with pytest.raises(KeyError):
             app.lambda_handler({}, MagicMock())
+
+    def test_it_records_channel_state_changes(self, state_change_stub, ddb_table, app):
+        app.lambda_handler(state_change_stub, MagicMock())
+        ddb_table.update_item.assert_called_with(
+            Key={'ChannelId': '123456', 'SK': 'CHANNEL#summary'},
+            UpdateExpression='SET #State = :State, #EntityType = :EntityType, '
+                             '#StateUpdatedAt = :EventAt, #LastEventAt = :EventAt, #ModifiedAt = :ModifiedAt',
+            ConditionExpression='(attribute_not_exists(#StateUpdatedAt) OR #StateUpdatedAt <= :EventAt) '
+                                'AND (attribute_not_exists(#State) OR #State <> :State)',
+            ExpressionAttributeNames={
+                '#State': 'State',
+                '#EntityType': 'EntityType',
+                '#StateUpdatedAt': 'StateUpdatedAt',
+                '#LastEventAt': 'LastEventAt',
+                '#ModifiedAt': 'ModifiedAt',
+            },
+            ExpressionAttributeValues={
+                ':State': 'RUNNING',
+                ':EntityType': 'CHANNEL',
+                ':EventAt': 10,
+                ':ModifiedAt': mock.ANY,
+            },
+            ReturnValues='ALL_NEW',
+        )
+
+    def test_it_adds_details_to_summaries_of_new_channels(self, state_change_stub, describe_channel_stub, ddb_table,
+                                                          medialive_client, app):
+        describe_channel_stub.update(Name="Channel 1", InputAttachments=[
+            {"InputId": "021345abcdef6789", "InputAttachmentName": "Input 1"}])
+        ddb_table.update_item.return_value = {"Attributes": {"ChannelId": "123456", "State": "RUNNING"}}
+        app.lambda_handler(state_change_stub, MagicMock())
+
+        medialive_client.describe_channel.assert_called_once_with(ChannelId="123456")
+        ddb_table.update_item.assert_called_with(
+            Key={'ChannelId': '123456', 'SK': 'CHANNEL#summary'},
+            UpdateExpression='SET #Name = if_not_exists(#Name, :Name), '
+                             '#InputAttachments = if_not_exists(#InputAttachments, :InputAttachments), '
+                             '#ModifiedAt = :ModifiedAt',
+            ExpressionAttributeNames={
+                '#Name': 'Name',
+                '#InputAttachments': 'InputAttachments',
+                '#ModifiedAt': 'ModifiedAt',
+            },
+            ExpressionAttributeValues={
+                ':Name': 'Channel 1',
+                ':InputAttachments': [{'Id': '021345abcdef6789', 'Name': 'Input 1'}],
+                ':ModifiedAt': mock.ANY,
+            }
+        )
+
+    def test_it_does_not_describe_channels_with_details(self, input_change_stub, ddb_table, medialive_client, app):
+        app.lambda_handler(input_change_stub, MagicMock())
+
+        medialive_client.describe_channel.assert_not_called()
+        ddb_table.update_item.assert_called_once()
+
+    def test_it_tombstones_summaries_for_deleted_channels(self, state_change_stub, ddb_table, app):
+        state_change_stub["detail"]["state"] = "DELETED"
+        app.lambda_handler(state_change_stub, MagicMock())
+        update = ddb_table.update_item.call_args.kwargs
+        assert update["Key"] == {'ChannelId': '123456', 'SK': 'CHANNEL#summary'}
+        assert update["ExpressionAttributeValues"][":Deleted"] is True
+        assert update["ExpressionAttributeValues"][":ExpiresAt"] > 0
+
+    def test_it_records_input_changes_per_pipeline(self, input_change_stub, ddb_table, app):
+        input_change_stub["detail"]["pipeline"] = "1"
+        app.lambda_handler(input_change_stub, MagicMock())
+        ddb_table.update_item.assert_called_with(
+            Key={'ChannelId': '123456', 'SK': 'CHANNEL#summary'},
+            UpdateExpression='SET #ActiveInput = :ActiveInput, #EntityType = :EntityType, '
+                             '#InputUpdatedAt = :EventAt, #LastEventAt = :EventAt, #ModifiedAt = :ModifiedAt',
+            ConditionExpression='(attribute_not_exists(#InputUpdatedAt) OR #InputUpdatedAt <= :EventAt) '
+                                'AND (attribute_not_exists(#ActiveInput) OR #ActiveInput <> :ActiveInput)',
+            ExpressionAttributeNames={
+                '#ActiveInput': 'Pipeline1ActiveInput',
+                '#EntityType': 'EntityType',
+                '#InputUpdatedAt': 'Pipeline1UpdatedAt',
+                '#LastEventAt': 'LastEventAt',
+                '#ModifiedAt': 'ModifiedAt',
+            },
+            ExpressionAttributeValues={
+                ':ActiveInput': 'Input 2',
+                ':EntityType': 'CHANNEL',
+                ':EventAt': 20,
+                ':ModifiedAt': mock.ANY,
+            },
+            ReturnValues='ALL_NEW',
+        )
+
+    def test_it_skips_older_channel_events(self, input_change_stub, ddb_table, app):
+        ddb_table.update_item.side_effect = app.dynamodb.meta.client.exceptions.ConditionalCheckFailedException(
+            {"Error": {"Code": "ConditionalCheckFailedException"}}, "UpdateItem")
+        app.lambda_handler(input_change_stub, MagicMock())
+        ddb_table.update_item.assert_called_once()
+
+    def test_it_reconciles_channel_summaries(self, scheduled_event_stub, list_channels_stub, ddb_table,
+                                             medialive_client, app):
+        list_channels_stub["Channels"][0]["State"] = "RUNNING"
+        ddb_table.query.return_value = {"Items": [
+            {"ChannelId": "abcdef01234567890", "SK": "CHANNEL#summary"},
+            {"ChannelId": "deleted", "SK": "CHANNEL#summary"},
+        ]}
+
+        app.lambda_handler(scheduled_event_stub, MagicMock())
+
+        assert ddb_table.update_item.call_count == 2
+        update = ddb_table.update_item.call_args_list[0].kwargs
+        assert update["Key"] == {'ChannelId': 'abcdef01234567890', 'SK': 'CHANNEL#summary'}
+        assert update["ExpressionAttributeValues"][":State"] == "RUNNING"
+        assert update["ExpressionAttributeValues"][":InputAttachments"] == [
+            {"Id": "021345abcdef6789", "Name": "Input 1"},
+            {"Id": "021345abcdef6789", "Name": "Input 2"},
+        ]
+        assert update["ExpressionAttributeValues"][":Pipeline0ActiveInput"] == "Input 1"
+        medialive_client.describe_channel.assert_called_once_with(ChannelId="abcdef01234567890")
+        tombstone = ddb_table.update_item.call_args_list[1].kwargs
+        assert tombstone["Key"] == {'ChannelId': 'deleted', 'SK': 'CHANNEL#summary'}
+        assert tombstone["ExpressionAttributeValues"][":Deleted"] is True
+        ddb_table.put_item.assert_called_once_with(
+            Item={"ChannelId": "SUMMARIES", "SK": "POPULATED", "ReconciledAt": mock.ANY})
+
+    def test_it_reconciles_channel_summaries_when_the_stack_is_deployed(self, scheduled_event_stub, ddb_table,
+                                                                      medialive_client, app):
+        event = dict(scheduled_event_stub, **{
+            "detail-type": "CloudFormation Stack Status Change",
+            "source": "aws.cloudformation",
+            "detail": {"status-details": {"status": "UPDATE_COMPLETE"}},
+        })
+        ddb_table.query.return_value = {"Items": []}
+
+        app.lambda_handler(event, MagicMock())
+
+        medialive_client.get_paginator.assert_called_with("list_channels")
+        ddb_table.put_item.assert_called_once_with(
+            Item={"ChannelId": "SUMMARIES", "SK": "POPULATED", "ReconciledAt": mock.ANY})
+
+    def test_it_skips_unchanged_summaries_when_reconciling(self, scheduled_event_stub, ddb_table,
+                                                         medialive_client, app):
+        ddb_table.query.return_value = {"Items": [{
+            "ChannelId": "abcdef01234567890",
+            "SK": "CHANNEL#summary",
+            "Name": "Channel 1",
+            "State": "IDLE",
+            "InputAttachments": [
+                {"Id": "021345abcdef6789", "Name": "Input 1"},
+                {"Id": "021345abcdef6789", "Name": "Input 2"},
+            ],
+        }]}
+
+        app.lambda_handler(scheduled_event_stub, MagicMock())
+
+        ddb_table.update_item.assert_not_called()
+        medialive_client.describe_channel.assert_not_called()
+
+    def test_it_pushes_events_to_subscribers(self, input_change_stub, ddb_table, connections, app):
+        connections.open_connections.update({"conn1", "conn2"})
+        subscriptions = {
+            "SUBSCRIPTIONS#123456": [
+                {"ChannelId": "SUBSCRIPTIONS#123456", "SK": "CONNECTION#conn1", "ConnectionId": "conn1"},
+                {"ChannelId": "SUBSCRIPTIONS#123456", "SK": "CONNECTION#closed", "ConnectionId": "closed"},
+            ],
+            "SUBSCRIPTIONS#*": [
+                {"ChannelId": "SUBSCRIPTIONS#*", "SK": "CONNECTION#conn1", "ConnectionId": "conn1"},
+                {"ChannelId": "SUBSCRIPTIONS#*", "SK": "CONNECTION#conn2", "ConnectionId": "conn2"},
+            ],
+        }
+        ddb_table.query.side_effect = lambda KeyConditionExpression: {
+            "Items": subscriptions[KeyConditionExpression.get_expression()["values"][1]]
+        }
+
+        app.lambda_handler(input_change_stub, MagicMock())
+
+        message = {"Type": "INPUT", "ChannelId": "123456", "Pipeline": "0", "ActiveInput": "Input 2"}
+        assert connections.messages == {"conn1": [message], "conn2": [message]}
+        ddb_table.delete_item.assert_called_once_with(
+            Key={"ChannelId": "SUBSCRIPTIONS#123456", "SK": "CONNECTION#closed"})
+
+    def test_it_does_not_push_skipped_events(self, event_stub, ddb_table, connections, app):
+        connections.open_connections.add("conn1")
+        ddb_table.query.return_value = {"Items": [
+            {"ChannelId": "SUBSCRIPTIONS#*", "SK": "CONNECTION#conn1", "ConnectionId": "conn1"}
+        ]}
+        ddb_table.meta.client.put_item.side_effect = app.dynamodb.meta.client.exceptions.ConditionalCheckFailedException(
+            {"Error": {"Code": "ConditionalCheckFailedException"}}, "PutItem")
+
+        app.lambda_handler(event_stub, MagicMock())
+
+        assert connections.messages == {}
+
+    def test_it_writes_newest_alert_per_alarm_from_batches(self, event_stub, sqs_event, ddb_table, app):
+        result = app.lambda_handler(sqs_event(
+            alert(event_stub, "1970-01-01T00:00:10Z", "cleared"),
+            alert(event_stub, "1970-01-01T00:00:05Z"),
+            alert(event_stub, "1970-01-01T00:00:01Z", alarm_id="other"),
+        ), MagicMock())
+
+        assert result == {"batchItemFailures": []}
+        assert ddb_table.meta.client.put_item.call_count == 2
+        written = {c.kwargs["Item"]["Id"]["S"]: c.kwargs["Item"] for c in ddb_table.meta.client.put_item.call_args_list}
+        assert written["foobar"]["State"] == {"S": "CLEARED"}
+        assert written["foobar"]["AlertedAt"] == {"N": "10"}
+        assert written["other"]["AlertedAt"] == {"N": "1"}
+
+    def test_it_reports_failed_batch_items(self, event_stub, sqs_event, ddb_table, app):
+        def put_item(**kwargs):
+            if kwargs["Item"]["Id"]["S"] == "failing":
+                raise app.dynamodb.meta.client.exceptions.ClientError(
+                    {"Error": {"Code": "ProvisionedThroughputExceededException"}}, "PutItem")
+            return {}
+
+        ddb_table.meta.client.put_item.side_effect = put_item
+        result = app.lambda_handler(sqs_event(
+            alert(event_stub, "1970-01-01T00:00:01Z"),
+            alert(event_stub, "1970-01-01T00:00:01Z", alarm_id="failing"),
+            "not json",
+            {"time": "1970-01-01T00:00:01Z", "detail": {}},
+        ), MagicMock())
+
+        # Invalid messages are acknowledged, as retrying them cannot succeed
+        assert result == {"batchItemFailures": [{"itemIdentifier": "message1"}]}
+        assert ddb_table.meta.client.put_item.call_count == 2
+
+    def test_it_skips_alerts_older_than_last_write(self, event_stub, ddb_table, app):
+        app.lambda_handler(alert(event_stub, "1970-01-01T00:01:00Z"), MagicMock())
+        app.lambda_handler(alert(event_stub, "1970-01-01T00:00:10Z", "cleared"), MagicMock())
+
+        assert ddb_table.meta.client.put_item.call_count == 1
+
+    def test_it_remembers_newer_stored_alerts(self, event_stub, ddb_table, app):
+        ddb_table.meta.client.put_item.side_effect = app.dynamodb.meta.client.exceptions.ConditionalCheckFailedException(
+            {"Error": {"Code": "ConditionalCheckFailedException"}}, "PutItem")
+
+        app.lambda_handler(alert(event_stub, "1970-01-01T00:01:00Z"), MagicMock())
+        app.lambda_handler(alert(event_stub, "1970-01-01T00:01:00Z"), MagicMock())
+
+        assert ddb_table.meta.client.put_item.call_count == 1
+
+    def test_it_skips_repeated_alerts_within_flap_window(self, event_stub, ddb_table, app):
+        app.lambda_handler(alert(event_stub, "1970-01-01T00:00:00Z"), MagicMock())
+        app.lambda_handler(alert(event_stub, "1970-01-01T00:00:10Z"), MagicMock())
+        assert ddb_table.meta.client.put_item.call_count == 1
+
+        app.lambda_handler(alert(event_stub, "1970-01-01T00:01:00Z"), MagicMock())
+        assert ddb_table.meta.client.put_item.call_count == 2
+
+    def test_it_counts_flaps_within_window(self, event_stub, ddb_table, app):
+        app.lambda_handler(alert(event_stub, "1970-01-01T00:00:00Z"), MagicMock())
+        app.lambda_handler(alert(event_stub, "1970-01-01T00:00:05Z", "cleared"), MagicMock())
+        app.lambda_handler(alert(event_stub, "1970-01-01T00:00:10Z"), MagicMock())
+
+        item = ddb_table.meta.client.put_item.call_args.kwargs["Item"]
+        assert item["State"] == {"S": "SET"}
+        assert item["FlapCount"] == {"N": "2"}
+
+    def test_it_counts_flaps_within_batches(self, event_stub, sqs_event, ddb_table, app):
+        app.lambda_handler(sqs_event(
+            alert(event_stub, "1970-01-01T00:00:00Z"),
+            alert(event_stub, "1970-01-01T00:00:05Z", "cleared"),
+            alert(event_stub, "1970-01-01T00:00:08Z"),
+            alert(event_stub, "1970-01-01T00:00:09Z", "cleared"),
+        ), MagicMock())
+
+        ddb_table.meta.client.put_item.assert_called_once()
+        item = ddb_table.meta.client.put_item.call_args.kwargs["Item"]
+        assert item["State"] == {"S": "CLEARED"}
+        assert item["FlapCount"] == {"N": "3"}
+
+    def test_it_records_alert_history(self, event_stub, ddb_table, app):
+        app.lambda_handler(event_stub, MagicMock())
+
+        batch = ddb_table.batch_writer.return_value.__enter__.return_value
+        batch.put_item.assert_called_once_with(Item={
+            "ChannelId": "ALERTLOG#123456",
+            "SK": "0000000000#foobar",
+            "S": "SET",
+            "M": "Stopped receiving network data on [rtp://:5000]",
+            "ExpiresAt": 30 * 86400,
+        })
+
+    def test_it_records_every_batched_alert_in_history(self, event_stub, sqs_event, ddb_table, app):
+        app.lambda_handler(sqs_event(
+            alert(event_stub, "1970-01-01T00:00:00Z"),
+            alert(event_stub, "1970-01-01T00:00:05Z", "cleared"),
+        ), MagicMock())
+
+        batch = ddb_table.batch_writer.return_value.__enter__.return_value
+        assert [c.kwargs["Item"]["SK"] for c in batch.put_item.call_args_list] == [
+            "0000000000#foobar", "0000000005#foobar"]
+        ddb_table.meta.client.put_item.assert_called_once()
+
+    def test_it_retries_batches_whose_history_is_not_written(self, event_stub, sqs_event, ddb_table, app):
+        batch = ddb_table.batch_writer.return_value.__enter__.return_value
+        batch.put_item.side_effect = app.dynamodb.meta.client.exceptions.ClientError(
+            {"Error": {"Code": "ProvisionedThroughputExceededException"}}, "BatchWriteItem")
+
+        result = app.lambda_handler(sqs_event(
+            alert(event_stub, "1970-01-01T00:00:00Z"),
+            alert(event_stub, "1970-01-01T00:00:05Z", "cleared"),
+            alert(event_stub, "1970-01-01T00:00:01Z", alarm_id="other"),
+        ), MagicMock())
+
+        assert result == {"batchItemFailures": [
+            {"itemIdentifier": "message0"},
+            {"itemIdentifier": "message1"},
+            {"itemIdentifier": "message2"},
+        ]}
+        # The latest state is still written
+        assert ddb_table.meta.client.put_item.call_count == 2
+
+    def test_it_emits_metrics(self, event_stub, ddb_table, capsys, app):
+        app.lambda_handler(event_stub, MagicMock())
+
+        [metrics] = [json.loads(line) for line in capsys.readouterr().out.splitlines() if '"_aws"' in line]
+        directive = metrics["_aws"]["CloudWatchMetrics"][0]
+        assert sorted(directive["Dimensions"][0]) == ["Route", "service"]
+        assert {m["Name"] for m in directive["Metrics"]} == {"AlertIngestLag", "Latency"}
+        assert metrics["Route"] == "MediaLive Channel Alert"
+        assert metrics["service"] == "EVENTS"
+        # The stub event was sent at the epoch
+        lag = metrics["AlertIngestLag"]
+        assert (lag[0] if isinstance(lag, list) else lag) > datetime(2020, 1, 1).timestamp() * 1000
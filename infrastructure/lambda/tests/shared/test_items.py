@@ -0,0 +1,58 @@
+import logging
+from decimal import Decimal
+
+from boto3.dynamodb.types import TypeDeserializer
+
+import items
+
+logger = logging.getLogger(__name__)
+
+alert = {
+    "ChannelId": {"S": "123"},
+    "SK": {"S": "ALERT#100"},
+    "Id": {"S": "100"},
+    "State": {"S": "CLEARED"},
+    "Message": {"S": "foobar"},
+    "AlertedAt": {"N": "1650000000"},
+    "ExpiresAt": {"N": "1650003600"},
+}
+
+
+class TestItems:
+    def test_it_deserializes_known_item_shapes(self):
+        result = items.deserialize(alert)
+
+        assert result == {
+            "ChannelId": "123",
+            "SK": "ALERT#100",
+            "Id": "100",
+            "State": "CLEARED",
+            "Message": "foobar",
+            "AlertedAt": 1650000000,
+            "ExpiresAt": 1650003600,
+        }
+        assert isinstance(result["AlertedAt"], int)
+
+    def test_it_matches_type_deserializer(self):
+        deserializer = TypeDeserializer()
+        expected = {k: deserializer.deserialize(v) for k, v in alert.items()}
+
+        assert items.deserialize(alert) == expected
+
+    def test_it_falls_back_for_unknown_attributes(self):
+        result = items.deserialize({
+            "AlertedAt": {"N": "1.5"},
+            "InputAttachments": {"L": [{"M": {"Id": {"S": "1"}, "Name": {"S": "Input 1"}}}]},
+        })
+
+        assert result == {
+            "AlertedAt": 1.5,
+            "InputAttachments": [{"Id": "1", "Name": "Input 1"}],
+        }
+
+    def test_it_serializes_items(self):
+        assert items.serialize(items.deserialize(alert)) == alert
+        assert items.serialize({"AlertedAt": Decimal("1.5"), "Tags": ["a"]}) == {
+            "AlertedAt": {"N": "1.5"},
+            "Tags": {"L": [{"S": "a"}]},
+        }
@@ -8,6 +8,7 @@ import {
   API_GATEWAY_ENDPOINT,
 } from "./constants";
 import useAmplifyTheme from "./hooks/useAmplifyTheme";
+import usePushUpdates from "./hooks/usePushUpdates";
 import {
   AppBar,
   Box,
@@ -67,6 +68,7 @@ const components = {
 
 const App = ({ signOut }) => {
   const location = useLocation();
+  usePushUpdates();
   const [anchorElNav, setAnchorElNav] = useState(null);
 
   const handleOpenNavMenu = (event) => {
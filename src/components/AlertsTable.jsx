@@ -42,7 +42,10 @@ const AlertsTable = ({ data = [] }) => {
                     sx={{ "&:last-child td, &:last-child th": { border: 0 } }}
                   >
                     <TableCell>{timeString}</TableCell>
-                    <TableCell>{i.State}</TableCell>
+                    <TableCell>
+                      {i.State}
+                      {i.FlapCount > 0 && ` (flapped ${i.FlapCount}x)`}
+                    </TableCell>
                     <TableCell>{i.Message}</TableCell>
                   </TableRow>
                 );
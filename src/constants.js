@@ -10,6 +10,7 @@ export const AWS_USER_POOL_WEB_CLIENT_ID =
   "<COGNITO_WEB_CLIENT_ID>";
 export const API_GATEWAY_ENDPOINT =
   import.meta.env.VITE_APP_API_GATEWAY_ENDPOINT ?? "<API_URL_INCLUDING_STAGE>";
+export const WEBSOCKET_ENDPOINT = import.meta.env.VITE_APP_WEBSOCKET_ENDPOINT;
 /************* END OF ENVIRONMENT VARIABLES **************/
 export const RUNNING_STATE = "RUNNING";
 export const IDLE_STATE = "IDLE";
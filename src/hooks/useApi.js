@@ -1,15 +1,49 @@
 import { API } from "aws-amplify";
 
+// Last ETag and body seen per GET path, used to revalidate polled resources
+const etagCache = new Map();
+
+// Delta requests carry the version they follow, so each is only made once
+// and revalidating it would only grow the cache
+const isDelta = (path, clientConfig) =>
+  new URLSearchParams(path.split("?")[1]).has("since") ||
+  "since" in (clientConfig.queryStringParameters ?? {});
+
+const conditionalGet = (apiName, path, clientConfig) => {
+  const key = `${apiName}:${path}:${JSON.stringify(
+    clientConfig.queryStringParameters ?? {}
+  )}`;
+  const cached = etagCache.get(key);
+  const headers = cached
+    ? { "If-None-Match": cached.etag, ...clientConfig.headers }
+    : clientConfig.headers;
+
+  return API.get(apiName, path, { ...clientConfig, headers, response: true })
+    .then((response) => {
+      const etag = response.headers?.etag;
+      if (etag) etagCache.set(key, { etag, data: response.data });
+      return response.data;
+    })
+    .catch((err) => {
+      // Returning the cached object keeps React Query from re-rendering
+      if (err.response?.status === 304 && cached) return cached.data;
+      throw err;
+    });
+};
+
 export const useApi = (apiName = "data") => {
   return {
-    get: (path, clientConfig = {}) => API.get(apiName, path, clientConfig),
+    get: (path, clientConfig = {}) =>
+      clientConfig.response || isDelta(path, clientConfig)
+        ? API.get(apiName, path, clientConfig)
+        : conditionalGet(apiName, path, clientConfig),
     post: (path, data, clientConfig = {}) =>
       API.post(apiName, path, {
         body: data,
         ...clientConfig,
       }),
     put: (path, data, clientConfig = {}) =>
-      API.put(apiName, path, data, {
+      API.put(apiName, path, {
         body: data,
         ...clientConfig,
       }),
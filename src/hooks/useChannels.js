@@ -1,41 +1,143 @@
 import useApi from "./useApi";
 import { useMutation, useQuery, useQueryClient } from "@tanstack/react-query";
 import { useSnackbar } from "notistack";
+import { usePushConnected } from "./usePushUpdates";
 
 export const CHANNELS_PATH = "channels";
+export const POLL_INTERVAL = 3000;
+// Polling is only a fallback whilst push updates are connected
+export const FALLBACK_POLL_INTERVAL = 60000;
 export const GRAPHICS_PATH = "graphics";
 export const OUTPUTS_PATH = "outputs";
+export const ALERTS_PATH = "alerts";
+// Fields needed to select a channel, which are listed without describing
+// every channel
+export const SELECTOR_FIELDS = ["Name", "State"];
+export const IDEMPOTENCY_HEADER = "Idempotency-Key";
+// Failed mutations are retried whilst the API was unreachable, failed or was
+// still handling an earlier attempt
+export const MUTATION_RETRIES = 2;
+const RETRIED_STATUSES = new Set([409, 502, 503, 504]);
 
-export const useChannels = (config = {}) => {
+// Sends each user action with its own idempotency key, which retries of the
+// action reuse so that the API applies it at most once
+const useIdempotentMutation = (mutationFn, config) => {
+  const mutation = useMutation(
+    ({ idempotencyKey, ...variables }) =>
+      mutationFn(variables, {
+        headers: { [IDEMPOTENCY_HEADER]: idempotencyKey },
+      }),
+    {
+      retry: (failureCount, err) =>
+        failureCount < MUTATION_RETRIES &&
+        (!err.response || RETRIED_STATUSES.has(err.response.status)),
+      ...config,
+    }
+  );
+  const withKey = (variables) => ({
+    ...variables,
+    idempotencyKey: crypto.randomUUID(),
+  });
+  return {
+    ...mutation,
+    mutate: (variables, options) =>
+      mutation.mutate(withKey(variables), options),
+    mutateAsync: (variables, options) =>
+      mutation.mutateAsync(withKey(variables), options),
+  };
+};
+
+// Applies a delta response (one containing Deleted) to the previous channel list
+export const mergeChannels = (previous, data) => {
+  if (!previous || !("Deleted" in data)) return data;
+  const changed = new Map(data.Channels.map((channel) => [channel.Id, channel]));
+  const deleted = new Set(data.Deleted);
+  const channels = previous.Channels.filter(
+    (channel) => !deleted.has(channel.Id)
+  ).map((channel) => changed.get(channel.Id) ?? channel);
+  const existing = new Set(previous.Channels.map((channel) => channel.Id));
+  return {
+    Channels: [
+      ...channels,
+      ...data.Channels.filter((channel) => !existing.has(channel.Id)),
+    ],
+    Version: data.Version,
+  };
+};
+
+export const useChannels = (config = {}, fields = undefined) => {
   const { get } = useApi();
+  const queryClient = useQueryClient();
+  const pushConnected = usePushConnected();
+  // Projected lists are cached separately from the full channel list
+  const queryKey = fields ? [CHANNELS_PATH, { fields }] : [CHANNELS_PATH];
 
   return useQuery(
-    [CHANNELS_PATH],
-    () =>
-      get(`/${CHANNELS_PATH}`).catch((err) => {
-        console.error(err);
-        throw new Error(`Unable to retrieve channels`);
-      }),
+    queryKey,
+    () => {
+      const previous = queryClient.getQueryData(queryKey);
+      const params = new URLSearchParams();
+      if (previous?.Version !== undefined) params.set("since", previous.Version);
+      if (fields) params.set("fields", fields.join(","));
+      const query = params.toString();
+      const path = query ? `/${CHANNELS_PATH}?${query}` : `/${CHANNELS_PATH}`;
+      return get(path)
+        .then((data) => mergeChannels(previous, data))
+        .catch((err) => {
+          console.error(err);
+          throw new Error(`Unable to retrieve channels`);
+        });
+    },
     {
-      refetchInterval: 3000,
+      refetchInterval: pushConnected ? FALLBACK_POLL_INTERVAL : POLL_INTERVAL,
       useErrorBoundary: true,
       ...config,
     }
   );
 };
 
+// Graphics and outputs rarely change, so are refreshed on the fallback interval
+// whilst alerts are polled separately by useChannelAlerts
 export const useChannel = (channelId, config = {}) => {
   const { get } = useApi();
 
   return useQuery(
     [CHANNELS_PATH, channelId],
     () =>
-      get(`/${CHANNELS_PATH}/${channelId}`).catch((err) => {
+      get(`/${CHANNELS_PATH}/${channelId}`, {
+        queryStringParameters: {
+          include: [GRAPHICS_PATH, OUTPUTS_PATH].join(","),
+        },
+      }).catch((err) => {
         console.error(err);
         throw new Error(`Unable to retrieve channel`);
       }),
     {
-      refetchInterval: 3000,
+      refetchInterval: FALLBACK_POLL_INTERVAL,
+      useErrorBoundary: true,
+      enabled: !!channelId,
+      ...config,
+    }
+  );
+};
+
+export const useChannelAlerts = (channelId, config = {}) => {
+  const { get } = useApi();
+  const pushConnected = usePushConnected();
+
+  return useQuery(
+    [CHANNELS_PATH, channelId, ALERTS_PATH],
+    () =>
+      get(`/${CHANNELS_PATH}/${channelId}`, {
+        queryStringParameters: { include: ALERTS_PATH },
+      })
+        .then((res) => res?.Alerts ?? [])
+        .catch((err) => {
+          console.error(err);
+          throw new Error(`Unable to retrieve channel alerts`);
+        }),
+    {
+      refetchInterval: pushConnected ? FALLBACK_POLL_INTERVAL : POLL_INTERVAL,
       useErrorBoundary: true,
       enabled: !!channelId,
       ...config,
@@ -47,8 +149,9 @@ export const useUpdateStatus = (channelId, config = {}) => {
   const { put } = useApi();
   const queryClient = useQueryClient();
   const { enqueueSnackbar } = useSnackbar();
-  const mutation = useMutation(
-    ({ status }) => put(`/${CHANNELS_PATH}/${channelId}/status/${status}`, {}),
+  const mutation = useIdempotentMutation(
+    ({ status }, clientConfig) =>
+      put(`/${CHANNELS_PATH}/${channelId}/status/${status}`, {}, clientConfig),
     {
       onSuccess: (_, data) => {
         enqueueSnackbar("Channel update requested", {
@@ -79,9 +182,13 @@ export const useUpdateInput = (channelId, config = {}) => {
   const { put } = useApi();
   const queryClient = useQueryClient();
   const { enqueueSnackbar } = useSnackbar();
-  const mutation = useMutation(
-    ({ input }) =>
-      put(`/${CHANNELS_PATH}/${channelId}/activeinput/${input}`, {}),
+  const mutation = useIdempotentMutation(
+    ({ input }, clientConfig) =>
+      put(
+        `/${CHANNELS_PATH}/${channelId}/activeinput/${input}`,
+        {},
+        clientConfig
+      ),
     {
       onSuccess: (_, data) => {
         enqueueSnackbar("Input switch requested", {
@@ -112,9 +219,13 @@ export const usePrepareInput = (channelId, config = {}) => {
   const { post } = useApi();
   const queryClient = useQueryClient();
   const { enqueueSnackbar } = useSnackbar();
-  const mutation = useMutation(
-    ({ input }) =>
-      post(`/${CHANNELS_PATH}/${channelId}/prepareinput/${input}`, {}),
+  const mutation = useIdempotentMutation(
+    ({ input }, clientConfig) =>
+      post(
+        `/${CHANNELS_PATH}/${channelId}/prepareinput/${input}`,
+        {},
+        clientConfig
+      ),
     {
       onSuccess: (_, data) => {
         enqueueSnackbar("Prepare input requested", {
@@ -145,11 +256,12 @@ export const useInsertGraphic = (channelId, config = {}) => {
   const { post } = useApi();
   const queryClient = useQueryClient();
   const { enqueueSnackbar } = useSnackbar();
-  const mutation = useMutation(
-    ({ graphicId, ...rest }) =>
+  const mutation = useIdempotentMutation(
+    ({ graphicId, ...rest }, clientConfig) =>
       post(
         `/${CHANNELS_PATH}/${channelId}/${GRAPHICS_PATH}/${graphicId}/start`,
-        rest
+        rest,
+        clientConfig
       ),
     {
       onSuccess: (_, data) => {
@@ -181,9 +293,9 @@ export const useAddChannelData = (channelId, config = {}) => {
   const { post } = useApi();
   const queryClient = useQueryClient();
   const { enqueueSnackbar } = useSnackbar();
-  const mutation = useMutation(
-    ({ dataType, data }) =>
-      post(`/${CHANNELS_PATH}/${channelId}/${dataType}`, data),
+  const mutation = useIdempotentMutation(
+    ({ dataType, data }, clientConfig) =>
+      post(`/${CHANNELS_PATH}/${channelId}/${dataType}`, data, clientConfig),
     {
       onSuccess: (_, { data, dataType }) => {
         enqueueSnackbar(`Added ${data.Name} to ${dataType}`, {
@@ -214,9 +326,12 @@ export const useRemoveChannelData = (channelId, config = {}) => {
   const methods = useApi();
   const queryClient = useQueryClient();
   const { enqueueSnackbar } = useSnackbar();
-  const mutation = useMutation(
-    ({ dataType, id }) =>
-      methods.delete(`/${CHANNELS_PATH}/${channelId}/${dataType}/${id}`),
+  const mutation = useIdempotentMutation(
+    ({ dataType, id }, clientConfig) =>
+      methods.delete(
+        `/${CHANNELS_PATH}/${channelId}/${dataType}/${id}`,
+        clientConfig
+      ),
     {
       onSuccess: (_, { id, dataType }) => {
         enqueueSnackbar(`Deleted ${dataType.replace(/s+$/, "")}`, {
@@ -247,8 +362,13 @@ export const useStopGraphics = (channelId, config = {}) => {
   const { post } = useApi();
   const queryClient = useQueryClient();
   const { enqueueSnackbar } = useSnackbar();
-  const mutation = useMutation(
-    () => post(`/${CHANNELS_PATH}/${channelId}/${GRAPHICS_PATH}/stop`),
+  const mutation = useIdempotentMutation(
+    (_, clientConfig) =>
+      post(
+        `/${CHANNELS_PATH}/${channelId}/${GRAPHICS_PATH}/stop`,
+        undefined,
+        clientConfig
+      ),
     {
       onSuccess: () => {
         enqueueSnackbar(`Stop graphics requested`, {
@@ -277,6 +397,8 @@ export const useStopGraphics = (channelId, config = {}) => {
 
 const hooks = {
   useChannels,
+  useChannel,
+  useChannelAlerts,
   useUpdateStatus,
   usePrepareInput,
   useUpdateInput,
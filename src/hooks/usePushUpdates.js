@@ -0,0 +1,83 @@
+import { useEffect, useSyncExternalStore } from "react";
+import { Auth } from "aws-amplify";
+import { useQueryClient } from "@tanstack/react-query";
+import { WEBSOCKET_ENDPOINT } from "../constants";
+import { ALERTS_PATH, CHANNELS_PATH } from "./useChannels";
+
+const RECONNECT_DELAY = 5000;
+// Browsers cannot set headers on WebSocket connections, so the access token
+// is offered as a subprotocol alongside the one the server accepts, keeping
+// it out of the URL and access logs
+const PROTOCOL = "channel-orchestrator";
+
+// Whether push updates are being received, shared by every polling hook
+let connected = false;
+const listeners = new Set();
+
+const setConnected = (value) => {
+  connected = value;
+  listeners.forEach((listener) => listener());
+};
+
+const subscribe = (listener) => {
+  listeners.add(listener);
+  return () => listeners.delete(listener);
+};
+
+export const usePushConnected = () =>
+  useSyncExternalStore(subscribe, () => connected);
+
+export const usePushUpdates = () => {
+  const queryClient = useQueryClient();
+
+  useEffect(() => {
+    if (!WEBSOCKET_ENDPOINT) return;
+    let socket;
+    let reconnectTimer;
+    let closed = false;
+
+    const connect = async () => {
+      const token = (await Auth.currentSession())
+        .getAccessToken()
+        .getJwtToken();
+      if (closed) return;
+      socket = new WebSocket(WEBSOCKET_ENDPOINT, [PROTOCOL, token]);
+      socket.onopen = () => {
+        socket.send(JSON.stringify({ action: "subscribe", channelId: "*" }));
+        setConnected(true);
+      };
+      socket.onmessage = (event) => {
+        const message = JSON.parse(event.data);
+        if (message.Type === "ALERT") {
+          queryClient.invalidateQueries([
+            CHANNELS_PATH,
+            message.ChannelId,
+            ALERTS_PATH,
+          ]);
+        } else {
+          queryClient.invalidateQueries({
+            queryKey: [CHANNELS_PATH],
+            exact: true,
+          });
+        }
+      };
+      socket.onclose = () => {
+        setConnected(false);
+        if (!closed) reconnectTimer = setTimeout(connect, RECONNECT_DELAY);
+      };
+    };
+
+    connect().catch((err) => {
+      console.error(err);
+      reconnectTimer = setTimeout(connect, RECONNECT_DELAY);
+    });
+
+    return () => {
+      closed = true;
+      clearTimeout(reconnectTimer);
+      socket?.close();
+    };
+  }, [queryClient]);
+};
+
+export default usePushUpdates;
@@ -5,6 +5,7 @@ import {
   useChannel,
   useChannels,
   useRemoveChannelData,
+  SELECTOR_FIELDS,
 } from "../hooks/useChannels";
 import {
   Box,
@@ -84,7 +85,10 @@ const ConfigForm = ({ onSubmit, onCancel }) => {
 };
 
 const Config = () => {
-  const { data = { Channels: [] }, isLoading: loadingChannels } = useChannels();
+  const { data = { Channels: [] }, isLoading: loadingChannels } = useChannels(
+    {},
+    SELECTOR_FIELDS
+  );
   const channels = data.Channels;
   const [dataType, setDataType] = useState(OUTPUTS);
   const [showForm, setShowForm] = useState(false);
@@ -1,6 +1,11 @@
 import { useEffect, useState } from "react";
 import "@aws-amplify/ui-react/styles.css";
-import { useChannels, useChannel, useStopGraphics } from "../hooks/useChannels";
+import {
+  useChannels,
+  useChannel,
+  useChannelAlerts,
+  useStopGraphics,
+} from "../hooks/useChannels";
 import {
   Box,
   CircularProgress,
@@ -32,6 +37,7 @@ const Home = () => {
   const [selectedOutput, setSelectedOutput] = useState(null);
   const { data: channelData = {}, isLoading: loadingSelectedChannel } =
     useChannel(selectedChannel?.Id);
+  const { data: alerts = [] } = useChannelAlerts(selectedChannel?.Id);
   const outputs = channelData?.Outputs ?? [];
   const graphics = channelData?.Graphics ?? [];
   const { stopGraphicsAsync, isLoading: stoppingGraphics } = useStopGraphics(
@@ -168,7 +174,7 @@ const Home = () => {
 
                   <Box>
                     <Typography variant={"h6"}>Alerts</Typography>
-                    <AlertsTable data={channelData?.Alerts} />
+                    <AlertsTable data={alerts} />
                   </Box>
                 </Stack>
               ) : (